@@ -2,34 +2,20 @@ import json
 import sys
 import os
 
-def load_json_file(filepath):
-    """Load and parse a JSON file."""
+from hpo_diff import ReleaseSet
+from hpo_profile import stage
+
+def load_releases(file1_path, file2_path):
+    """Load both releases into one interned id space."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: File '{filepath}' not found.")
+        return ReleaseSet.load([file1_path, file2_path])
+    except FileNotFoundError as e:
+        print(f"Error: File '{e.filename}' not found.")
         sys.exit(1)
     except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON in '{filepath}': {e}")
+        print(f"Error: Invalid JSON: {e}")
         sys.exit(1)
 
-def extract_nodes(data):
-    """Extract all nodes (ID and label) from the JSON structure."""
-    nodes = {}
-
-    # Navigate through the 'graphs' array
-    if 'graphs' in data:
-        for graph in data['graphs']:
-            if 'nodes' in graph:
-                for node in graph['nodes']:
-                    if 'id' in node:
-                        node_id = node['id']
-                        node_label = node.get('lbl', 'N/A')
-                        nodes[node_id] = node_label
-
-    return nodes
-
 def save_ids_to_file(ids, labels, output_path):
     """Save IDs as comma-separated list to a text file."""
     try:
@@ -41,69 +27,55 @@ def save_ids_to_file(ids, labels, output_path):
     except Exception as e:
         print(f"  Error saving file '{output_path}': {e}")
 
-def compare_json_files(file1_path, file2_path):
-    """Compare two JSON files and find unique nodes."""
-    print(f"Loading {file1_path}...")
-    data1 = load_json_file(file1_path)
-
-    print(f"Loading {file2_path}...")
-    data2 = load_json_file(file2_path)
+def save_delta(delta, output_path):
+    """Save the full structured delta as JSON."""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(delta, f, indent=1, ensure_ascii=False)
+    print(f"  Saved to: {output_path}")
 
-    # Extract nodes from both files
-    nodes_file1 = extract_nodes(data1)
-    nodes_file2 = extract_nodes(data2)
-
-    # Find unique IDs
-    ids_file1 = set(nodes_file1.keys())
-    ids_file2 = set(nodes_file2.keys())
-
-    only_in_file1 = ids_file1 - ids_file2
-    only_in_file2 = ids_file2 - ids_file1
-    common_ids = ids_file1 & ids_file2
+def compare_json_files(file1_path, file2_path):
+    """Compare two JSON files: node, label and is_a edge deltas."""
+    print(f"Loading {file1_path} and {file2_path}...")
+    with stage('compare.load'):
+        releases = load_releases(file1_path, file2_path)
+    name1, name2 = releases.order
+    with stage('compare.diff') as s:
+        delta = releases.diff(name1, name2)
+        s.count(added=len(delta['added']), removed=len(delta['removed']))
+
+    only_in_file1 = set(delta['removed'])
+    only_in_file2 = set(delta['added'])
+    nodes_file1 = releases.releases[name1].labels
+    nodes_file2 = releases.releases[name2].labels
 
     # Get script directory and base names for output files
     script_dir = os.path.dirname(os.path.abspath(__file__))
     file1_base = os.path.splitext(os.path.basename(file1_path))[0]
     file2_base = os.path.splitext(os.path.basename(file2_path))[0]
 
-    # Print results
+    # Print summary
     print("\n" + "="*80)
     print("COMPARISON RESULTS")
     print("="*80)
 
-    print(f"\nTotal nodes in {file1_path}: {len(ids_file1)}")
-    print(f"Total nodes in {file2_path}: {len(ids_file2)}")
-    print(f"Common nodes in both files: {len(common_ids)}")
-
-    print(f"\n{'='*80}")
+    print(f"\nTotal nodes in {file1_path}: {len(nodes_file1)}")
+    print(f"Total nodes in {file2_path}: {len(nodes_file2)}")
+    print(f"Common nodes in both files: {len(nodes_file1.keys() & nodes_file2.keys())}")
     print(f"Nodes ONLY in {file1_path}: {len(only_in_file1)}")
-    print(f"{'='*80}")
-    if only_in_file1:
-        for node_id in sorted(only_in_file1):
-            label = nodes_file1[node_id]
-            print(f"  ID:  {node_id}")
-            print(f"  Lbl: {label}")
-            print()
-        # Save to file in script directory
-        output_file = os.path.join(script_dir, f"only_in_{file1_base}.txt")
-        save_ids_to_file(only_in_file1, nodes_file1, output_file)
-    else:
-        print("  (none)")
-
-    print(f"\n{'='*80}")
     print(f"Nodes ONLY in {file2_path}: {len(only_in_file2)}")
-    print(f"{'='*80}")
-    if only_in_file2:
-        for node_id in sorted(only_in_file2):
-            label = nodes_file2[node_id]
-            print(f"  ID:  {node_id}")
-            print(f"  Lbl: {label}")
-            print()
-        # Save to file in script directory
-        output_file = os.path.join(script_dir, f"only_in_{file2_base}.txt")
-        save_ids_to_file(only_in_file2, nodes_file2, output_file)
-    else:
-        print("  (none)")
+    print(f"Relabeled nodes: {len(delta['relabeled'])}")
+    print(f"Newly obsoleted nodes: {len(delta['obsoleted'])}")
+    print(f"is_a edges added / removed: {len(delta['edges_added'])} / {len(delta['edges_removed'])}")
+    print(f"Reparented nodes: {len(delta['reparented'])}")
+    print(f"Split / merged parents: {len(delta['split'])} / {len(delta['merged'])}")
+    print()
+
+    # Save to files in script directory
+    with stage('compare.write'):
+        for ids, base in ((only_in_file1, file1_base), (only_in_file2, file2_base)):
+            if ids:
+                save_ids_to_file(ids, None, os.path.join(script_dir, f"only_in_{base}.txt"))
+        save_delta(delta, os.path.join(script_dir, f"delta_{file1_base}__{file2_base}.json"))
 
     return only_in_file1, only_in_file2
 
@@ -1,10 +1,34 @@
 import json
 import os
-from collections import defaultdict, deque
+
+import hpo_metrics
+from hpo_cache import ArtifactCache
+from hpo_graph import load_graph
+from hpo_incremental import fits_previous, read_hierarchy_csv, update_metrics
+from hpo_parallel import parallel_metrics
+from hpo_profile import stage
 
 # File path variable - update this to your actual file location
 JSON_FILEPATH = r'/Users/wonton-eater/Desktop/Work/Fall 2025/Symbolic AI in Health/final_project/prototype/hp-base-2025-Aug-Phenotypic abnormality.json' # change 1
 
+# 'exact' descendant counts, or 'sketch' for HyperLogLog estimates on very large ontologies
+DESCENDANT_MODE = 'exact'
+
+# Worker processes for the exact metrics (1 keeps everything in this process)
+WORKERS = 1
+
+# Optional: the previous release's hierarchy CSV and the delta from it to
+# JSON_FILEPATH (written by 2.compare_jsons.py). When both are set, exact
+# metrics are updated from the previous ones instead of recomputed
+PREVIOUS_HIERARCHY_CSV = None
+DELTA_JSON = None
+
+# Results are reused while the JSON file is unchanged; None always recomputes
+CACHE_DIR = '.ivo_cache'
+
+# Bump when the result rows change, to invalidate cached results
+RESULTS_VERSION = 1
+
 def analyze_hpo_hierarchy():
     """
     Analyze HPO ontology structure from JSON file.
@@ -16,113 +40,78 @@ def analyze_hpo_hierarchy():
     if not os.path.exists(JSON_FILEPATH):
         raise FileNotFoundError(f"File not found: {JSON_FILEPATH}")
 
+    if CACHE_DIR is None:
+        return compute_hierarchy()
+    # An incremental result depends on the previous rows and delta it was built from
+    inputs = [JSON_FILEPATH]
+    if PREVIOUS_HIERARCHY_CSV and DELTA_JSON and DESCENDANT_MODE == 'exact':
+        inputs += [PREVIOUS_HIERARCHY_CSV, DELTA_JSON]
+    return ArtifactCache(CACHE_DIR).memoize('analyze_hpo_hierarchy', RESULTS_VERSION, inputs,
+                                            [DESCENDANT_MODE], compute_hierarchy)
+
+def compute_hierarchy():
+    """Load JSON_FILEPATH and compute the rows returned by analyze_hpo_hierarchy."""
     # Load data from file
     print(f"Loading data from: {JSON_FILEPATH}")
-    with open(JSON_FILEPATH, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # Extract nodes and edges
-    graph = data['graphs'][0]
-    nodes = {node['id']: node.get('lbl', 'Unknown') for node in graph['nodes']}
-    edges = graph['edges']
-
-    print(f"Loaded {len(nodes)} nodes and {len(edges)} edges")
+    with stage('summarize.load'):
+        graph = load_graph(JSON_FILEPATH)
 
-    # Build parent-child relationships
-    children = defaultdict(list)  # parent -> [children]
-    parents = defaultdict(list)   # child -> [parents]
-
-    for edge in edges:
-        if edge['pred'] == 'is_a':
-            child_id = edge['sub']
-            parent_id = edge['obj']
-            children[parent_id].append(child_id)
-            parents[child_id].append(parent_id)
+    # Interned nodes (declared terms) and is_a edges
+    nodes = graph.declared_ids()
+    print(f"Loaded {len(nodes)} nodes and {graph.num_edges} edges")
 
     # Identify root nodes (nodes with no parents)
-    root_nodes = [node_id for node_id in nodes if not parents[node_id]]
-    print(f"Found {len(root_nodes)} root node(s): {root_nodes}")
-
-    # Calculate depth for each node using BFS
-    depths = {}
-    queue = deque()
-
-    # Initialize with root nodes at depth 0
-    for root in root_nodes:
-        depths[root] = 0
-        queue.append(root)
-
-    # BFS to calculate depths
-    while queue:
-        current_node = queue.popleft()
-        current_depth = depths[current_node]
-
-        for child in children[current_node]:
-            # If child hasn't been visited, or we found a shorter path
-            if child not in depths or depths[child] > current_depth + 1:
-                depths[child] = current_depth + 1
-                queue.append(child)
-
-    # Calculate descendants recursively
-    def count_descendants(node_id, visited=None):
-        if visited is None:
-            visited = set()
-
-        if node_id in visited:
-            return 0
-
-        visited.add(node_id)
-        count = 0
-
-        for child in children[node_id]:
-            count += 1  # Count the child
-            count += count_descendants(child, visited)  # Count child's descendants
-
-        return count
-
-    # Calculate descendants for all nodes first
-    descendants_count = {}
-    for node_id in nodes:
-        descendants_count[node_id] = count_descendants(node_id)
+    root_nodes = graph.roots()
+    print(f"Found {len(root_nodes)} root node(s): {[graph.ids[r] for r in root_nodes]}")
+
+    # Depth by BFS, then descendant counts and sibling differences for all
+    # nodes in one children-before-parents sweep
+    previous = delta = None
+    if PREVIOUS_HIERARCHY_CSV and DELTA_JSON and DESCENDANT_MODE == 'exact':
+        previous = read_hierarchy_csv(PREVIOUS_HIERARCHY_CSV)
+        with open(DELTA_JSON, 'r', encoding='utf-8') as f:
+            delta = json.load(f)
+        if not fits_previous(graph, previous, delta):
+            print(f"{PREVIOUS_HIERARCHY_CSV} does not hold the terms of the release {DELTA_JSON} "
+                  f"starts from; recomputing all metrics")
+            previous = None
+    if previous is not None:
+        print(f"Updating metrics from {PREVIOUS_HIERARCHY_CSV} and {DELTA_JSON}")
+        depths, descendants_count, descendant_diffs = update_metrics(graph, previous, delta)
+    elif WORKERS > 1 and DESCENDANT_MODE == 'exact':
+        with stage('summarize.parallel_metrics', workers=WORKERS):
+            metrics = parallel_metrics(graph, WORKERS, heights=False)
+        depths = metrics['depth']
+        descendants_count = metrics['num_descendants']
+        descendant_diffs = metrics['max_descendant_diff']
+    else:
+        with stage('summarize.depths'):
+            depths = hpo_metrics.depths(graph)
+        with stage('summarize.descendant_counts', mode=DESCENDANT_MODE):
+            descendants_count = hpo_metrics.descendant_counts(graph, DESCENDANT_MODE)
+        with stage('summarize.descendant_diffs'):
+            descendant_diffs = hpo_metrics.max_descendant_diffs(graph, descendants_count)
 
     # Prepare results
     results = []
-    for node_id in nodes:
-        node_parents = parents.get(node_id, [])
-        node_children = children.get(node_id, [])
-        num_descendants = descendants_count[node_id]
-        node_depth = depths.get(node_id, -1)  # -1 if unreachable from root
-
-        # Calculate Max_Num_Descendant_Diff
-        max_descendant_diff = 0
-        if node_parents:
-            # Get all siblings across all parents
-            all_siblings = set()
-            for parent_id in node_parents:
-                # Add all children of this parent (including the node itself)
-                all_siblings.update(children.get(parent_id, []))
-
-            # Remove the node itself from siblings
-            all_siblings.discard(node_id)
-
-            # Find the maximum number of descendants among siblings
-            if all_siblings:
-                max_sibling_descendants = max(descendants_count.get(sibling, 0) for sibling in all_siblings)
-                max_descendant_diff = max(0, max_sibling_descendants - num_descendants)
-
-        results.append({
-            'id': node_id,
-            'label': nodes[node_id],
-            'depth': node_depth,
-            'parents': [{'id': p, 'label': nodes.get(p, 'Unknown')} for p in node_parents],
-            'children': [{'id': c, 'label': nodes.get(c, 'Unknown')} for c in node_children],
-            'num_children': len(node_children),
-            'num_descendants': num_descendants,
-            'max_descendant_diff': max_descendant_diff
-        })
-
-    # Sort by depth first, then by ID
-    results.sort(key=lambda x: (x['depth'], x['id']))
+    with stage('summarize.rows', nodes=len(nodes)):
+        for node_id in nodes:
+            node_parents = graph.parents(node_id)
+            node_children = graph.children(node_id)
+
+            results.append({
+                'id': graph.ids[node_id],
+                'label': graph.label(node_id, 'Unknown'),
+                'depth': depths[node_id],  # -1 if unreachable from root
+                'parents': [{'id': graph.ids[p], 'label': graph.label(p, 'Unknown')} for p in node_parents],
+                'children': [{'id': graph.ids[c], 'label': graph.label(c, 'Unknown')} for c in node_children],
+                'num_children': len(node_children),
+                'num_descendants': descendants_count[node_id],
+                'max_descendant_diff': descendant_diffs[node_id]
+            })
+
+        # Sort by depth first, then by ID
+        results.sort(key=lambda x: (x['depth'], x['id']))
 
     return results
 
@@ -176,7 +165,7 @@ if __name__ == "__main__":
         # Export to CSV
         import csv
         output_csv = '/Users/wonton-eater/Desktop/Work/Fall 2025/Symbolic AI in Health/final_project/prototype/hpo_hierarchy.csv' # change 2
-        with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        with stage('summarize.write_csv', rows=len(results)), open(output_csv, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['ID', 'Label', 'Depth', 'Num_Parents', 'Num_Children', 'Num_Descendants', 'Max_Num_Descendant_Diff'])
             for node in results:
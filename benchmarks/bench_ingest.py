@@ -0,0 +1,73 @@
+"""Compare peak memory and time of json.load against the streaming reader.
+
+Usage: python benchmarks/bench_ingest.py release.json
+
+Each loader runs in its own subprocess so peak RSS figures are independent.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hpo_graph import OntologyGraph, load_graph
+
+
+def load_with_json(filepath):
+    with open(filepath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    graph = data['graphs'][0]
+    return OntologyGraph.from_records(graph['nodes'], graph['edges'])
+
+
+LOADERS = {'json.load': load_with_json, 'streaming': load_graph}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_one(loader, filepath):
+    """Run a single loader and print its measurements as JSON."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    graph = LOADERS[loader](filepath)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        'loader': loader,
+        'seconds': elapsed,
+        'traced_peak_mb': traced_peak / (1024 * 1024),
+        'peak_rss_mb': peak_rss_mb(),
+        'terms': len(graph),
+        'edges': graph.num_edges,
+    }))
+
+
+def main(filepath):
+    size_mb = os.path.getsize(filepath) / (1024 * 1024)
+    print(f"Release: {filepath} ({size_mb:.1f} MB)")
+    print(f"{'Loader':<12}{'Time (s)':>10}{'Traced peak (MB)':>18}{'Peak RSS (MB)':>15}{'Terms':>9}{'Edges':>9}")
+    for loader in LOADERS:
+        out = subprocess.run([sys.executable, __file__, '--run', loader, filepath],
+                             check=True, capture_output=True, text=True).stdout
+        r = json.loads(out)
+        print(f"{loader:<12}{r['seconds']:>10.2f}{r['traced_peak_mb']:>18.1f}"
+              f"{r['peak_rss_mb']:>15.1f}{r['terms']:>9}{r['edges']:>9}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        run_one(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 2:
+        main(sys.argv[1])
+    else:
+        print("Usage: python benchmarks/bench_ingest.py release.json")
+        sys.exit(1)
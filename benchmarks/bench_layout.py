@@ -0,0 +1,62 @@
+"""Time of each hpo_layout.py stage, edge crossings, and the cached reload.
+
+Usage: python benchmarks/bench_layout.py release.json [root_id] [sweeps ...]
+
+root_id defaults to Phenotypic abnormality, so the full subset IVO.qmd
+would draw is laid out. Each sweep count is timed separately (default
+0 2 4 8), with the crossings left between adjacent layers;
+then the layout is stored in a temporary artifact cache and read back.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hpo_cache import ArtifactCache
+from hpo_graph import load_graph
+from hpo_layout import assign_layers, assign_x, cached_layout, order_layers
+from synthetic import PHENOTYPIC_ABNORMALITY
+
+
+def main(filepath, root_id=PHENOTYPIC_ABNORMALITY, *sweep_counts):
+    sweep_counts = [int(s) for s in sweep_counts] or [0, 2, 4, 8]
+    start = time.perf_counter()
+    graph = load_graph(filepath)
+    root = graph.index_of(root_id)
+    if root is None:
+        print(f"{root_id} is not in {filepath}")
+        sys.exit(1)
+    print(f"Release: {filepath} ({len(graph)} terms), loaded in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    layer_of, layers = assign_layers(graph, root)
+    print(f"Layers: {len(layer_of)} terms below {root_id} in {len(layers)} layers "
+          f"(widest {max(len(layer) for layer in layers)}) in {time.perf_counter() - start:.2f}s")
+
+    print(f"{'Sweeps':>7}{'Order (s)':>11}{'x (s)':>8}{'Total (s)':>11}{'Crossings':>12}")
+    for sweeps in sweep_counts:
+        ordered = [list(layer) for layer in layers]
+        start = time.perf_counter()
+        crossings = order_layers(graph, root, ordered, sweeps)
+        order_time = time.perf_counter() - start
+        start = time.perf_counter()
+        assign_x(graph, ordered)
+        x_time = time.perf_counter() - start
+        print(f"{sweeps:>7}{order_time:>11.2f}{x_time:>8.2f}{order_time + x_time:>11.2f}"
+              f"{crossings:>12}")
+
+    with tempfile.TemporaryDirectory(prefix='ivo_bench_') as cache_dir:
+        cache = ArtifactCache(cache_dir)
+        for run in ('computed', 'cached'):
+            start = time.perf_counter()
+            rows = cached_layout(filepath, root_id, cache)
+            print(f"cached_layout ({run}): {len(rows)} rows in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_layout.py release.json [root_id] [sweeps ...]")
+        sys.exit(1)
+    main(*sys.argv[1:])
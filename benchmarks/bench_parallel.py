@@ -0,0 +1,52 @@
+"""Scaling of hpo_parallel.parallel_metrics from 1 to N worker processes.
+
+Usage: python benchmarks/bench_parallel.py release.json [max_workers]
+
+The release is compiled to a temporary snapshot once and every run shares
+it. Each worker count is timed with all metrics and with
+``heights=False``, the counts-only path 3.summarize_subset.py takes; both
+runs' results are checked against the single-process run.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hpo_graph import load_graph
+from hpo_parallel import parallel_metrics
+from hpo_snapshot import write_snapshot
+
+
+def main(filepath, max_workers=None):
+    max_workers = int(max_workers) if max_workers else os.cpu_count() or 1
+    graph = load_graph(filepath)
+    print(f"Release: {filepath} ({len(graph)} terms, {graph.num_edges} edges), "
+          f"{os.cpu_count()} cores available")
+
+    with tempfile.TemporaryDirectory(prefix='ivo_bench_') as tmp_dir:
+        snapshot_path = write_snapshot(graph, os.path.join(tmp_dir, 'graph.ivosnap'))
+        print(f"{'Workers':>8}{'All (s)':>9}{'Speedup':>9}{'Counts (s)':>12}{'Speedup':>9}"
+              f"{'Matches':>9}")
+        baseline = baseline_time = counts_time = None
+        for workers in range(1, max_workers + 1):
+            start = time.perf_counter()
+            metrics = parallel_metrics(graph, workers, snapshot_path)
+            elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            counts = parallel_metrics(graph, workers, snapshot_path, heights=False)
+            counts_elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline, baseline_time, counts_time = metrics, elapsed, counts_elapsed
+            matches = (all(list(metrics[k]) == list(baseline[k]) for k in baseline)
+                       and all(list(counts[k]) == list(baseline[k]) for k in counts))
+            print(f"{workers:>8}{elapsed:>9.2f}{baseline_time / elapsed:>9.2f}"
+                  f"{counts_elapsed:>12.2f}{counts_time / counts_elapsed:>9.2f}{str(matches):>9}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python benchmarks/bench_parallel.py release.json [max_workers]")
+        sys.exit(1)
+    main(*sys.argv[1:])
@@ -0,0 +1,77 @@
+"""Compare output size, write time and reload time of subset output formats.
+
+Usage: python benchmarks/bench_write.py release.json root_node_id [out_dir]
+
+The subset is extracted once; each format then writes the same records.
+"json.dump" is the original pretty-printed, whole-dict output.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hpo_stream import open_text, zstandard
+from hpo_writer import GraphWriter
+from subset_selection import extract_subsets
+
+
+def write_json_dump(subset, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'graphs': [subset]}, f, indent=2, ensure_ascii=False)
+
+
+def streaming(indent=None, predicates=None):
+    def write(subset, path):
+        with GraphWriter(path, indent, predicates) as writer:
+            for node in subset['nodes']:
+                writer.write_node(node)
+            for edge in subset['edges']:
+                writer.write_edge(edge)
+    return write
+
+
+FORMATS = [
+    ('json.dump', '.json', write_json_dump),
+    ('stream indent=2', '.json', streaming(indent=2)),
+    ('stream compact', '.json', streaming()),
+    ('compact is_a only', '.json', streaming(predicates=['is_a'])),
+    ('compact gzip', '.json.gz', streaming()),
+]
+if zstandard is not None:
+    FORMATS.append(('compact zstd', '.json.zst', streaming()))
+
+
+def main(filepath, root_id, out_dir=None):
+    print(f"Extracting {root_id} from {filepath}...")
+    [subset] = extract_subsets(filepath, [root_id])
+    print(f"{len(subset['nodes'])} nodes, {len(subset['edges'])} edges")
+    if zstandard is None:
+        print("zstandard not installed; skipping the zstd format")
+
+    out_dir = out_dir or tempfile.mkdtemp(prefix='ivo_bench_')
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"{'Format':<20}{'Size (MB)':>11}{'Write (s)':>11}{'Reload (s)':>12}")
+    for i, (name, suffix, write) in enumerate(FORMATS):
+        path = os.path.join(out_dir, f'subset{i}{suffix}')
+        start = time.perf_counter()
+        write(subset, path)
+        write_time = time.perf_counter() - start
+
+        # Downstream cost: parsing the whole file again, as the app does
+        start = time.perf_counter()
+        with open_text(path) as f:
+            json.load(f)
+        load_time = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"{name:<20}{size_mb:>11.2f}{write_time:>11.2f}{load_time:>12.2f}")
+    print(f"Output files kept in {out_dir}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python benchmarks/bench_write.py release.json root_node_id [out_dir]")
+        sys.exit(1)
+    main(*sys.argv[1:])
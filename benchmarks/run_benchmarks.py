@@ -0,0 +1,206 @@
+"""Time and peak memory of each pipeline stage on synthetic HPO-shaped releases.
+
+Usage: python benchmarks/run_benchmarks.py [--sizes 10k 100k 1M] [--data-dir DIR]
+           [--baseline FILE] [--save-baseline] [--tolerance 0.25]
+
+For each size a synthetic old/new release pair is generated once (and kept
+in --data-dir), then the stages run in pipeline order: streaming load,
+subset extraction (filter_descendants), compare (2.compare_jsons.py:
+both full releases loaded, diffed and the delta written), summarize
+(analyze_hpo_hierarchy), find_parents (find_siblings), parent analysis
+and depth statistics. Each stage runs in its own subprocess, reading the
+earlier stages' results from an artifact cache shared by the run, so its
+peak memory is that process's high-water mark (ru_maxrss, or that of a
+worker process it started if larger): the stage and the inputs it reads,
+not everything that ran before it.
+
+With --baseline, every stage is compared to the stored numbers and
+reported as a regression when its time or peak memory exceeds the
+baseline by more than --tolerance. --save-baseline stores this run
+(sizes whose stage runner failed are not stored). A size that does not
+fit in memory is reported with the stages it completed.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from synthetic import PHENOTYPIC_ABNORMALITY, parse_size, write_release_pair
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baselines.json')
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, 'data')
+
+# Differences below these are noise, whatever the relative change
+MIN_SECONDS = 0.05
+MIN_MB = 5
+
+STAGES = ['load', 'filter_descendants', 'compare', 'summarize', 'find_parents',
+          'parent_analysis', 'depth_stats']
+
+
+def peak_rss_mb():
+    """Largest high-water mark of this process and of its (finished) worker processes."""
+    peak = max(resource.getrusage(who).ru_maxrss
+               for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _script(filename):
+    """Import one of the numbered pipeline scripts, whose names are not module names."""
+    path = os.path.join(os.path.dirname(BENCH_DIR), filename)
+    spec = importlib.util.spec_from_file_location(filename[:-len('.py')].replace('.', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _stage_functions(old_path, new_path, cache_dir):
+    from hpo_graph import load_graph
+    from ivo_pipeline import Pipeline
+
+    pipeline = Pipeline(old_path, new_path, PHENOTYPIC_ABNORMALITY, cache_dir=cache_dir)
+
+    def compare():
+        # compare_json_files without its summary printout, writing the
+        # delta here instead of next to the script
+        compare_jsons = _script('2.compare_jsons.py')
+        releases = compare_jsons.load_releases(old_path, new_path)
+        delta = releases.diff(*releases.order)
+        compare_jsons.save_delta(delta, os.path.join(cache_dir, 'delta.json'))
+
+    return {
+        'load': lambda: load_graph(new_path),
+        'filter_descendants': lambda: (pipeline.subset('old'), pipeline.subset('new')),
+        'compare': compare,
+        'summarize': pipeline.summarize,
+        'find_parents': pipeline.find_parents,
+        'parent_analysis': pipeline.parent_analysis,
+        'depth_stats': pipeline.depth_stats,
+    }
+
+
+def _cpu_seconds():
+    """CPU time of this process and its finished worker processes (compare parses in workers)."""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def run_stage(name, old_path, new_path, cache_dir):
+    """Run one stage in this process, printing its measurements as a JSON line."""
+    stage = _stage_functions(old_path, new_path, cache_dir)[name]
+    start = time.perf_counter()
+    cpu_start = _cpu_seconds()
+    stage()
+    print(json.dumps({
+        'stage': name,
+        'seconds': time.perf_counter() - start,
+        'cpu_seconds': _cpu_seconds() - cpu_start,
+        'peak_rss_mb': peak_rss_mb(),
+    }), flush=True)
+
+
+def measure_size(old_path, new_path):
+    """Run each stage in its own subprocess; returns ({stage: measurements}, error or None).
+
+    Stages that finished are kept when a later one dies, e.g. when it is
+    killed for running out of memory on a large release.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='ivo_bench_cache_') as cache_dir:
+        for name in STAGES:
+            proc = subprocess.run([sys.executable, __file__, '--run', name, old_path, new_path, cache_dir],
+                                  capture_output=True, text=True)
+            for line in proc.stdout.splitlines():
+                if line.startswith('{'):
+                    r = json.loads(line)
+                    results[r.pop('stage')] = r
+            if proc.returncode < 0:
+                return results, f"{name} killed by signal {-proc.returncode} (out of memory?)"
+            if proc.returncode:
+                stderr = proc.stderr.strip()
+                return results, stderr.splitlines()[-1] if stderr else f"{name}: exit code {proc.returncode}"
+    return results, None
+
+
+def compare_to_baseline(key, results, baseline, tolerance):
+    """Lines describing each stage against the baseline, and whether any regressed."""
+    reference = baseline.get(key, {})
+    lines, regressed = [], False
+    for stage, r in results.items():
+        base = reference.get(stage)
+        status = ''
+        if base:
+            slower = (r['seconds'] > base['seconds'] * (1 + tolerance)
+                      and r['seconds'] - base['seconds'] > MIN_SECONDS)
+            bigger = (r['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance)
+                      and r['peak_rss_mb'] - base['peak_rss_mb'] > MIN_MB)
+            if slower or bigger:
+                regressed = True
+                status = 'REGRESSION ' + ' '.join(
+                    what for what, flag in (('time', slower), ('memory', bigger)) if flag)
+            else:
+                status = 'ok'
+            status += f" (baseline {base['seconds']:.2f}s, {base['peak_rss_mb']:.0f} MB)"
+        lines.append(f"  {stage:<20}{r['seconds']:>9.2f}{r['cpu_seconds']:>9.2f}"
+                     f"{r['peak_rss_mb']:>11.0f}  {status}")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVO pipeline stages on synthetic releases.")
+    parser.add_argument('--sizes', nargs='+', default=['10k'], help="release sizes, e.g. 10k 100k 1M")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where synthetic releases are kept")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline measurements (JSON)")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown/growth before flagging")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    run, any_regression = {}, False
+    for size in args.sizes:
+        num_terms = parse_size(size)
+        print(f"Preparing synthetic releases with {num_terms} terms...")
+        old_path, new_path = write_release_pair(num_terms, args.data_dir, args.seed)
+        results, error = measure_size(old_path, new_path)
+        if not error:
+            run[str(num_terms)] = results
+
+        print(f"  {'Stage':<20}{'Wall (s)':>9}{'CPU (s)':>9}{'Peak (MB)':>11}")
+        lines, regressed = compare_to_baseline(str(num_terms), results, baseline, args.tolerance)
+        print('\n'.join(lines))
+        if error:
+            print(f"  Failed after {len(results)} stage(s): {error}")
+        any_regression |= regressed or bool(error)
+
+    if args.save_baseline:
+        baseline.update(run)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if any_regression:
+        print("Regressions or failures found")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 6 and sys.argv[1] == '--run':
+        run_stage(*sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,181 @@
+"""Synthetic obographs releases shaped like HPO, for benchmarking.
+
+Terms are laid out by depth following the depth profile of the Phenotypic
+abnormality subtree (peaking around depth 5-6, reaching about 15), under
+an "All" root and HP_0000118. Each term picks its parent on the level above
+with a heavy-tailed (Pareto) weight, so a few terms get hundreds of
+children and most get none; about 15% of terms get a second parent and 3%
+a third. Records carry a definition, synonyms and xrefs like real HPO
+terms, plus a small share of part_of edges.
+
+``write_release_pair`` also writes a "new" release with terms added,
+removed, relabeled, obsoleted and reparented, for the diff stages.
+
+Usage: python benchmarks/synthetic.py num_terms out_dir [--seed N]
+"""
+import argparse
+import os
+import random
+import sys
+from bisect import bisect_right
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hpo_writer import GraphWriter
+
+PREFIX = 'http://purl.obolibrary.org/obo/HP_'
+ALL = PREFIX + '0000001'
+PHENOTYPIC_ABNORMALITY = PREFIX + '0000118'
+PART_OF = 'http://purl.obolibrary.org/obo/BFO_0000050'
+
+# Terms per depth below Phenotypic abnormality in hp-base-2025-Aug
+DEPTH_PROFILE = [1, 23, 158, 869, 2499, 4221, 4066, 3283, 2100, 769, 372, 128, 17, 8, 3, 1]
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+# Part of the file names of written releases; bump when the output changes
+# so releases kept from an older version are not reused
+SYNTHETIC_VERSION = 2
+
+
+def parse_size(text):
+    """'10k', '1M' or a plain number of terms."""
+    return SIZES.get(text) or int(text.replace('_', ''))
+
+
+class SyntheticOntology:
+    """Parent lists for ``num_terms`` terms; term 0 is All, term 1 Phenotypic abnormality."""
+
+    def __init__(self, num_terms, seed=0, pareto_alpha=1.2,
+                 second_parent=0.15, third_parent=0.03, part_of=0.02):
+        rnd = random.Random(seed)
+        self.num_terms = num_terms = max(num_terms, len(DEPTH_PROFILE) + 1)
+        total = sum(DEPTH_PROFILE)
+        # Terms per level, at least one, scaled from the HPO profile
+        sizes = [max(1, round(c * (num_terms - 1) / total)) for c in DEPTH_PROFILE]
+        sizes[0] = 1
+        sizes[DEPTH_PROFILE.index(max(DEPTH_PROFILE))] += num_terms - 1 - sum(sizes)
+
+        # HPO-like ids in random order so id order does not follow depth,
+        # drawn from 2..9999999 without 118 so none repeats All's or HP_0000118's
+        numbers = [1, 118] + [n + (n >= 118) for n in rnd.sample(range(2, 9_999_999), num_terms - 2)]
+        self.ids = [f'{PREFIX}{n:07d}' for n in numbers]
+
+        self.parents = [()] * num_terms
+        self.part_of = {}
+        self.depth = [0] * num_terms
+        weights = [rnd.paretovariate(pareto_alpha) for _ in range(num_terms)]
+        level = [1]
+        self.parents[1] = (0,)
+        self.depth[1] = 1
+        next_id = 2
+        for d, size in enumerate(sizes[1:], 2):
+            cum = list(accumulate(weights[i] for i in level))
+            new_level = list(range(next_id, next_id + size))
+            for term in new_level:
+                k = 1 + (rnd.random() < second_parent) + (rnd.random() < third_parent)
+                chosen = {level[bisect_right(cum, rnd.random() * cum[-1])] for _ in range(k)}
+                self.parents[term] = tuple(chosen)
+                self.depth[term] = d
+                if rnd.random() < part_of:
+                    self.part_of[term] = rnd.randrange(1, term)
+            next_id += size
+            level = new_level
+
+    def node(self, term, label=None, deprecated=False):
+        number = self.ids[term][len(PREFIX):]
+        meta = {
+            'definition': {'val': f'Synthetic phenotype definition for term {number}.',
+                           'xrefs': ['HPO:probinson']},
+            'synonyms': [{'pred': 'hasExactSynonym', 'val': f'Synthetic synonym {number}'}],
+            'xrefs': [{'val': f'UMLS:C{number}'}],
+        }
+        if deprecated:
+            meta['deprecated'] = True
+        return {'id': self.ids[term], 'lbl': label or f'Synthetic phenotype {number}',
+                'type': 'CLASS', 'meta': meta}
+
+    def write(self, filepath, changes=None):
+        """Write the release, optionally applying ``changes`` from ``release_changes``."""
+        changes = changes or {}
+        removed = changes.get('removed', set())
+        relabeled = changes.get('relabeled', set())
+        obsoleted = changes.get('obsoleted', set())
+        reparented = changes.get('reparented', {})
+        added = changes.get('added', {})
+        ids = self.ids
+        with GraphWriter(filepath) as writer:
+            for term in range(self.num_terms):
+                if term in removed:
+                    continue
+                label = f'Synthetic phenotype {ids[term][len(PREFIX):]} (revised)' if term in relabeled else None
+                writer.write_node(self.node(term, label, term in obsoleted))
+            for iri, parent in added.items():
+                writer.write_node({'id': iri, 'lbl': f'New synthetic phenotype {iri[len(PREFIX):]}',
+                                   'type': 'CLASS'})
+            for term in range(1, self.num_terms):
+                if term in removed:
+                    continue
+                for parent in reparented.get(term, self.parents[term]):
+                    writer.write_edge({'sub': ids[term], 'pred': 'is_a', 'obj': ids[parent]})
+                if term in self.part_of and self.part_of[term] not in removed:
+                    writer.write_edge({'sub': ids[term], 'pred': PART_OF, 'obj': ids[self.part_of[term]]})
+            for iri, parent in added.items():
+                writer.write_edge({'sub': iri, 'pred': 'is_a', 'obj': ids[parent]})
+        return filepath
+
+    def release_changes(self, seed=1, fraction=0.005):
+        """Edits turning this release into a plausible next one."""
+        rnd = random.Random(seed)
+        k = max(1, int(self.num_terms * fraction))
+        has_children = set(p for ps in self.parents for p in ps)
+        leaves = [t for t in range(2, self.num_terms) if t not in has_children]
+        inner = [t for t in range(2, self.num_terms) if self.depth[t] > 2]
+        removed = set(rnd.sample(leaves, min(k, len(leaves))))
+        kept = [t for t in inner if t not in removed]
+        reparented = {}
+        for term in rnd.sample(kept, min(k, len(kept))):
+            candidates = [t for t in rnd.sample(kept, min(20, len(kept)))
+                          if self.depth[t] == self.depth[term] - 1]
+            if candidates:
+                reparented[term] = (candidates[0],)
+        used = set(int(i[len(PREFIX):]) for i in self.ids)
+        fresh = (n for n in range(10_000_000 - 1, 1, -1) if n not in used)
+        added = {f'{PREFIX}{next(fresh):07d}': rnd.choice(kept) for _ in range(2 * k)}
+        return {
+            'removed': removed,
+            'relabeled': set(rnd.sample(kept, min(k, len(kept)))),
+            'obsoleted': set(rnd.sample(kept, min(k // 2 or 1, len(kept)))),
+            'reparented': reparented,
+            'added': added,
+        }
+
+
+def write_release_pair(num_terms, out_dir, seed=0):
+    """Write synthetic old and new releases; returns their paths (cached by size and seed)."""
+    os.makedirs(out_dir, exist_ok=True)
+    name = f'synthetic-{num_terms}-s{seed}-v{SYNTHETIC_VERSION}'
+    old_path = os.path.join(out_dir, f'{name}-old.json')
+    new_path = os.path.join(out_dir, f'{name}-new.json')
+    if not (os.path.exists(old_path) and os.path.exists(new_path)):
+        ontology = SyntheticOntology(num_terms, seed)
+        ontology.write(old_path + '.tmp')
+        ontology.write(new_path + '.tmp', ontology.release_changes(seed + 1))
+        os.replace(old_path + '.tmp', old_path)
+        os.replace(new_path + '.tmp', new_path)
+    return old_path, new_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic HPO-shaped release pair.")
+    parser.add_argument('num_terms', help="number of terms, e.g. 10k, 100k, 1M or 25000")
+    parser.add_argument('out_dir')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path in write_release_pair(parse_size(args.num_terms), args.out_dir, args.seed):
+        print(f"Wrote {path}")
+
+
+if __name__ == '__main__':
+    main()
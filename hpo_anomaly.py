@@ -0,0 +1,231 @@
+"""Structural anomaly scores for every term of a release, ranked per branch.
+
+Three scores are computed for all terms in linear sweeps over the CSR
+arrays, each measuring how unusual a term's placement is within its
+branch (see ``hpo_metrics.branches``; for a whole release, pass
+``tops=[Phenotypic abnormality]`` to rank within organ-system branches):
+
+- ``Sibling_Imbalance``: how far log2 of (largest sibling subtree + 1) /
+  (own subtree + 1), from ``Num_Descendants`` and
+  ``Max_Num_Descendant_Diff``, lies above the branch mean, in standard
+  deviations.
+- ``Depth_Outlier``: for leaves, the distance of the term's depth from the
+  mean leaf depth of its branch, in standard deviations.
+- ``Fan_Out``: for terms with children, the distance of log2(number of
+  children) from the branch mean, in standard deviations, so both
+  single-child parents and very flat lists stand out.
+
+``Anomaly_Score`` is their weighted sum. ``top_k`` keeps a bounded heap
+per branch while scanning the terms once, so only the k most suspicious
+terms of each branch are ever collected and sorted.
+
+Usage: python hpo_anomaly.py release.json [--k 20] [--top TERM] [--branch TERM ...]
+           [--old old.json] [--weights 1 1 1] [--out anomalies.csv]
+"""
+import argparse
+import csv
+import heapq
+import math
+import time
+from array import array
+
+import hpo_metrics
+from hpo_graph import load_graph
+
+SCORES = ('Sibling_Imbalance', 'Depth_Outlier', 'Fan_Out')
+
+# Weights of SCORES in Anomaly_Score
+WEIGHTS = (1.0, 1.0, 1.0)
+
+ANOMALY_FIELDS = ['Branch_ID', 'Branch_Label', 'Rank', 'Node_ID', 'Node_Label', 'Anomaly_Score',
+                  *SCORES, 'Depth', 'Num_Children', 'Num_Descendants', 'Max_Num_Descendant_Diff']
+
+
+def _z_scores(values, members, groups, upper=False):
+    """|z| of ``values[i]`` within each of its groups (the largest), for ``members``.
+
+    ``groups[i]`` is a tuple of group keys; groups with one distinct value
+    score 0. With ``upper``, only values above the mean score.
+    """
+    sums = {}
+    for i in members:
+        v = values[i]
+        for g in groups[i]:
+            acc = sums.get(g)
+            if acc is None:
+                acc = sums[g] = [0, 0.0, 0.0]
+            acc[0] += 1
+            acc[1] += v
+            acc[2] += v * v
+    moments = {}
+    for g, (count, total, squares) in sums.items():
+        mean = total / count
+        variance = max(squares / count - mean * mean, 0.0)
+        moments[g] = mean, math.sqrt(variance)
+    z = array('d', bytes(8 * len(values)))
+    for i in members:
+        best = 0.0
+        for g in groups[i]:
+            mean, std = moments[g]
+            if std > 1e-9:
+                deviation = values[i] - mean if upper else abs(values[i] - mean)
+                best = max(best, deviation / std)
+        z[i] = best
+    return z
+
+
+class AnomalyScores:
+    """Per-term anomaly scores of one release, for ranking within branches."""
+
+    def __init__(self, graph, weights=WEIGHTS, tops=None):
+        self.graph = graph
+        n = len(graph)
+        self.branches = hpo_metrics.branches(graph, tops)
+        self.depth = hpo_metrics.depths(graph)
+        self.counts = hpo_metrics.descendant_counts(graph)
+        self.diffs = hpo_metrics.max_descendant_diffs(graph, self.counts)
+
+        terms = [i for i in graph.declared_ids() if self.branches[i]]
+        leaves = [i for i in terms if graph.num_children(i) == 0 and self.depth[i] >= 0]
+        parents = [i for i in terms if graph.num_children(i)]
+
+        counts, diffs = self.counts, self.diffs
+        ratio = array('d', bytes(8 * n))
+        siblings = []
+        for i in terms:
+            if graph.num_parents(i):
+                ratio[i] = math.log2((counts[i] + diffs[i] + 1) / (counts[i] + 1))
+                siblings.append(i)
+        fan_out = array('d', bytes(8 * n))
+        for i in parents:
+            fan_out[i] = math.log2(graph.num_children(i))
+        self.scores = {
+            'Sibling_Imbalance': _z_scores(ratio, siblings, self.branches, upper=True),
+            'Depth_Outlier': _z_scores(self.depth, leaves, self.branches),
+            'Fan_Out': _z_scores(fan_out, parents, self.branches),
+        }
+        w_imbalance, w_depth, w_fan = weights
+        imbalance = self.scores['Sibling_Imbalance']
+        depth_z, fan_z = self.scores['Depth_Outlier'], self.scores['Fan_Out']
+        self.score = array('d', bytes(8 * n))
+        for i in terms:
+            self.score[i] = w_imbalance * imbalance[i] + w_depth * depth_z[i] + w_fan * fan_z[i]
+        self.terms = terms
+
+    @classmethod
+    def from_file(cls, filepath, weights=WEIGHTS, tops=None):
+        """Scores of a release file; ``tops`` are IRIs (see ``hpo_metrics.branches``)."""
+        graph = load_graph(filepath)
+        if tops is not None:
+            missing = [t for t in tops if t not in graph]
+            if missing:
+                raise KeyError(missing[0])
+            tops = [graph.index_of(t) for t in tops]
+        return cls(graph, weights, tops)
+
+    def top_k(self, k=20, terms=None, branches=None):
+        """{branch id: [term ids]}, each branch's ``k`` highest scores first.
+
+        ``terms`` restricts the ranked terms (ids, default all declared
+        terms) and ``branches`` the branch ids reported. Ties go to the
+        term listed first in the release.
+        """
+        if k < 1:
+            return {}
+        score, ids = self.score, self.graph.ids
+        wanted = set(branches) if branches is not None else None
+        heaps = {}
+        for i in self.terms if terms is None else terms:
+            s = score[i]
+            if s <= 0:
+                continue
+            # Min-heap of the k best so far, weakest at heap[0]
+            entry = (s, -i)
+            for b in self.branches[i]:
+                if wanted is not None and b not in wanted:
+                    continue
+                heap = heaps.get(b)
+                if heap is None:
+                    heap = heaps[b] = []
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        return {b: [-i for _, i in sorted(heap, reverse=True)]
+                for b, heap in sorted(heaps.items(), key=lambda item: ids[item[0]])}
+
+    def rows(self, k=20, terms=None, branches=None):
+        """ANOMALY_FIELDS rows of ``top_k``, branch by branch."""
+        graph = self.graph
+        rows = []
+        for b, ranked in self.top_k(k, terms, branches).items():
+            for rank, i in enumerate(ranked, 1):
+                row = {
+                    'Branch_ID': graph.ids[b],
+                    'Branch_Label': graph.label(b),
+                    'Rank': rank,
+                    'Node_ID': graph.ids[i],
+                    'Node_Label': graph.label(i),
+                    'Anomaly_Score': round(self.score[i], 4),
+                }
+                for name in SCORES:
+                    row[name] = round(self.scores[name][i], 4)
+                row.update({
+                    'Depth': self.depth[i],
+                    'Num_Children': graph.num_children(i),
+                    'Num_Descendants': self.counts[i],
+                    'Max_Num_Descendant_Diff': self.diffs[i],
+                })
+                rows.append(row)
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the structurally most unusual terms of each branch.")
+    parser.add_argument('release', help="release or subset to score (obographs JSON or .ivosnap)")
+    parser.add_argument('--k', type=int, default=20, help="terms kept per branch")
+    parser.add_argument('--top', nargs='+', metavar='TERM',
+                        help="rank within the children of these IRIs (default: of the roots), "
+                             "e.g. HP_0000118's IRI for a whole release")
+    parser.add_argument('--branch', nargs='+', metavar='TERM', help="only report these branch IRIs")
+    parser.add_argument('--old', help="older release: only rank terms that are new in RELEASE")
+    parser.add_argument('--weights', nargs=3, type=float, default=WEIGHTS, metavar='W',
+                        help=f"weights of {', '.join(SCORES)}")
+    parser.add_argument('--out', default='anomalies.csv', help="output CSV")
+    args = parser.parse_args()
+    if args.k < 1:
+        parser.error("--k must be at least 1")
+
+    start = time.perf_counter()
+    try:
+        scores = AnomalyScores.from_file(args.release, args.weights, args.top)
+    except KeyError as e:
+        parser.error(f"{e.args[0]} is not in {args.release}")
+    graph = scores.graph
+    print(f"Scored {len(scores.terms)} terms in {time.perf_counter() - start:.1f}s")
+
+    terms = branches = None
+    if args.old:
+        old = load_graph(args.old)
+        terms = [i for i in scores.terms if graph.ids[i] not in old]
+        print(f"Ranking the {len(terms)} terms new since {args.old}")
+    if args.branch:
+        branches = []
+        for iri in args.branch:
+            i = graph.index_of(iri)
+            if i is None:
+                parser.error(f"{iri} is not in {args.release}")
+            branches.append(i)
+
+    start = time.perf_counter()
+    rows = scores.rows(args.k, terms, branches)
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=ANOMALY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Top {args.k} of {len({r['Branch_ID'] for r in rows})} branches ranked in "
+          f"{time.perf_counter() - start:.2f}s; {len(rows)} rows written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""Content-addressed on-disk cache for derived ontology artifacts.
+
+Artifacts (subsets, hierarchy rows, parent rows, pipeline stage outputs)
+are pickled under a key built from the SHA-256 of the input files, the
+parameters (root id, predicate filter, ...) and a version number that is
+bumped when the code producing the artifact changes. Entries live in
+``<cache_dir>/<key[:2]>/<key>.pkl``; reading one refreshes its mtime,
+and when the cache grows past ``max_bytes`` the least recently used
+entries are removed, with their lock files. The total size is kept in
+``<cache_dir>/size`` and updated by every write, so the directory is
+only scanned when that total goes past ``max_bytes`` (or the file is
+missing); overwritten entries count twice until the next scan. An
+entry that cannot be read back (truncated, or pickled by incompatible
+code) counts as a miss and is removed.
+
+Several processes can share a cache directory: entries are written to a
+temporary file and renamed into place, and a process computing an entry
+holds that entry's lock (fcntl.flock on ``locks/<key[:2]>/<key>.lock``)
+so others (and other threads of the same process) wait for it instead
+of computing the same artifact again. Computing an artifact may need
+others (a pipeline stage asks for its inputs), so a thread can hold
+several locks; as inputs never depend on what they feed, locks are
+always taken in dependency order and cannot deadlock. On platforms
+without fcntl the locks are skipped and concurrent misses may compute
+twice.
+
+Hashing a large release costs about as much as parsing it, so file
+hashes are kept in the cache too, keyed by path, size and mtime.
+
+Usage: python hpo_cache.py [--cache-dir DIR] {stats,clear,evict} [--max-mb N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_CACHE_DIR = '.ivo_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_MISSING = object()
+
+# Locks each thread holds, so nested computes (a stage computing its
+# inputs) re-enter a lock instead of waiting on themselves
+_held = threading.local()
+
+
+def artifact_key(kind, version, *parts):
+    """Cache key of an artifact from its kind, code version and parameters."""
+    payload = json.dumps([kind, version, *parts], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _sha256_file(filepath, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """Size-bounded LRU cache of pickled artifacts shared between processes."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._hashes = {}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.pkl')
+
+    def _lock_path(self, name):
+        return os.path.realpath(os.path.join(self.directory, 'locks', f'{name}.lock'))
+
+    @contextmanager
+    def _lock(self, name):
+        """Exclusive lock shared with other processes and threads using this directory."""
+        lock_path = self._lock_path(name)
+        held = _held.__dict__.setdefault('paths', {})
+        if fcntl is None or lock_path in held:
+            yield
+            return
+        while True:
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            f = open(lock_path, 'a')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # Eviction may have removed the file while we waited; a lock on
+            # the removed file would not exclude anyone opening a new one
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(f.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+        held[lock_path] = f
+        try:
+            yield
+        finally:
+            del held[lock_path]
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def _remove_lock(self, key):
+        """Remove the lock file of ``key`` unless someone holds or waits for it."""
+        lock_path = self._lock_path(f'{key[:2]}/{key}')
+        if fcntl is None or lock_path in _held.__dict__.get('paths', {}):
+            return
+        try:
+            f = open(lock_path, 'r')
+        except FileNotFoundError:
+            return
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key, default=None):
+        """The artifact stored under ``key``, or ``default``."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except Exception:
+            # Truncated, or pickled by code that no longer loads it
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return default
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            written = f.tell()
+        os.replace(tmp_path, path)
+        if self.max_bytes is not None:
+            self._grow(written)
+
+    def _grow(self, written):
+        """Add ``written`` bytes to the stored total, evicting when it is over the bound."""
+        with self._lock('evict'):
+            try:
+                with open(os.path.join(self.directory, 'size'), 'r') as f:
+                    total = int(f.read()) + written
+            except (FileNotFoundError, ValueError):
+                total = None
+            if total is None or total > self.max_bytes:
+                self.evict()
+            else:
+                self._write_size(total)
+
+    def _write_size(self, total):
+        size_path = os.path.join(self.directory, 'size')
+        tmp_path = f'{size_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(total))
+        os.replace(tmp_path, size_path)
+
+    def get_or_compute(self, key, compute):
+        """Return ``(value, computed)``; ``compute()`` runs at most once across processes."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value, False
+        # One lock per key: unrelated artifacts never wait on each other
+        with self._lock(f'{key[:2]}/{key}'):
+            # Another process may have stored it while we waited for the lock
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value, False
+            self.misses += 1
+            value = compute()
+            self.put(key, value)
+        return value, True
+
+    def entries(self):
+        """(mtime, size, path) of every stored artifact."""
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for shard in os.listdir(self.directory):
+            shard_dir = os.path.join(self.directory, shard)
+            if len(shard) != 2 or not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(shard_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_mtime, st.st_size, path))
+        return found
+
+    def evict(self, max_bytes=None):
+        """Remove least recently used artifacts until the cache fits; returns bytes freed."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return 0
+        with self._lock('evict'):
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for _, size, path in entries:
+                if total - freed <= max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                freed += size
+            self._remove_orphan_locks()
+            if os.path.isdir(self.directory):
+                self._write_size(total - freed)
+        return freed
+
+    def _remove_orphan_locks(self):
+        """Remove the lock files of keys that have no stored artifact."""
+        locks_dir = os.path.join(self.directory, 'locks')
+        if not os.path.isdir(locks_dir):
+            return
+        for shard in os.listdir(locks_dir):
+            shard_dir = os.path.join(locks_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                key = name[:-len('.lock')]
+                if name.endswith('.lock') and not os.path.exists(self._path(key)):
+                    self._remove_lock(key)
+
+    def clear(self):
+        return self.evict(0)
+
+    def file_hash(self, filepath):
+        """SHA-256 of a file, reused while its path, size and mtime are unchanged."""
+        st = os.stat(filepath)
+        signature = [os.path.abspath(filepath), st.st_size, st.st_mtime_ns]
+        key = artifact_key('file_hash', 1, signature)
+        digest = self._hashes.get(key)
+        if digest is None:
+            digest, _ = self.get_or_compute(key, lambda: _sha256_file(filepath))
+            self._hashes[key] = digest
+        return digest
+
+    def memoize(self, kind, version, filepaths, params, compute):
+        """``compute()`` cached under the content of ``filepaths`` plus ``params``."""
+        key = artifact_key(kind, version, [self.file_hash(p) for p in filepaths], params)
+        return self.get_or_compute(key, compute)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the IVO artifact cache.")
+    parser.add_argument('command', choices=['stats', 'clear', 'evict'])
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2,
+                        help="size to trim the cache to with evict")
+    args = parser.parse_args()
+
+    cache = ArtifactCache(args.cache_dir, int(args.max_mb * 1024 ** 2))
+    if args.command == 'clear':
+        print(f"Removed {cache.clear() / 1024 ** 2:.1f} MB from {args.cache_dir}")
+    elif args.command == 'evict':
+        print(f"Removed {cache.evict() / 1024 ** 2:.1f} MB from {args.cache_dir}")
+    entries = cache.entries()
+    print(f"{len(entries)} artifacts, {sum(size for _, size, _ in entries) / 1024 ** 2:.1f} MB in {args.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()
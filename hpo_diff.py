@@ -0,0 +1,273 @@
+"""Differences between HPO releases over a shared interned id space.
+
+A ``ReleaseSet`` loads every release exactly once (in a process pool when
+there are several), maps each release's terms into one global IRI -> id
+table, and keeps per release the declared term ids, their labels and the
+is_a edges as packed ``child << 32 | parent`` integers. Any pair of loaded
+releases can then be diffed with set operations on integers.
+
+Usage: python hpo_diff.py releases_dir [output_dir] [--pair OLD NEW]
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from hpo_graph import load_graph
+
+_EDGE_SHIFT = 32
+_EDGE_MASK = (1 << _EDGE_SHIFT) - 1
+
+_MONTHS = {m: i for i, m in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+_RELEASE_DATE = re.compile(r'(\d{4})-(\d{2}|[A-Za-z]{3})(?:-(\d{2}))?')
+
+TIMELINE_FIELDS = ['ID', 'Label', 'First_Seen', 'Last_Seen', 'Num_Releases']
+
+
+def _by_id(record):
+    return record['id']
+
+
+def _by_edge(record):
+    return record['sub'], record['obj']
+
+
+def release_name(filepath):
+    """Release name used in reports: the file name without extension."""
+    name = os.path.basename(filepath)
+    return name[:name.index('.')] if '.' in name else name
+
+
+def release_sort_key(filepath):
+    """Order releases by the date in their name (2025-Oct, 2025-10-01), then by name."""
+    name = release_name(filepath)
+    m = _RELEASE_DATE.search(name)
+    if m:
+        month = m.group(2)
+        month = int(month) if month.isdigit() else _MONTHS.get(month.lower(), 0)
+        return (0, int(m.group(1)), month, int(m.group(3) or 0), name)
+    return (1, 0, 0, 0, name)
+
+
+def find_releases(directory):
+    """JSON releases in ``directory``, in release order."""
+    files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.json')]
+    return sorted(files, key=release_sort_key)
+
+
+def _read_release(filepath):
+    """Worker: parse one release into plain lists that pickle cheaply."""
+    graph = load_graph(filepath)
+    declared = graph.declared_ids()
+    ids = list(graph.ids)
+    labels = [graph.labels[i] for i in declared]
+    deprecated = array('i', sorted(graph.deprecated))
+    children = array('i')
+    parents = array('i')
+    for i in range(len(graph)):
+        for p in graph.parents(i):
+            children.append(i)
+            parents.append(p)
+    return ids, array('i', declared), labels, deprecated, children, parents
+
+
+class Release:
+    """One release mapped into a ReleaseSet's global id space."""
+
+    def __init__(self, name, path, labels, deprecated, edges):
+        self.name = name
+        self.path = path
+        self.labels = labels          # global id -> label (declared terms only)
+        self.deprecated = deprecated  # global ids marked obsolete
+        self.edges = edges            # packed child << 32 | parent
+
+    @property
+    def terms(self):
+        return self.labels.keys()
+
+
+class ReleaseSet:
+    """Releases loaded once into a shared IRI -> id table."""
+
+    def __init__(self):
+        self.ids = []
+        self.index = {}
+        self.releases = {}
+        self.order = []
+
+    def intern(self, iri):
+        i = self.index.get(iri)
+        if i is None:
+            i = self.index[iri] = len(self.ids)
+            self.ids.append(iri)
+        return i
+
+    def add(self, filepath, parsed):
+        ids, declared, labels, deprecated, children, parents = parsed
+        local = [self.intern(iri) for iri in ids]
+        name = release_name(filepath)
+        if name in self.releases:
+            name = f'{name}#{len(self.order)}'
+        release = Release(
+            name, filepath,
+            {local[i]: lbl for i, lbl in zip(declared, labels)},
+            {local[i] for i in deprecated},
+            {local[c] << _EDGE_SHIFT | local[p] for c, p in zip(children, parents)})
+        self.releases[release.name] = release
+        self.order.append(release.name)
+        return release
+
+    @classmethod
+    def load(cls, filepaths, workers=None):
+        """Load releases in order, parsing them in parallel processes."""
+        releases = cls()
+        filepaths = list(filepaths)
+        if workers == 1 or len(filepaths) < 2:
+            parsed = [_read_release(f) for f in filepaths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parsed = list(pool.map(_read_release, filepaths))
+        for filepath, result in zip(filepaths, parsed):
+            releases.add(filepath, result)
+        return releases
+
+    def edge_record(self, packed):
+        return {'sub': self.ids[packed >> _EDGE_SHIFT], 'obj': self.ids[packed & _EDGE_MASK]}
+
+    def diff(self, old_name, new_name):
+        """Structured delta between two loaded releases.
+
+        Terms are joined on their global id and edges on their packed
+        integer, so the whole delta comes from one pass of set operations:
+
+        - ``added`` / ``removed`` / ``relabeled`` / ``obsoleted`` terms
+        - ``edges_added`` / ``edges_removed`` is_a edges
+        - ``reparented``: terms in both releases whose parent set changed
+        - ``split``: old parents whose moved-out children went to two or
+          more different new parents
+        - ``merged``: new parents that received moved children from two or
+          more different old parents
+        """
+        old, new = self.releases[old_name], self.releases[new_name]
+        old_labels, new_labels = old.labels, new.labels
+        ids = self.ids
+        shared = old_labels.keys() & new_labels.keys()
+        added = new_labels.keys() - old_labels.keys()
+        removed = old_labels.keys() - new_labels.keys()
+        relabeled = [i for i in shared if old_labels[i] != new_labels[i]]
+        obsoleted = (new.deprecated - old.deprecated) & shared
+        edges_added = new.edges - old.edges
+        edges_removed = old.edges - new.edges
+
+        # Group changed edges by child; only terms present in both releases move
+        lost, gained = {}, {}
+        for packed in edges_removed:
+            child = packed >> _EDGE_SHIFT
+            if child in shared:
+                lost.setdefault(child, []).append(packed & _EDGE_MASK)
+        for packed in edges_added:
+            child = packed >> _EDGE_SHIFT
+            if child in shared:
+                gained.setdefault(child, []).append(packed & _EDGE_MASK)
+
+        reparented = []
+        split, merged = {}, {}
+        for child in lost.keys() | gained.keys():
+            sources = lost.get(child, [])
+            targets = gained.get(child, [])
+            reparented.append({
+                'id': ids[child],
+                'label': new_labels[child],
+                'parents_removed': sorted(ids[p] for p in sources),
+                'parents_added': sorted(ids[p] for p in targets),
+            })
+            for source in sources:
+                split.setdefault(source, set()).update(targets)
+            for target in targets:
+                merged.setdefault(target, set()).update(sources)
+
+        return {
+            'old': old_name,
+            'new': new_name,
+            'added': sorted(ids[i] for i in added),
+            'removed': sorted(ids[i] for i in removed),
+            'relabeled': sorted(({'id': ids[i], 'old_label': old_labels[i], 'new_label': new_labels[i]}
+                                 for i in relabeled), key=_by_id),
+            'obsoleted': sorted(ids[i] for i in obsoleted),
+            'edges_added': sorted((self.edge_record(e) for e in edges_added), key=_by_edge),
+            'edges_removed': sorted((self.edge_record(e) for e in edges_removed), key=_by_edge),
+            'reparented': sorted(reparented, key=_by_id),
+            'split': sorted(({'id': ids[p], 'new_parents': sorted(ids[t] for t in targets)}
+                             for p, targets in split.items() if len(targets) > 1), key=_by_id),
+            'merged': sorted(({'id': ids[p], 'old_parents': sorted(ids[s] for s in sources)}
+                              for p, sources in merged.items() if len(sources) > 1), key=_by_id),
+        }
+
+    def consecutive_diffs(self):
+        return [self.diff(a, b) for a, b in zip(self.order, self.order[1:])]
+
+    def timeline(self):
+        """First and last release in which each term was seen, in release order."""
+        first, last, count, label = {}, {}, {}, {}
+        for name in self.order:
+            for i, lbl in self.releases[name].labels.items():
+                first.setdefault(i, name)
+                last[i] = name
+                count[i] = count.get(i, 0) + 1
+                label[i] = lbl
+        return [{
+            'ID': self.ids[i],
+            'Label': label[i] or '',
+            'First_Seen': first[i],
+            'Last_Seen': last[i],
+            'Num_Releases': count[i],
+        } for i in sorted(first, key=lambda i: self.ids[i])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff every consecutive pair of HPO releases in a directory.")
+    parser.add_argument('releases_dir', help="directory of obographs JSON releases")
+    parser.add_argument('output_dir', nargs='?', default='.', help="where to write diffs and term_timeline.csv")
+    parser.add_argument('--pair', nargs=2, action='append', metavar=('OLD', 'NEW'),
+                        help="diff these two releases (by name) instead of consecutive pairs; repeatable")
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: one per core)")
+    args = parser.parse_args()
+
+    releases = find_releases(args.releases_dir)
+    if len(releases) < 2:
+        print(f"Need at least two releases in {args.releases_dir}, found {len(releases)}")
+        sys.exit(1)
+
+    print(f"Loading {len(releases)} releases...")
+    release_set = ReleaseSet.load(releases, args.workers)
+    print(f"Interned {len(release_set.ids)} distinct terms")
+
+    if args.pair:
+        deltas = [release_set.diff(old, new) for old, new in args.pair]
+    else:
+        deltas = release_set.consecutive_diffs()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for delta in deltas:
+        print(f"{delta['old']} -> {delta['new']}: +{len(delta['added'])} -{len(delta['removed'])} "
+              f"relabeled {len(delta['relabeled'])}, edges +{len(delta['edges_added'])} "
+              f"-{len(delta['edges_removed'])}")
+        path = os.path.join(args.output_dir, f"diff_{delta['old']}__{delta['new']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(delta, f, indent=1, ensure_ascii=False)
+
+    timeline_path = os.path.join(args.output_dir, 'term_timeline.csv')
+    with open(timeline_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=TIMELINE_FIELDS)
+        writer.writeheader()
+        writer.writerows(release_set.timeline())
+    print(f"Diffs and {timeline_path} written to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Flagging rules over parent-analysis rows.
+
+A ``Rule`` compares one column with a threshold. ``evaluate`` runs any
+number of rules over the rows in a single pass and keeps, per rule, the
+set of flagged rows as an int bitset, so counts and combinations ("either
+method") of a whole threshold grid come from bit operations rather than
+from rerunning the analysis per threshold.
+"""
+import operator
+
+CHILDREN_COLUMN = 'Parent_Children_Count (min)'
+DESC_DIFF_COLUMN = 'Parent_Max_Desc_Diff'
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+}
+
+_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+SWEEP_FIELDS = ['Max_Parent_Children', 'Min_Desc_Diff', 'Flag_Parent_Children',
+                'Flag_Desc_Diff', 'Flag_Either', 'Flag_Both']
+
+
+class Rule:
+    """Flag a row when ``row[column] <op> threshold``; empty cells never flag."""
+
+    def __init__(self, column, op, threshold, name=None):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator {op!r}; expected one of {', '.join(OPERATORS)}")
+        self.column = column
+        self.op = op
+        self.threshold = threshold
+        self.name = name or f'{column} {op} {threshold}'
+        self._compare = OPERATORS[op]
+
+    def __call__(self, row):
+        value = row[self.column]
+        return value not in (None, '') and self._compare(int(value), self.threshold)
+
+    def __repr__(self):
+        return f'Rule({self.name!r})'
+
+
+def parent_children_rule(max_parent_children=1):
+    """Method 1: a parent shared with the old release had few children there."""
+    return Rule(CHILDREN_COLUMN, '<=', max_parent_children)
+
+
+def desc_diff_rule(min_desc_diff=100):
+    """Method 2: a shared parent's Max_Num_Descendant_Diff was large."""
+    return Rule(DESC_DIFF_COLUMN, '>=', min_desc_diff)
+
+
+def _bitset(mask):
+    """Int with bit i set where ``mask[i]`` is 1."""
+    return int(mask[::-1].translate(_DIGITS) or b'0', 2)
+
+
+def evaluate(rows, rules):
+    """Evaluate every rule over ``rows`` in one pass; returns {rule.name: bitset}."""
+    rows = rows if isinstance(rows, list) else list(rows)
+    masks = [bytearray(len(rows)) for _ in rules]
+    for position, row in enumerate(rows):
+        for mask, rule in zip(masks, rules):
+            if rule(row):
+                mask[position] = 1
+    return {rule.name: _bitset(mask) for rule, mask in zip(rules, masks)}
+
+
+def sweep(rows, max_parent_children=(0, 1, 2, 3), min_desc_diff=(50, 100, 200, 500)):
+    """Flag counts for every pair of thresholds of the two methods."""
+    children_rules = [parent_children_rule(t) for t in max_parent_children]
+    diff_rules = [desc_diff_rule(t) for t in min_desc_diff]
+    flagged = evaluate(rows, children_rules + diff_rules)
+
+    results = []
+    for children_rule in children_rules:
+        by_children = flagged[children_rule.name]
+        for diff_rule in diff_rules:
+            by_diff = flagged[diff_rule.name]
+            results.append({
+                'Max_Parent_Children': children_rule.threshold,
+                'Min_Desc_Diff': diff_rule.threshold,
+                'Flag_Parent_Children': by_children.bit_count(),
+                'Flag_Desc_Diff': by_diff.bit_count(),
+                'Flag_Either': (by_children | by_diff).bit_count(),
+                'Flag_Both': (by_children & by_diff).bit_count(),
+            })
+    return results
@@ -0,0 +1,226 @@
+"""Compact ontology graph shared by the IVO scripts.
+
+HPO IRIs are interned to dense integer ids, labels are kept in a single
+id -> label list, and parent/child adjacency is stored as CSR arrays
+(an offsets array plus an indices array) instead of dicts of lists.
+"""
+from array import array
+from collections import deque
+
+from hpo_profile import stage
+from hpo_stream import iter_graph_records
+
+# Only subsumption edges are used by the hierarchy analyses
+IS_A = ('is_a',)
+
+
+def _csr(num_ids, keys, values):
+    """Group values by key into CSR (offsets, indices), keeping input order."""
+    offsets = array('i', bytes(4 * (num_ids + 1)))
+    for k in keys:
+        offsets[k + 1] += 1
+    for i in range(num_ids):
+        offsets[i + 1] += offsets[i]
+
+    indices = array('i', bytes(4 * len(keys)))
+    cursor = offsets[:-1]
+    for k, v in zip(keys, values):
+        indices[cursor[k]] = v
+        cursor[k] += 1
+    return offsets, indices
+
+
+class OntologyGraph:
+    """Integer-indexed ontology graph with CSR parent and child adjacency.
+
+    Ids are dense integers in ``range(len(graph))``. ``declared[i]`` is 1 when
+    the term appears in the release's node list and 0 when it is only
+    referenced by an edge. ``deprecated`` is the set of ids marked obsolete
+    in the release. ``metrics`` holds per-id arrays precomputed by a
+    snapshot (see hpo_snapshot.py), keyed by metric name.
+    """
+
+    def __init__(self, ids, labels, declared,
+                 parent_offsets, parent_index, child_offsets, child_index):
+        self.ids = ids
+        self.labels = labels
+        self.declared = declared
+        self.parent_offsets = parent_offsets
+        self.parent_index = parent_index
+        self.child_offsets = child_offsets
+        self.child_index = child_index
+        self._index = None
+        self.deprecated = frozenset()
+        self.metrics = {}
+
+    @classmethod
+    def from_records(cls, nodes, edges, predicates=IS_A):
+        """Build a graph from obographs node and edge records."""
+        builder = GraphBuilder(predicates)
+        for node in nodes:
+            builder.add_node(node)
+        for edge in edges:
+            builder.add_edge(edge)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, iri):
+        return self.index_of(iri) is not None
+
+    @property
+    def num_edges(self):
+        return len(self.child_index)
+
+    @property
+    def index(self):
+        """IRI -> id hash index, built on first use."""
+        if self._index is None:
+            self._index = {iri: i for i, iri in enumerate(self.ids)}
+        return self._index
+
+    def index_of(self, iri):
+        """Return the id of an IRI, or None if the term is unknown."""
+        return self.index.get(iri)
+
+    def label(self, i, default=''):
+        """Return the label of id ``i``, or ``default`` if it has none."""
+        lbl = self.labels[i]
+        return default if lbl is None else lbl
+
+    def label_of(self, iri, default=''):
+        """Return the label of an IRI, or ``default`` if unknown or unlabeled."""
+        i = self.index_of(iri)
+        return default if i is None else self.label(i, default)
+
+    def parents(self, i):
+        return self.parent_index[self.parent_offsets[i]:self.parent_offsets[i + 1]]
+
+    def children(self, i):
+        return self.child_index[self.child_offsets[i]:self.child_offsets[i + 1]]
+
+    def num_parents(self, i):
+        return self.parent_offsets[i + 1] - self.parent_offsets[i]
+
+    def num_children(self, i):
+        return self.child_offsets[i + 1] - self.child_offsets[i]
+
+    def declared_ids(self):
+        """Ids of the terms listed in the release's node list."""
+        return [i for i in range(len(self.ids)) if self.declared[i]]
+
+    def roots(self):
+        """Declared terms without parents."""
+        offsets = self.parent_offsets
+        return [i for i in range(len(self.ids))
+                if self.declared[i] and offsets[i] == offsets[i + 1]]
+
+    def descendants(self, roots):
+        """Return a bytearray mask of ``roots`` and everything below them."""
+        offsets, index = self.child_offsets, self.child_index
+        seen = bytearray(len(self.ids))
+        queue = deque()
+        for r in roots:
+            if not seen[r]:
+                seen[r] = 1
+                queue.append(r)
+        while queue:
+            node = queue.popleft()
+            for j in range(offsets[node], offsets[node + 1]):
+                child = index[j]
+                if not seen[child]:
+                    seen[child] = 1
+                    queue.append(child)
+        return seen
+
+
+class GraphBuilder:
+    """Incrementally intern node and edge records into an OntologyGraph.
+
+    Pass ``predicates=None`` to keep every edge type.
+    """
+
+    def __init__(self, predicates=IS_A):
+        self.predicates = None if predicates is None else frozenset(predicates)
+        self.index = {}
+        self.ids = []
+        self.labels = []
+        self.declared = bytearray()
+        self.deprecated = set()
+        self.sub = array('i')
+        self.obj = array('i')
+
+    def intern(self, iri):
+        i = self.index.get(iri)
+        if i is None:
+            i = len(self.ids)
+            self.index[iri] = i
+            self.ids.append(iri)
+            self.labels.append(None)
+            self.declared.append(0)
+        return i
+
+    def add_node(self, node):
+        iri = node.get('id')
+        if iri is None:
+            return
+        i = self.intern(iri)
+        self.declared[i] = 1
+        # Later duplicates win, as with a dict comprehension over the node list
+        self.labels[i] = node.get('lbl')
+        if node.get('deprecated') or (node.get('meta') or {}).get('deprecated'):
+            self.deprecated.add(i)
+
+    def add_edge(self, edge):
+        if self.predicates is not None and edge.get('pred') not in self.predicates:
+            return
+        child = edge.get('sub')
+        parent = edge.get('obj')
+        if child and parent:
+            self.sub.append(self.intern(child))
+            self.obj.append(self.intern(parent))
+
+    def build(self):
+        n = len(self.ids)
+        parent_offsets, parent_index = _csr(n, self.sub, self.obj)
+        child_offsets, child_index = _csr(n, self.obj, self.sub)
+        graph = OntologyGraph(self.ids, self.labels, self.declared,
+                              parent_offsets, parent_index,
+                              child_offsets, child_index)
+        graph._index = self.index
+        graph.deprecated = frozenset(self.deprecated)
+        return graph
+
+
+def load_graph(filepath, predicates=IS_A):
+    """Stream the first graph of an obographs JSON release into an OntologyGraph.
+
+    ``.ivosnap`` files are memory-mapped directly, and a JSON release with an
+    up-to-date snapshot next to it is served from that snapshot. A snapshot
+    holds the edges of the predicates it was compiled with, so asking one
+    for other ``predicates`` raises ValueError.
+    """
+    import hpo_snapshot
+
+    if filepath.endswith(hpo_snapshot.SNAPSHOT_SUFFIX):
+        snapshot = hpo_snapshot.open_snapshot(filepath)
+        if snapshot.predicates != hpo_snapshot.predicates_key(predicates):
+            raise ValueError(f"{filepath} holds {hpo_snapshot.describe_predicates(snapshot.predicates)}, "
+                             f"not {hpo_snapshot.describe_predicates(predicates)}; "
+                             f"use the JSON release it was compiled from")
+        return snapshot.graph
+    snapshot = hpo_snapshot.find_snapshot(filepath, predicates)
+    if snapshot is not None:
+        return snapshot.graph
+
+    builder = GraphBuilder(predicates)
+    with stage('load_graph.parse') as s:
+        for kind, record in iter_graph_records(filepath):
+            if kind == 'node':
+                builder.add_node(record)
+            else:
+                builder.add_edge(record)
+        s.count(terms=len(builder.ids), edges=len(builder.sub))
+    with stage('load_graph.build_csr'):
+        return builder.build()
@@ -0,0 +1,416 @@
+"""Hierarchy metrics of a release updated from the previous release's.
+
+``update_metrics`` takes the new release's graph, the previous release's
+hierarchy rows (``Depth``, ``Num_Descendants`` and
+``Max_Num_Descendant_Diff`` per ID, as in the ``hpo_*-hierarchy.csv``
+files) and the delta between the two releases (``added`` / ``removed``
+terms and ``edges_added`` / ``edges_removed``, as written by
+2.compare_jsons.py), and recomputes only what the delta can change:
+
+- ``Num_Descendants`` of X is the number of child edges summed over X and
+  its distinct descendants. Let R be the parents of changed edges plus
+  everything below their children, in either release. Edges outside R
+  are unchanged and reach the same terms, so only X's closure within R
+  can differ, and only the ancestors of changed edges are updated:
+  new = old - (old edges below X in R) + (new edges below X in R).
+- ``Depth`` is redone by a shortest-path pass over the terms below
+  changed edges, starting from the unchanged depths of their parents.
+- ``Max_Num_Descendant_Diff`` is redone for the terms whose count,
+  parents or siblings changed.
+
+Terms without a previous row (new or previously undeclared) are counted
+from scratch. The result equals a full recompute, which ``verify``
+checks on a pair of releases, as long as the previous rows and the delta
+come from the same old release; ``fits_previous`` checks their term sets.
+
+Usage: python hpo_incremental.py previous-hierarchy.csv delta.json new_release.json [--out hierarchy.csv]
+       python hpo_incremental.py --verify old_release.json new_release.json
+"""
+import argparse
+import csv
+import heapq
+import json
+import sys
+import time
+from array import array
+
+import hpo_metrics
+from hpo_diff import ReleaseSet
+from hpo_graph import load_graph
+from hpo_profile import stage
+
+
+def read_hierarchy_csv(filepath):
+    """Rows of a hierarchy CSV written by 3.summarize_subset.py, with integer metrics."""
+    with open(filepath, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for field in ('Depth', 'Num_Parents', 'Num_Children', 'Num_Descendants', 'Max_Num_Descendant_Diff'):
+            row[field] = int(row[field])
+    return rows
+
+
+def fits_previous(graph, previous_rows, delta):
+    """True if ``previous_rows`` cover the delta's old release: the declared
+    terms of ``graph`` without the added terms and with the removed ones."""
+    old_terms = set(graph.ids[i] for i in graph.declared_ids())
+    old_terms.difference_update(delta['added'])
+    old_terms.update(delta['removed'])
+    return len(previous_rows) == len(old_terms) and all(row['ID'] in old_terms for row in previous_rows)
+
+
+class _Delta:
+    """The delta's edges over the new graph's ids, with the previous release's adjacency.
+
+    Terms that only exist in the previous release get ids from
+    ``len(graph)`` up.
+    """
+
+    def __init__(self, graph, delta):
+        self.graph = graph
+        self.extra = {}
+        self.added_children, self.added_parents = {}, {}
+        self.removed_children, self.removed_parents = {}, {}
+        for edge in delta['edges_added']:
+            child, parent = self.id_of(edge['sub']), self.id_of(edge['obj'])
+            self.added_children.setdefault(parent, []).append(child)
+            self.added_parents.setdefault(child, []).append(parent)
+        for edge in delta['edges_removed']:
+            child, parent = self.id_of(edge['sub']), self.id_of(edge['obj'])
+            self.removed_children.setdefault(parent, []).append(child)
+            self.removed_parents.setdefault(child, []).append(parent)
+        self.changed_declared = [self.id_of(iri) for iri in delta['added'] + delta['removed']]
+
+    def id_of(self, iri):
+        i = self.graph.index_of(iri)
+        if i is None:
+            i = self.extra.setdefault(iri, len(self.graph) + len(self.extra))
+        return i
+
+    def new_children(self, i):
+        return self.graph.children(i) if i < len(self.graph) else ()
+
+    def new_parents(self, i):
+        return self.graph.parents(i) if i < len(self.graph) else ()
+
+    def iri_of(self, i):
+        if i < len(self.graph):
+            return self.graph.ids[i]
+        return next(iri for iri, j in self.extra.items() if j == i)
+
+    def old_children(self, i):
+        return self._old(i, self.new_children(i), self.added_children.get(i), self.removed_children.get(i))
+
+    def old_parents(self, i):
+        return self._old(i, self.new_parents(i), self.added_parents.get(i), self.removed_parents.get(i))
+
+    def _old(self, i, current, added, removed):
+        if not added and not removed:
+            return current
+        old = list(current)
+        for j in added or ():
+            try:
+                old.remove(j)
+            except ValueError:
+                raise ValueError(
+                    f"The delta adds an edge between {self.iri_of(i)} and {self.iri_of(j)} that the "
+                    f"new release does not have; it was computed between other releases "
+                    f"(e.g. full releases, used with a subset)") from None
+        old.extend(removed or ())
+        return old
+
+
+def _reach(starts, step):
+    """``starts`` and everything reached from them through ``step``."""
+    seen = set(starts)
+    stack = list(seen)
+    while stack:
+        for j in step(stack.pop()):
+            if j not in seen:
+                seen.add(j)
+                stack.append(j)
+    return seen
+
+
+def _closures(nodes, children, region):
+    """Bitset of the ``region`` terms at or below each of ``nodes``.
+
+    ``nodes`` must hold every ancestor of the region terms, so children
+    outside it have nothing of the region below them.
+    """
+    bit = {node: 1 << k for k, node in enumerate(region)}
+    closure = {}
+    for start in nodes:
+        if start in closure:
+            continue
+        # Iterative postorder; a child already on the path (an is_a cycle)
+        # is skipped rather than followed
+        path = {start}
+        stack = [(start, iter(children(start)))]
+        while stack:
+            node, pending = stack[-1]
+            for child in pending:
+                if child in nodes and child not in closure and child not in path:
+                    path.add(child)
+                    stack.append((child, iter(children(child))))
+                    break
+            else:
+                stack.pop()
+                path.discard(node)
+                bits = bit.get(node, 0)
+                for child in children(node):
+                    bits |= closure.get(child, 0)
+                closure[node] = bits
+    return closure
+
+
+def _weighted_sum(bits, masks):
+    return sum((bits & mask).bit_count() << b for b, mask in masks)
+
+
+def _masks(region, weight):
+    """(b, bitset of region terms whose weight has bit b set) for each bit b.
+
+    A weighted sum then takes one popcount per bit of the largest weight
+    rather than one per distinct weight.
+    """
+    masks = {}
+    for k, node in enumerate(region):
+        w = weight(node)
+        b = 0
+        while w:
+            if w & 1:
+                masks[b] = masks.get(b, 0) | 1 << k
+            w >>= 1
+            b += 1
+    return list(masks.items())
+
+
+def update_metrics(graph, previous_rows, delta):
+    """(depth, num_descendants, max_descendant_diff) arrays for ``graph``.
+
+    ``previous_rows`` are the previous release's hierarchy rows and
+    ``delta`` the release delta to ``graph`` (see the module docstring).
+    Values are exact for the declared terms, which are the ones hierarchy
+    rows cover; terms only referenced by edges count 0 descendants unless
+    they lie above a change.
+    """
+    n = len(graph)
+    d = _Delta(graph, delta)
+    depth = array('i', [-1]) * n
+    counts = array('q', bytes(8 * n))
+    diffs = array('q', bytes(8 * n))
+    known = bytearray(n)
+    old_diff = {}
+    # Previous counts of the changed terms and of terms only in the old release
+    old_counts = {}
+    for row in previous_rows:
+        i = graph.index_of(row['ID'])
+        if i is not None:
+            known[i] = 1
+            depth[i] = row['Depth']
+            counts[i] = row['Num_Descendants']
+            old_diff[i] = row['Max_Num_Descendant_Diff']
+        elif row['ID'] in d.extra:
+            old_counts[d.extra[row['ID']]] = row['Num_Descendants']
+    declared = graph.declared
+
+    changed_parents = set(d.added_children) | set(d.removed_children)
+    changed_children = set(d.added_parents) | set(d.removed_parents)
+
+    with stage('incremental.counts') as s:
+        region = _reach(changed_children, d.new_children) | _reach(changed_children, d.old_children)
+        region |= changed_parents
+        above = _reach(changed_parents, d.new_parents) | _reach(changed_parents, d.old_parents)
+        region = sorted(region)
+        new_closure = _closures(_reach(region, d.new_parents), d.new_children, region)
+        old_closure = _closures(_reach(region, d.old_parents), d.old_children, region)
+        new_masks = _masks(region, lambda i: len(d.new_children(i)))
+        old_masks = _masks(region, lambda i: len(d.old_children(i)))
+        changed = set()
+        for node in above:
+            if node >= n:
+                continue
+            if known[node]:
+                value = (counts[node] - _weighted_sum(old_closure.get(node, 0), old_masks)
+                         + _weighted_sum(new_closure.get(node, 0), new_masks))
+            else:
+                value = sum(graph.num_children(i) for i in _reach([node], graph.children))
+            if value != counts[node] or not known[node]:
+                if known[node]:
+                    old_counts[node] = counts[node]
+                counts[node] = value
+                changed.add(node)
+        for node in graph.declared_ids():
+            if not known[node] and node not in above:
+                counts[node] = sum(graph.num_children(i) for i in _reach([node], graph.children))
+                changed.add(node)
+        s.count(region=len(region), above=len(above), changed=len(changed))
+
+    with stage('incremental.depths') as s:
+        # Terms below a changed edge or a term whose root status may have
+        # changed, plus referenced-only terms with parents (no previous depth)
+        seeds = [i for i in changed_children | set(d.changed_declared) if i < n]
+        seeds += [i for i in range(n) if not known[i] and (declared[i] or graph.num_parents(i))]
+        moved = _reach(seeds, graph.children)
+        heap = []
+        for node in moved:
+            if declared[node] and graph.num_parents(node) == 0:
+                best = 0
+            else:
+                best = min((depth[p] + 1 for p in graph.parents(node)
+                            if p not in moved and depth[p] >= 0), default=-1)
+            depth[node] = -1
+            if best >= 0:
+                heap.append((best, node))
+        heapq.heapify(heap)
+        while heap:
+            dist, node = heapq.heappop(heap)
+            if depth[node] != -1:
+                continue
+            depth[node] = dist
+            for child in graph.children(node):
+                if child in moved and depth[child] == -1:
+                    heapq.heappush(heap, (dist + 1, child))
+        s.count(moved=len(moved))
+
+    with stage('incremental.diffs') as s:
+        groups = set()
+        for node in changed | set(d.changed_declared):
+            groups.update(d.new_parents(node))
+        groups |= {p for p in changed_parents if p < n}
+        redo = set(changed) | {c for c in changed_children if c < n}
+        redo |= {i for i in d.changed_declared if i < n}
+
+        def scan(children, value_of):
+            # Same scan as hpo_metrics.max_descendant_diffs
+            b, bc, second = -1, -1, -1
+            for child in children:
+                if child == bc:
+                    continue
+                value = value_of(child)
+                if value > b:
+                    b, bc, second = value, child, b
+                elif value > second:
+                    second = value
+            return b, bc, second
+
+        def new_value(child):
+            return counts[child] if declared[child] else 0
+
+        def old_value(child):
+            if child in old_counts:
+                return old_counts[child]
+            return counts[child] if child < n and known[child] else 0
+
+        stats = {}
+
+        def top_two(parent):
+            if parent not in stats:
+                stats[parent] = scan(graph.children(parent), new_value)
+            return stats[parent]
+
+        # A term's diff only depends on its siblings through the best and
+        # second best count of each parent, so the untouched siblings in a
+        # group whose top two stayed the same keep their diff
+        for parent in groups:
+            if top_two(parent) != scan(d.old_children(parent), old_value):
+                redo.update(graph.children(parent))
+
+        for node, value in old_diff.items():
+            diffs[node] = value
+        for node in redo:
+            top = -1
+            for parent in graph.parents(node):
+                b, bc, second = top_two(parent)
+                value = second if bc == node else b
+                if value > top:
+                    top = value
+            diffs[node] = max(0, top - counts[node]) if top >= 0 else 0
+        s.count(groups=len(groups), redone=len(redo))
+    return depth, counts, diffs
+
+
+def update_hierarchy_rows(graph, previous_rows, delta):
+    """``hpo_metrics.hierarchy_rows(graph)``, from the previous rows and the delta."""
+    depth, counts, diffs = update_metrics(graph, previous_rows, delta)
+    rows = []
+    for i in graph.declared_ids():
+        rows.append({
+            'ID': graph.ids[i],
+            'Label': graph.label(i, 'Unknown'),
+            'Depth': depth[i],
+            'Num_Parents': graph.num_parents(i),
+            'Num_Children': graph.num_children(i),
+            'Num_Descendants': counts[i],
+            'Max_Num_Descendant_Diff': diffs[i],
+        })
+    rows.sort(key=lambda r: (r['Depth'], r['ID']))
+    return rows
+
+
+def verify(old_path, new_path):
+    """Compare the incremental update against a full recompute; returns the mismatched rows."""
+    releases = ReleaseSet.load([old_path, new_path], workers=1)
+    delta = releases.diff(*releases.order)
+    old_graph, new_graph = load_graph(old_path), load_graph(new_path)
+    previous = hpo_metrics.hierarchy_rows(old_graph)
+    print(f"Delta: {len(delta['added'])} added, {len(delta['removed'])} removed terms, "
+          f"{len(delta['edges_added'])} added, {len(delta['edges_removed'])} removed edges")
+
+    start = time.perf_counter()
+    full = hpo_metrics.hierarchy_rows(new_graph)
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    updated = update_hierarchy_rows(new_graph, previous, delta)
+    update_time = time.perf_counter() - start
+    print(f"Full recompute {full_time:.2f}s, incremental update {update_time:.2f}s")
+
+    mismatched = [(a, b) for a, b in zip(full, updated) if a != b]
+    if len(full) != len(updated):
+        mismatched.append((len(full), len(updated)))
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update hierarchy metrics from the previous release's and a delta.")
+    parser.add_argument('inputs', nargs='+', help="previous-hierarchy.csv delta.json new_release.json, "
+                                                  "or old_release.json new_release.json with --verify")
+    parser.add_argument('--out', default='hpo_hierarchy.csv', help="output hierarchy CSV")
+    parser.add_argument('--verify', action='store_true',
+                        help="check the update against a full recompute on two releases")
+    args = parser.parse_args()
+
+    if args.verify:
+        if len(args.inputs) != 2:
+            parser.error("--verify takes old_release.json new_release.json")
+        mismatched = verify(*args.inputs)
+        for full, updated in mismatched[:10]:
+            print(f"  full:        {full}\n  incremental: {updated}")
+        print(f"{len(mismatched)} mismatched rows")
+        sys.exit(1 if mismatched else 0)
+
+    if len(args.inputs) != 3:
+        parser.error("expected previous-hierarchy.csv delta.json new_release.json")
+    previous_csv, delta_json, release = args.inputs
+    previous = read_hierarchy_csv(previous_csv)
+    with open(delta_json, 'r', encoding='utf-8') as f:
+        delta = json.load(f)
+    graph = load_graph(release)
+    if not fits_previous(graph, previous, delta):
+        parser.error(f"{previous_csv} does not hold the terms of the release {delta_json} starts from")
+    start = time.perf_counter()
+    try:
+        rows = update_hierarchy_rows(graph, previous, delta)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Updated {len(rows)} rows in {time.perf_counter() - start:.2f}s")
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=hpo_metrics.HIERARCHY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results exported to '{args.out}'")
+
+
+if __name__ == '__main__':
+    main()
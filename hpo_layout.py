@@ -0,0 +1,285 @@
+"""Layered (Sugiyama-style) coordinates for the terms below a root.
+
+The app's browser-side hierarchical layout stalls on subsets with
+thousands of terms, so the coordinates are computed here once per release
+and root and the app only draws fixed positions:
+
+- Layers: each term's layer is its shortest is_a distance from the root,
+  the depth the app shows.
+- Order: terms start in depth-first order from the root, so subtrees stay
+  together, then ``sweeps`` alternating passes sort each layer by the
+  barycenter of its parents' positions in the layer above (going down)
+  or its children's in the layer below (going up). The order with the
+  fewest crossings between adjacent layers is kept, as a pass can make
+  things worse on the many terms with several parents.
+- x: alternating passes place each term at the mean x of its children
+  (going up) or parents (going down), then move the layer to the
+  closest positions that keep its order and ``node_gap`` between
+  neighbours (an isotonic regression, linear in the layer size).
+
+Every pass is linear in the terms and edges apart from sorting each
+layer and counting crossings (E log V), so a subset of the whole of
+Phenotypic abnormality takes seconds.
+``cached_layout`` memoizes the coordinates by release contents and root
+in the artifact cache (hpo_cache.py).
+
+Usage: python hpo_layout.py subset.json [root_id] [--out subset.layout.csv] [--sweeps 4]
+"""
+import argparse
+import csv
+import os
+import time
+from collections import deque
+
+from hpo_cache import DEFAULT_CACHE_DIR, ArtifactCache
+from hpo_graph import load_graph
+from hpo_profile import stage
+
+# Bump when the coordinates change, to invalidate cached layouts
+LAYOUT_VERSION = 1
+
+# Horizontal space between neighbours and vertical space between layers,
+# in the app's (visNetwork) pixels
+NODE_GAP = 150
+LAYER_GAP = 150
+
+LAYOUT_FIELDS = ['id', 'x', 'y', 'layer']
+
+
+def assign_layers(graph, root):
+    """Terms below ``root`` grouped by layer (BFS distance), in visiting order."""
+    layer_of = {root: 0}
+    layers = [[root]]
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        below = layer_of[node] + 1
+        for child in graph.children(node):
+            if child not in layer_of:
+                layer_of[child] = below
+                if below == len(layers):
+                    layers.append([])
+                layers[below].append(child)
+                queue.append(child)
+    return layer_of, layers
+
+
+def _preorder(graph, root):
+    """Depth-first preorder index of every term below ``root``."""
+    index = {root: 0}
+    stack = [iter(graph.children(root))]
+    while stack:
+        for child in stack[-1]:
+            if child not in index:
+                index[child] = len(index)
+                stack.append(iter(graph.children(child)))
+                break
+        else:
+            stack.pop()
+    return index
+
+
+def _positions(layers):
+    """Position of each term as a fraction of its layer's width."""
+    position = {}
+    for layer in layers:
+        width = len(layer)
+        for k, node in enumerate(layer):
+            position[node] = (k + 0.5) / width
+    return position
+
+
+def order_layers(graph, root, layers, sweeps=4):
+    """Reorder ``layers`` in place to reduce edge crossings; returns the crossings left."""
+    preorder = _preorder(graph, root)
+    for layer in layers:
+        layer.sort(key=preorder.__getitem__)
+    layer_of = {node: depth for depth, layer in enumerate(layers) for node in layer}
+    position = _positions(layers)
+    best, fewest = [list(layer) for layer in layers], count_crossings(graph, layers)
+    for sweep in range(sweeps):
+        down = sweep % 2 == 0
+        neighbours = graph.parents if down else graph.children
+        for depth in (range(1, len(layers)) if down else range(len(layers) - 2, -1, -1)):
+            layer = layers[depth]
+            adjacent = depth - 1 if down else depth + 1
+            keys = {}
+            for node in layer:
+                total = count = 0
+                for other in neighbours(node):
+                    if layer_of.get(other) == adjacent:
+                        total += position[other]
+                        count += 1
+                keys[node] = total / count if count else position[node]
+            # Stable, so terms with equal barycenters keep their order
+            layer.sort(key=keys.__getitem__)
+            width = len(layer)
+            for k, node in enumerate(layer):
+                position[node] = (k + 0.5) / width
+        crossings = count_crossings(graph, layers)
+        if crossings < fewest:
+            best, fewest = [list(layer) for layer in layers], crossings
+    layers[:] = best
+    return fewest
+
+
+def _spread(desired, gap):
+    """Closest positions to ``desired`` (in order) that are ``gap`` or more apart.
+
+    Least squares under x[k+1] >= x[k] + gap: subtracting k * gap makes it
+    an isotonic regression, solved by pooling adjacent violators.
+    """
+    blocks = []  # [total, count] of pooled shifted values
+    for k, value in enumerate(desired):
+        total, count = value - k * gap, 1
+        while blocks and blocks[-1][0] / blocks[-1][1] > total / count:
+            t, c = blocks.pop()
+            total += t
+            count += c
+        blocks.append([total, count])
+    x = []
+    for total, count in blocks:
+        mean = total / count
+        x.extend([mean] * count)
+    return [value + k * gap for k, value in enumerate(x)]
+
+
+def assign_x(graph, layers, passes=3, node_gap=NODE_GAP):
+    """x of every term: alternately centred under its children and its parents."""
+    x = {}
+    for layer in layers:
+        offset = (len(layer) - 1) * node_gap / 2
+        for k, node in enumerate(layer):
+            x[node] = k * node_gap - offset
+    for sweep in range(passes):
+        up = sweep % 2 == 0
+        neighbours = graph.children if up else graph.parents
+        for layer in (reversed(layers) if up else layers):
+            desired = []
+            for node in layer:
+                total = count = 0
+                for other in neighbours(node):
+                    value = x.get(other)
+                    if value is not None:
+                        total += value
+                        count += 1
+                desired.append(total / count if count else x[node])
+            for node, value in zip(layer, _spread(desired, node_gap)):
+                x[node] = value
+    return x
+
+
+def count_crossings(graph, layers):
+    """Crossings among the edges between adjacent layers, for comparing orders.
+
+    Edges sorted by their upper end are crossed by every later edge whose
+    lower end lies to the left, so each layer pair is an inversion count
+    (a Fenwick tree over the lower layer).
+    """
+    crossings = 0
+    for upper, lower in zip(layers, layers[1:]):
+        below = {node: k for k, node in enumerate(lower)}
+        ends = sorted((k, below[child]) for k, node in enumerate(upper)
+                      for child in graph.children(node) if child in below)
+        tree = [0] * (len(lower) + 1)
+        for seen, (_, end) in enumerate(ends):
+            # Earlier edges, minus those ending at or left of this one
+            i, not_right = end + 1, 0
+            while i:
+                not_right += tree[i]
+                i -= i & -i
+            crossings += seen - not_right
+            i = end + 1
+            while i <= len(lower):
+                tree[i] += 1
+                i += i & -i
+    return crossings
+
+
+def layered_layout(graph, root, sweeps=4, passes=3, node_gap=NODE_GAP, layer_gap=LAYER_GAP):
+    """{id: (x, y, layer)} for ``root`` (an id) and every term below it."""
+    with stage('layout.layers') as s:
+        layer_of, layers = assign_layers(graph, root)
+        s.count(terms=len(layer_of), layers=len(layers))
+    with stage('layout.order', sweeps=sweeps) as s:
+        s.count(crossings=order_layers(graph, root, layers, sweeps))
+    with stage('layout.x', passes=passes):
+        x = assign_x(graph, layers, passes, node_gap)
+    return {node: (round(x[node], 1), layer * layer_gap, layer) for node, layer in layer_of.items()}
+
+
+def layout_rows(graph, root, **options):
+    """LAYOUT_FIELDS rows of ``layered_layout``, layer by layer."""
+    coordinates = layered_layout(graph, root, **options)
+    rows = [{'id': graph.ids[node], 'x': x, 'y': y, 'layer': layer}
+            for node, (x, y, layer) in coordinates.items()]
+    rows.sort(key=lambda row: (row['layer'], row['x']))
+    return rows
+
+
+def default_root(graph):
+    """The first root of ``graph``, as subsets have one."""
+    roots = graph.roots()
+    if not roots:
+        raise ValueError("The graph has no root term")
+    return graph.ids[roots[0]]
+
+
+def cached_layout(filepath, root_id=None, cache=None, sweeps=4, passes=3):
+    """``layout_rows`` of a release file, memoized on its contents, root and options."""
+    cache = cache or ArtifactCache()
+
+    def compute():
+        graph = load_graph(filepath)
+        root = graph.index_of(root_id or default_root(graph))
+        if root is None:
+            raise KeyError(root_id)
+        return layout_rows(graph, root, sweeps=sweeps, passes=passes)
+
+    return cache.memoize('layout', LAYOUT_VERSION, [filepath], [root_id, sweeps, passes], compute)
+
+
+def layout_path_for(filepath):
+    """Sidecar path for a subset file: name.json[.gz|.zst] -> name.layout.csv."""
+    for suffix in ('.gz', '.zst'):
+        if filepath.endswith(suffix):
+            filepath = filepath[:-len(suffix)]
+    return os.path.splitext(filepath)[0] + '.layout.csv'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute layered coordinates of a subset for IVO.qmd.")
+    parser.add_argument('subset', help="subset or release (obographs JSON or .ivosnap)")
+    parser.add_argument('root_id', nargs='?', help="IRI of the term to lay out from (default: the subset root)")
+    parser.add_argument('--out', help="output CSV (default: subset name + .layout.csv, which IVO.qmd reads)")
+    parser.add_argument('--sweeps', type=int, default=4, help="crossing-reduction sweeps")
+    parser.add_argument('--passes', type=int, default=3, help="x-positioning passes")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="artifact cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="always recompute")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.no_cache:
+        graph = load_graph(args.subset)
+        root = graph.index_of(args.root_id or default_root(graph))
+        if root is None:
+            parser.error(f"{args.root_id} is not in {args.subset}")
+        rows = layout_rows(graph, root, sweeps=args.sweeps, passes=args.passes)
+    else:
+        try:
+            rows = cached_layout(args.subset, args.root_id, ArtifactCache(args.cache_dir),
+                                 args.sweeps, args.passes)
+        except KeyError:
+            parser.error(f"{args.root_id} is not in {args.subset}")
+    out = args.out or layout_path_for(args.subset)
+    with open(out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=LAYOUT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    layers = rows[-1]['layer'] + 1 if rows else 0
+    print(f"Laid out {len(rows)} terms in {layers} layers in {time.perf_counter() - start:.2f}s; "
+          f"written to {out}")
+
+
+if __name__ == '__main__':
+    main()
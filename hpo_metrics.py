@@ -0,0 +1,406 @@
+"""Whole-ontology hierarchy metrics computed in linear sweeps.
+
+``Num_Descendants`` follows the definition used by 3.summarize_subset.py:
+the number of is_a edges inside a term's descendant closure (a child
+reached along two paths is counted once per incoming edge). It is computed
+for every term in one children-before-parents sweep, where each term's
+closure is an edge bitset (a Python int) OR-ed together from its
+children's. ``mode='sketch'`` replaces the bitsets with fixed-size
+HyperLogLog registers for ontologies too large for exact closures.
+
+Graphs opened from a snapshot carry these arrays precomputed in
+``graph.metrics``; the exact functions below return them directly.
+"""
+import math
+from array import array
+from collections import deque
+
+# HyperLogLog precision (2**p registers) used by the sketch mode
+SKETCH_PRECISION = 10
+
+# Columns of the per-subset sidecar read by IVO.qmd
+NODE_METRIC_FIELDS = ['id', 'depth', 'subtree_height', 'num_desc',
+                      'max_child_num_desc', 'desc_diff']
+
+HIERARCHY_FIELDS = ['ID', 'Label', 'Depth', 'Num_Parents', 'Num_Children',
+                    'Num_Descendants', 'Max_Num_Descendant_Diff']
+
+
+def depths(graph):
+    """Shortest is_a distance from any root for every id (-1 if unreachable)."""
+    if 'depth' in graph.metrics:
+        return graph.metrics['depth']
+    n = len(graph)
+    offsets, index = graph.child_offsets, graph.child_index
+    depth = array('i', [-1]) * n
+    queue = deque()
+    for root in graph.roots():
+        depth[root] = 0
+        queue.append(root)
+    while queue:
+        node = queue.popleft()
+        d = depth[node] + 1
+        for j in range(offsets[node], offsets[node + 1]):
+            child = index[j]
+            if depth[child] == -1:
+                depth[child] = d
+                queue.append(child)
+    return depth
+
+
+def topological_order(graph, within=None):
+    """Return (order, cyclic): ids with children before parents, plus ids on or above a cycle.
+
+    ``within`` (a mask of ids closed under children) restricts both to those ids.
+    """
+    n = len(graph)
+    if within is None:
+        remaining = array('i', [graph.num_children(i) for i in range(n)])
+        order = [i for i in range(n) if remaining[i] == 0]
+    else:
+        remaining = array('i', [graph.num_children(i) if within[i] else 0 for i in range(n)])
+        order = [i for i in range(n) if within[i] and remaining[i] == 0]
+    offsets, index = graph.parent_offsets, graph.parent_index
+    pos = 0
+    while pos < len(order):
+        node = order[pos]
+        pos += 1
+        for j in range(offsets[node], offsets[node + 1]):
+            parent = index[j]
+            if within is not None and not within[parent]:
+                continue
+            remaining[parent] -= 1
+            if remaining[parent] == 0:
+                order.append(parent)
+    cyclic = [i for i in range(n) if remaining[i] > 0]
+    return order, cyclic
+
+
+def _closure_counts(graph, own, merge, count, empty, within=None):
+    """Sweep children before parents, folding each child's closure into its parents'.
+
+    A child's closure is dropped as soon as its last parent has consumed it,
+    so only the current frontier of closures is held in memory. With
+    ``within`` only those ids are swept; their counts are exact as long as
+    the mask is closed under children.
+    """
+    n = len(graph)
+    counts = array('q', bytes(8 * n))
+    order, cyclic = topological_order(graph, within)
+    offsets, index = graph.child_offsets, graph.child_index
+    if within is None:
+        pending = array('i', [graph.num_parents(i) for i in range(n)])
+    else:
+        p_offsets, p_index = graph.parent_offsets, graph.parent_index
+        pending = array('i', bytes(4 * n))
+        for node in order:
+            for j in range(p_offsets[node], p_offsets[node + 1]):
+                if within[p_index[j]]:
+                    pending[node] += 1
+    closures = {}
+
+    for node in order:
+        closure = own(node)
+        for j in range(offsets[node], offsets[node + 1]):
+            child = index[j]
+            closure = merge(closure, closures[child])
+            pending[child] -= 1
+            if pending[child] == 0:
+                del closures[child]
+        counts[node] = count(closure)
+        if pending[node]:
+            closures[node] = closure
+
+    # is_a cycles should not occur, but fall back to a plain walk if they do
+    for node in cyclic:
+        reach = graph.descendants([node])
+        closure = empty
+        for i in range(n):
+            if reach[i]:
+                closure = merge(closure, own(i))
+        counts[node] = count(closure)
+    return counts
+
+
+def _edge_mask(graph):
+    offsets = graph.child_offsets
+
+    def own(node):
+        start = offsets[node]
+        return ((1 << (offsets[node + 1] - start)) - 1) << start
+    return own
+
+
+def _node_mask(graph):
+    offsets, index = graph.child_offsets, graph.child_index
+
+    def own(node):
+        bits = 0
+        for j in range(offsets[node], offsets[node + 1]):
+            bits |= 1 << index[j]
+        return bits
+    return own
+
+
+def _mix64(x):
+    """splitmix64 finaliser, used to hash edge positions for the sketch."""
+    x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def _hll_estimate(registers):
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+def _edge_sketch(graph, precision):
+    offsets = graph.child_offsets
+    m = 1 << precision
+    shift = 64 - precision
+    rank_bits = 64 - precision
+
+    def own(node):
+        start, end = offsets[node], offsets[node + 1]
+        if start == end:
+            return None
+        registers = bytearray(m)
+        for e in range(start, end):
+            h = _mix64(e)
+            bucket = h >> shift
+            rest = h & ((1 << rank_bits) - 1)
+            rank = rank_bits - rest.bit_length() + 1
+            if rank > registers[bucket]:
+                registers[bucket] = rank
+        return registers
+
+    def merge(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return bytearray(map(max, a, b))
+
+    def count(registers):
+        return 0 if registers is None else _hll_estimate(registers)
+
+    return own, merge, count
+
+
+def descendant_counts(graph, mode='exact', precision=SKETCH_PRECISION, within=None):
+    """``Num_Descendants`` for every id, as an array indexed by id.
+
+    ``mode='exact'`` uses edge bitsets; ``mode='sketch'`` returns
+    HyperLogLog estimates with 2**precision registers per closure.
+    With ``within`` (a mask of ids closed under children) only those ids
+    are counted.
+    """
+    if mode == 'exact':
+        if 'num_descendants' in graph.metrics:
+            return graph.metrics['num_descendants']
+        return _closure_counts(graph, _edge_mask(graph), int.__or__,
+                               int.bit_count, 0, within)
+    if mode == 'sketch':
+        own, merge, count = _edge_sketch(graph, precision)
+        return _closure_counts(graph, own, merge, count, None, within)
+    raise ValueError(f"Unknown descendant counting mode: {mode!r}")
+
+
+def distinct_descendant_counts(graph):
+    """Number of distinct terms strictly below every id."""
+    return _closure_counts(graph, _node_mask(graph), int.__or__,
+                           int.bit_count, 0)
+
+
+def max_descendant_diffs(graph, counts):
+    """``Max_Num_Descendant_Diff`` for every id.
+
+    The largest sibling count is found from each parent's top two distinct
+    children, so each sibling group is scanned once instead of once per child.
+    Siblings that are not declared terms count as 0, as in the original script.
+    """
+    if counts is graph.metrics.get('num_descendants'):
+        return graph.metrics['max_descendant_diff']
+    n = len(graph)
+    declared = graph.declared
+    offsets, index = graph.child_offsets, graph.child_index
+    best = array('q', [-1]) * n
+    best_child = array('i', [-1]) * n
+    second = array('q', [-1]) * n
+    for parent in range(n):
+        b, bc, s = -1, -1, -1
+        for j in range(offsets[parent], offsets[parent + 1]):
+            child = index[j]
+            if child == bc:
+                continue
+            value = counts[child] if declared[child] else 0
+            if value > b:
+                b, bc, s = value, child, b
+            elif value > s:
+                s = value
+        best[parent], best_child[parent], second[parent] = b, bc, s
+
+    diffs = array('q', bytes(8 * n))
+    p_offsets, p_index = graph.parent_offsets, graph.parent_index
+    for node in range(n):
+        top = -1
+        for j in range(p_offsets[node], p_offsets[node + 1]):
+            parent = p_index[j]
+            value = second[parent] if best_child[parent] == node else best[parent]
+            if value > top:
+                top = value
+        if top >= 0:
+            diffs[node] = max(0, top - counts[node])
+    return diffs
+
+
+def hierarchy_rows(graph, mode='exact'):
+    """Per-term rows with the columns of the ``hpo_*-hierarchy.csv`` files.
+
+    Rows cover the declared terms, sorted by depth and then by ID.
+    """
+    depth = depths(graph)
+    counts = descendant_counts(graph, mode)
+    diffs = max_descendant_diffs(graph, counts)
+    rows = []
+    for i in graph.declared_ids():
+        rows.append({
+            'ID': graph.ids[i],
+            'Label': graph.label(i, 'Unknown'),
+            'Depth': depth[i],
+            'Num_Parents': graph.num_parents(i),
+            'Num_Children': graph.num_children(i),
+            'Num_Descendants': counts[i],
+            'Max_Num_Descendant_Diff': diffs[i],
+        })
+    rows.sort(key=lambda r: (r['Depth'], r['ID']))
+    return rows
+
+
+def subtree_heights(graph, within=None):
+    """Return (heights, num_desc): the largest shortest-path distance from each
+    id to one of its descendants, and its number of distinct descendants.
+
+    Matches igraph ``distances(mode = "out")`` per vertex, but for all ids at
+    once: round k ORs each term's reach bitset with its children's, and a term
+    drops out of the rounds as soon as its reach stops growing. The number of
+    rounds is bounded by the height of the tallest subtree.
+
+    With ``within`` (a mask of ids closed under children) only those ids
+    are computed.
+    """
+    n = len(graph)
+    offsets, index = graph.child_offsets, graph.child_index
+    if within is None:
+        reach = [1 << i for i in range(n)]
+        active = [i for i in range(n) if offsets[i] != offsets[i + 1]]
+    else:
+        reach = [1 << i if within[i] else 0 for i in range(n)]
+        active = [i for i in range(n) if within[i] and offsets[i] != offsets[i + 1]]
+    heights = array('i', bytes(4 * n))
+    k = 0
+    while active:
+        k += 1
+        grown = []
+        updates = []
+        for node in active:
+            bits = reach[node]
+            for j in range(offsets[node], offsets[node + 1]):
+                bits |= reach[index[j]]
+            if bits != reach[node]:
+                updates.append((node, bits))
+                grown.append(node)
+        # Apply after the round so every term sees its children's round k-1 reach
+        for node, bits in updates:
+            reach[node] = bits
+            heights[node] = k
+        active = grown
+    num_desc = array('q', [bits.bit_count() - 1 for bits in reach])
+    return heights, num_desc
+
+
+def branches(graph, tops=None):
+    """Top-level branch ids of every id, as tuples in parent order.
+
+    A branch is one of ``tops`` (default the roots) or a child of one;
+    those terms are their own branch, and every other term falls under
+    its parents' branches. Terms above ``tops`` have none.
+    """
+    order, cyclic = topological_order(graph)
+    result = [()] * len(graph)
+    roots = set(graph.roots() if tops is None else tops)
+
+    def branches_of(node):
+        parents = graph.parents(node)
+        if node in roots or any(p in roots for p in parents):
+            return (node,)
+        return tuple(dict.fromkeys(b for p in parents for b in result[p]))
+
+    # Terms on or above a cycle only have such terms above them: pass over
+    # them until their branch sets stop growing, then sweep the rest
+    changed = True
+    while changed:
+        changed = False
+        for node in cyclic:
+            found = branches_of(node)
+            if set(found) != set(result[node]):
+                result[node] = found
+                changed = True
+    for node in reversed(order):
+        result[node] = branches_of(node)
+    return result
+
+
+def app_metrics(graph):
+    """Per-id arrays of the metrics IVO.qmd displays, keyed by NODE_METRIC_FIELDS.
+
+    ``max_child_num_desc`` is the largest ``num_desc`` among a term's
+    children and ``desc_diff`` the smallest absolute difference between a
+    term's ``num_desc`` and its parents' ``max_child_num_desc`` (-1 for
+    terms without parents), as the app computes them.
+    """
+    heights, num_desc = subtree_heights(graph)
+    n = len(graph)
+    offsets, index = graph.child_offsets, graph.child_index
+    max_child = array('q', bytes(8 * n))
+    for parent in range(n):
+        for j in range(offsets[parent], offsets[parent + 1]):
+            if num_desc[index[j]] > max_child[parent]:
+                max_child[parent] = num_desc[index[j]]
+    desc_diff = array('q', [-1]) * n
+    offsets, index = graph.parent_offsets, graph.parent_index
+    for i in range(n):
+        for j in range(offsets[i], offsets[i + 1]):
+            diff = abs(num_desc[i] - max_child[index[j]])
+            if desc_diff[i] < 0 or diff < desc_diff[i]:
+                desc_diff[i] = diff
+    return {
+        'depth': depths(graph),
+        'subtree_height': heights,
+        'num_desc': num_desc,
+        'max_child_num_desc': max_child,
+        'desc_diff': desc_diff,
+    }
+
+
+def node_metrics_rows(graph):
+    """Per-term rows for the IVO.qmd metrics sidecar, in node order.
+
+    See ``app_metrics``; ``desc_diff`` is empty for terms without parents.
+    """
+    metrics = app_metrics(graph)
+    rows = []
+    for i in graph.declared_ids():
+        row = {'id': graph.ids[i]}
+        for field in NODE_METRIC_FIELDS[1:]:
+            row[field] = metrics[field][i]
+        if row['desc_diff'] < 0:
+            row['desc_diff'] = ''
+        rows.append(row)
+    return rows
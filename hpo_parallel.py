@@ -0,0 +1,196 @@
+"""Whole-ontology metrics split across a process pool.
+
+Workers map the same ``.ivosnap`` file read-only, so the graph is shared
+through the OS page cache instead of being pickled to every process. Work
+is split by branches: ``partition`` descends from the roots, replacing the
+largest branch by its children until every branch is small enough, and
+deals the branches out to the workers, largest first. Each worker sweeps
+only its branches and everything below them, so a term below two
+workers' branches is computed twice but the others once. The few terms
+above the branches get their metrics from the breadth-first searches
+that sized them (their reach gives ``num_desc`` and ``Num_Descendants``,
+its deepest level the subtree height). Depths and the per-parent sibling
+maxima are cheap linear passes and stay in the parent. With
+``heights=False`` only the descendant counts are swept, for callers such
+as 3.summarize_subset.py that never read the subtree heights. Graphs with
+terms no root reaches are computed in one process.
+
+Usage: python hpo_parallel.py release.json [--workers N]
+"""
+import argparse
+import heapq
+import os
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import hpo_metrics
+from hpo_graph import load_graph
+from hpo_snapshot import open_snapshot, write_snapshot
+
+_graph = None
+
+# Branches are split until none holds more than 1/_BRANCHES_PER_WORKER of
+# a worker's even share of the terms, so dealing them out balances the workers
+_BRANCHES_PER_WORKER = 4
+
+
+def _open_worker_graph(snapshot_path):
+    global _graph
+    _graph = open_snapshot(snapshot_path).graph
+
+
+def _subtree(graph, node):
+    """(terms, edges, height) of ``node``'s subtree, itself included, by breadth-first search."""
+    offsets, index = graph.child_offsets, graph.child_index
+    seen = bytearray(len(graph))
+    seen[node] = 1
+    level = [node]
+    terms, edges, height = 1, 0, 0
+    while True:
+        below = []
+        for parent in level:
+            edges += offsets[parent + 1] - offsets[parent]
+            for j in range(offsets[parent], offsets[parent + 1]):
+                child = index[j]
+                if not seen[child]:
+                    seen[child] = 1
+                    below.append(child)
+        if not below:
+            return terms, edges, height
+        terms += len(below)
+        height += 1
+        level = below
+
+
+def partition(graph, parts):
+    """Split the graph into ``parts`` lists of branch tops, plus the terms above them.
+
+    Returns (tops, upper): every term is below some top or in ``upper``,
+    a dict of the (``num_descendants``, ``subtree_height``, ``num_desc``)
+    of the terms above the tops. ``None`` if some term is not below a root.
+    """
+    roots = graph.roots()
+    if graph.descendants(roots).count(0):
+        return None
+    limit = len(graph) / (parts * _BRANCHES_PER_WORKER)
+    heap = []
+    for root in roots:
+        terms, edges, height = _subtree(graph, root)
+        heapq.heappush(heap, (-terms, root, edges, height))
+    seen = set(roots)
+    upper = {}
+    while heap and -heap[0][0] > limit:
+        terms, node, edges, height = heapq.heappop(heap)
+        upper[node] = (edges, height, -terms - 1)
+        for child in graph.children(node):
+            if child not in seen:
+                seen.add(child)
+                terms, edges, height = _subtree(graph, child)
+                heapq.heappush(heap, (-terms, child, edges, height))
+    tops = [[] for _ in range(parts)]
+    loads = [(0, k) for k in range(parts)]
+    for terms, node, _, _ in sorted(heap):
+        load, k = heapq.heappop(loads)
+        tops[k].append(node)
+        heapq.heappush(loads, (load - terms, k))
+    return [t for t in tops if t], upper
+
+
+def branch_metrics(graph, tops, heights=True):
+    """Metrics of ``tops`` and every term below them.
+
+    Returns (terms, values): the terms swept and their metric arrays
+    (``num_descendants``, and ``subtree_height`` and ``num_desc`` unless
+    ``heights`` is false) in the same order.
+    """
+    within = graph.descendants(tops)
+    terms = array('i', (i for i in range(len(graph)) if within[i]))
+    counts = hpo_metrics.descendant_counts(graph, within=within)
+    values = {'num_descendants': array('q', (counts[i] for i in terms))}
+    if heights:
+        height, num_desc = hpo_metrics.subtree_heights(graph, within)
+        values['subtree_height'] = array('i', (height[i] for i in terms))
+        values['num_desc'] = array('q', (num_desc[i] for i in terms))
+    return terms, values
+
+
+def _branch_job(args):
+    return branch_metrics(_graph, *args)
+
+
+def parallel_metrics(graph, workers=None, snapshot_path=None, heights=True):
+    """Depths, descendant counts, descendant diffs, subtree heights and
+    distinct descendant counts for every id, computed by ``workers`` processes.
+
+    Pass the ``snapshot_path`` ``graph`` was opened from to share it as is;
+    otherwise a temporary graph-only snapshot is written for the workers.
+    With ``heights=False`` the subtree heights and distinct descendant
+    counts are neither computed nor returned.
+    """
+    workers = workers or os.cpu_count() or 1
+    split = partition(graph, workers) if workers > 1 and len(graph) else None
+    if split is None:
+        metrics = {'depth': hpo_metrics.depths(graph),
+                   'num_descendants': hpo_metrics.descendant_counts(graph)}
+        metrics['max_descendant_diff'] = hpo_metrics.max_descendant_diffs(
+            graph, metrics['num_descendants'])
+        if heights:
+            metrics['subtree_height'], metrics['num_desc'] = hpo_metrics.subtree_heights(graph)
+        return metrics
+
+    tops, upper = split
+    results = []
+    tmp_dir = None
+    if snapshot_path is None and tops:
+        tmp_dir = tempfile.TemporaryDirectory(prefix='ivo_parallel_')
+        snapshot_path = write_snapshot(graph, os.path.join(tmp_dir.name, 'graph.ivosnap'))
+    try:
+        if tops:
+            with ProcessPoolExecutor(len(tops), initializer=_open_worker_graph,
+                                     initargs=(snapshot_path,)) as pool:
+                results = list(pool.map(_branch_job, [(t, heights) for t in tops]))
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    n = len(graph)
+    metrics = {'num_descendants': array('q', bytes(8 * n))}
+    if heights:
+        metrics['subtree_height'] = array('i', bytes(4 * n))
+        metrics['num_desc'] = array('q', bytes(8 * n))
+    for terms, values in results:
+        for name, column in values.items():
+            target = metrics[name]
+            for i, v in zip(terms, column):
+                target[i] = v
+    for node, (edges, height, num_desc) in upper.items():
+        metrics['num_descendants'][node] = edges
+        if heights:
+            metrics['subtree_height'][node] = height
+            metrics['num_desc'][node] = num_desc
+    metrics['depth'] = hpo_metrics.depths(graph)
+    metrics['max_descendant_diff'] = hpo_metrics.max_descendant_diffs(
+        graph, metrics['num_descendants'])
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute whole-ontology metrics in parallel.")
+    parser.add_argument('release', help="obographs JSON release or .ivosnap")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: one per core)")
+    args = parser.parse_args()
+
+    graph = load_graph(args.release)
+    snapshot_path = args.release if args.release.endswith('.ivosnap') else None
+    start = time.perf_counter()
+    metrics = parallel_metrics(graph, args.workers, snapshot_path)
+    elapsed = time.perf_counter() - start
+    print(f"{len(graph)} terms, {graph.num_edges} edges: metrics in {elapsed:.2f}s")
+    print(f"Largest Num_Descendants: {max(metrics['num_descendants'], default=0)}, "
+          f"tallest subtree: {max(metrics['subtree_height'], default=0)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Parent and sibling reports for lists of HPO terms.
+
+Terms are resolved through the graph's IRI -> id hash index and labels are
+read from its id -> label list, so no lookup scans the node list. Sibling
+groups are expanded once per parent and shared by every target term under
+that parent.
+"""
+from array import array
+
+PARENT_FIELDS = ['node_id', 'node_label', 'parent_ids', 'parent_labels',
+                 'sibling_ids', 'sibling_labels', 'num_parents', 'num_siblings']
+
+
+def parent_sibling_rows(graph, node_ids):
+    """Return one parent_output row per node ID, in input order."""
+    ids, labels = graph.ids, graph.labels
+    groups = {}
+
+    def label(i):
+        lbl = labels[i]
+        return '' if lbl is None else lbl
+
+    def children_of(parent):
+        # Distinct children of a parent, in edge order, expanded once
+        group = groups.get(parent)
+        if group is None:
+            group = groups[parent] = list(dict.fromkeys(graph.children(parent)))
+        return group
+
+    rows = []
+    for node_id in node_ids:
+        i = graph.index_of(node_id)
+        if i is None:
+            parents, siblings = [], []
+        else:
+            parents = graph.parents(i)
+            if len(parents) == 1:
+                siblings = [c for c in children_of(parents[0]) if c != i]
+            else:
+                merged = {}
+                for parent in parents:
+                    merged.update(dict.fromkeys(children_of(parent)))
+                merged.pop(i, None)
+                siblings = list(merged)
+
+        rows.append({
+            'node_id': node_id,
+            'node_label': '' if i is None else label(i),
+            'parent_ids': '; '.join([ids[p] for p in parents]),
+            'parent_labels': '; '.join([label(p) for p in parents]),
+            'sibling_ids': '; '.join([ids[s] for s in siblings]),
+            'sibling_labels': '; '.join([label(s) for s in siblings]),
+            'num_parents': len(parents),
+            'num_siblings': len(siblings)
+        })
+    return rows
+
+
+ANALYSIS_FIELDS = ['Node_ID', 'Node_Label', 'Parent_IDs', 'Parent_Children_Count (min)',
+                   'Parent_Max_Desc_Diff', 'Parent_Depth']
+
+
+def split_ids(value):
+    """Split a '; '-separated id list from a parent_output column."""
+    return [p.strip() for p in value.split(';') if p.strip()]
+
+
+def _int_or_zero(value):
+    return int(value) if value not in ('', None) else 0
+
+
+class OldHierarchy:
+    """Hash index over hierarchy rows, with the joined columns stored as arrays."""
+
+    def __init__(self, rows):
+        self.index = {}
+        self.num_children = array('i')
+        self.max_desc_diff = array('i')
+        self.depth = array('i')
+        for row in rows:
+            # Later duplicates win, as with a dict keyed by ID
+            i = self.index.get(row['ID'])
+            values = (_int_or_zero(row['Num_Children']),
+                      _int_or_zero(row['Max_Num_Descendant_Diff']),
+                      int(row['Depth']))
+            if i is None:
+                self.index[row['ID']] = len(self.depth)
+                self.num_children.append(values[0])
+                self.max_desc_diff.append(values[1])
+                self.depth.append(values[2])
+            else:
+                self.num_children[i], self.max_desc_diff[i], self.depth[i] = values
+
+    def lookup(self, parent_ids):
+        """Positions of the ids present in the hierarchy, in input order."""
+        index = self.index
+        return [i for i in map(index.get, parent_ids) if i is not None]
+
+
+def old_parent_analysis(new_rows, old_rows):
+    """Join parent_output rows (new release) against hierarchy rows (old release).
+
+    For each new term, reports which of its parents already existed in the
+    old hierarchy, the smallest child count and the largest
+    Max_Num_Descendant_Diff among them, and the depth of the last one found.
+    The old hierarchy is indexed once; each new term is then one hash probe
+    per parent.
+    """
+    old = old_rows if isinstance(old_rows, OldHierarchy) else OldHierarchy(old_rows)
+    num_children, max_desc_diff, depth = old.num_children, old.max_desc_diff, old.depth
+
+    results = []
+    for node in new_rows:
+        num_parents = _int_or_zero(node['num_parents'])
+        parent_ids = split_ids(node['parent_ids']) if num_parents > 0 and node.get('parent_ids') else []
+        found = old.lookup(parent_ids)
+        results.append({
+            'Node_ID': node['node_id'],
+            'Node_Label': node['node_label'],
+            'Parent_IDs': ','.join(p for p in parent_ids if p in old.index),
+            'Parent_Children_Count (min)': min(num_children[i] for i in found) if found else None,
+            'Parent_Max_Desc_Diff': max(max_desc_diff[i] for i in found) if found else '',
+            'Parent_Depth': depth[found[-1]] if found else ''
+        })
+    return results
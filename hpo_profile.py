@@ -0,0 +1,293 @@
+"""Per-stage instrumentation for the IVO scripts.
+
+Wrap a step in ``with stage('name'):`` to record its wall time, CPU time,
+memory and any item counts. On Linux each stage resets the kernel's RSS
+high-water mark (/proc/self/clear_refs) when it starts, so ``peak_rss_mb``
+is the largest RSS reached during that stage and ``rss_start_mb`` the RSS
+it started from; enclosing stages keep the peaks of the stages nested in
+them. Elsewhere those two are None and only ``process_peak_rss_mb``, the
+high-water mark of the whole process so far (ru_maxrss), is recorded
+(None on Windows, which lacks the resource module). Recording is off by default: ``stage`` then
+returns one shared no-op context, so instrumented code pays a function
+call and nothing else.
+
+Turn it on from code with ``enable()`` or from the environment:
+
+    IVO_PROFILE=profile.json python 3.summarize_subset.py
+    IVO_TRACE=trace.json python ivo_pipeline.py ...
+
+IVO_PROFILE writes the stage records as JSON when the process exits
+(``IVO_PROFILE=-`` prints a table to stderr instead) and IVO_TRACE writes
+a Chrome trace (open it at chrome://tracing or https://ui.perfetto.dev).
+Nested stages keep their parent's name. Worker processes record into
+their own recorder and do not export.
+
+Usage: python hpo_profile.py profile.json   (prints the recorded table)
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_recorder = None
+
+
+_STATUS_PATH = '/proc/self/status'
+_CLEAR_REFS_PATH = '/proc/self/clear_refs'
+
+
+def _process_peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _rss_mb():
+    """(current RSS, high-water mark since the last reset) in MB, or None off Linux."""
+    try:
+        with open(_STATUS_PATH, 'r') as f:
+            status = f.read()
+    except OSError:
+        return None
+    values = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(':')
+        if key in ('VmRSS', 'VmHWM'):
+            values[key] = int(value.split()[0]) / 1024
+    if len(values) != 2:
+        return None
+    return values['VmRSS'], values['VmHWM']
+
+
+def _reset_peak_rss():
+    """Reset the RSS high-water mark to the current RSS; False if not possible."""
+    try:
+        with open(_CLEAR_REFS_PATH, 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+class _NullStage:
+    """Stand-in returned by ``stage`` while recording is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, **counts):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """One timed stage; use ``count(nodes=...)`` inside it to attach item counts."""
+
+    def __init__(self, recorder, name, counts):
+        self.recorder = recorder
+        self.name = name
+        self.counts = counts
+
+    def count(self, **counts):
+        self.counts.update(counts)
+
+    def __enter__(self):
+        stack = self.recorder._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.rss_start = self.peak = self.recorder._start_peak(self)
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        cpu = time.process_time() - self.cpu_start
+        self.recorder._end_peak(self)
+        self.recorder._stack().pop()
+        self.recorder.records.append({
+            'stage': self.name,
+            'parent': self.parent,
+            'start': self.start - self.recorder.origin,
+            'wall_seconds': end - self.start,
+            'cpu_seconds': cpu,
+            'rss_start_mb': self.rss_start,
+            'peak_rss_mb': self.peak,
+            'process_peak_rss_mb': _process_peak_rss_mb(),
+            'counts': self.counts,
+            'pid': os.getpid(),
+            'thread': threading.get_ident(),
+            'failed': exc_type is not None,
+        })
+        return False
+
+
+class Recorder:
+    """Collected stage records of this process."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.records = []
+        self._local = threading.local()
+        # Stages open in any thread: a reset of the shared high-water mark
+        # first folds it into all of them
+        self._open = set()
+        self._lock = threading.Lock()
+        self._resettable = _rss_mb() is not None
+
+    def _fold_peak(self):
+        rss = _rss_mb()
+        if rss is None:
+            return None
+        for open_stage in self._open:
+            open_stage.peak = max(open_stage.peak, rss[1])
+        return rss
+
+    def _start_peak(self, stage):
+        """Fold the high-water mark into the open stages and reset it; returns the RSS."""
+        if not self._resettable:
+            return None
+        with self._lock:
+            self._fold_peak()
+            if not _reset_peak_rss():
+                self._resettable = False
+                return None
+            rss = _rss_mb()
+            if rss is None:
+                self._resettable = False
+                return None
+            self._open.add(stage)
+            return rss[0]
+
+    def _end_peak(self, stage):
+        if stage.peak is None:
+            return
+        with self._lock:
+            self._fold_peak()
+            self._open.discard(stage)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'argv': sys.argv, 'stages': self.records}, f, indent=1)
+
+    def chrome_trace(self):
+        """Records as Chrome trace-event 'complete' events (microseconds)."""
+        events = []
+        for r in self.records:
+            events.append({
+                'name': r['stage'],
+                'ph': 'X',
+                'ts': r['start'] * 1e6,
+                'dur': r['wall_seconds'] * 1e6,
+                'pid': r['pid'],
+                'tid': r['thread'],
+                'args': {'cpu_seconds': r['cpu_seconds'], 'rss_start_mb': r.get('rss_start_mb'),
+                         'peak_rss_mb': r['peak_rss_mb'],
+                         'process_peak_rss_mb': r.get('process_peak_rss_mb'), **r['counts']},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        """One line per stage, in completion order."""
+        lines = []
+        for r in self.records:
+            counts = ', '.join(f'{k}={v}' for k, v in r['counts'].items())
+            peak, start = r['peak_rss_mb'], r.get('rss_start_mb')
+            # Profiles saved before per-stage peaks only have the process peak
+            process_peak = r.get('process_peak_rss_mb', None if 'rss_start_mb' in r else peak)
+            if peak is not None and start is not None:
+                memory = f"{peak:>8.0f} MB peak ({peak - start:+.0f} MB)"
+            elif process_peak is not None:
+                memory = f"{process_peak:>8.0f} MB process peak"
+            else:
+                memory = f"{'n/a':>11}"
+            lines.append(f"{r['stage']:<32}{r['wall_seconds']:>9.3f}s wall {r['cpu_seconds']:>9.3f}s cpu "
+                         f"{memory}  {counts}")
+        return '\n'.join(lines)
+
+
+def stage(name, **counts):
+    """Context manager timing the named stage (a no-op unless recording is on)."""
+    if _recorder is None:
+        return _NULL_STAGE
+    return Stage(_recorder, name, counts)
+
+
+def enable():
+    """Start recording stages in this process; returns the recorder."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+    return _recorder
+
+
+def disable():
+    """Stop recording; returns the recorder that was active, if any."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def recorder():
+    return _recorder
+
+
+def _export_at_exit(profile_path, trace_path):
+    import multiprocessing
+
+    # Spawned pool workers import this module too; only the main process exports
+    if _recorder is None or multiprocessing.parent_process() is not None:
+        return
+    if profile_path == '-':
+        print(_recorder.summary(), file=sys.stderr)
+    elif profile_path:
+        _recorder.export_json(profile_path)
+    if trace_path:
+        _recorder.export_chrome_trace(trace_path)
+
+
+_profile_path = os.environ.get('IVO_PROFILE')
+_trace_path = os.environ.get('IVO_TRACE')
+if _profile_path or _trace_path:
+    enable()
+    atexit.register(_export_at_exit, _profile_path, _trace_path)
+
+
+def main(profile_path):
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    recorder = Recorder()
+    recorder.records = profile['stages']
+    print(' '.join(profile.get('argv', [])))
+    print(recorder.summary())
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: python hpo_profile.py profile.json")
+        sys.exit(1)
+    main(sys.argv[1])
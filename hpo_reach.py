@@ -0,0 +1,225 @@
+"""Reachability index for ancestor/descendant queries over the ontology DAG.
+
+Terms are numbered in postorder over a DFS spanning forest, so every tree
+subtree is one contiguous interval of numbers. Multiple inheritance is
+covered by giving each term the merged interval list of its own subtree
+plus its children's lists (tree-cover labeling); for HPO most terms keep a
+single interval. "Is X an ancestor of Y" is then a binary search of Y's
+number in X's intervals, and "all descendants of X" reads X's intervals.
+
+Usage: python hpo_reach.py release.json [--port 8765]
+"""
+import argparse
+import json
+import sys
+from array import array
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from hpo_graph import load_graph
+from hpo_metrics import topological_order
+
+
+def _postorder(graph):
+    """Postorder numbers over a DFS spanning forest from the roots."""
+    n = len(graph)
+    offsets, index = graph.child_offsets, graph.child_index
+    post = array('i', [-1]) * n
+    visited = bytearray(n)
+    counter = 0
+    starts = graph.roots() + list(range(n))
+    for root in starts:
+        if visited[root]:
+            continue
+        visited[root] = 1
+        stack = [(root, offsets[root])]
+        while stack:
+            node, j = stack[-1]
+            end = offsets[node + 1]
+            while j < end and visited[index[j]]:
+                j += 1
+            if j < end:
+                child = index[j]
+                stack[-1] = (node, j + 1)
+                visited[child] = 1
+                stack.append((child, offsets[child]))
+            else:
+                stack.pop()
+                post[node] = counter
+                counter += 1
+    return post
+
+
+def _merge(intervals):
+    """Merge sorted, possibly overlapping or adjacent (lo, hi) intervals."""
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1][1] = hi
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+class ReachabilityIndex:
+    """Interval-labeled reachability over an OntologyGraph.
+
+    Methods take and return IRIs; descendant and ancestor sets include the
+    term itself only where noted.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        n = len(graph)
+        post = _postorder(graph)
+        self.post = post
+        self.by_post = array('i', bytes(4 * n))
+        for node in range(n):
+            self.by_post[post[node]] = node
+
+        # Children before parents: each term's intervals cover its own number
+        # and everything its children cover
+        order, cyclic = topological_order(graph)
+        offsets, index = graph.child_offsets, graph.child_index
+        intervals = [None] * n
+        in_cycle = set(cyclic)
+        for node in order + cyclic:
+            spans = [(post[node], post[node])]
+            for j in range(offsets[node], offsets[node + 1]):
+                child = index[j]
+                if intervals[child] is not None:
+                    spans.extend(zip(*intervals[child]))
+            if node in in_cycle:
+                # Terms on a cycle fall back to a plain walk
+                reach = graph.descendants([node])
+                spans = [(post[i], post[i]) for i in range(n) if reach[i]]
+            merged = _merge(spans)
+            intervals[node] = (array('i', [lo for lo, _ in merged]),
+                               array('i', [hi for _, hi in merged]))
+        self.intervals = intervals
+
+    def _id(self, iri):
+        i = self.graph.index_of(iri)
+        if i is None:
+            raise KeyError(iri)
+        return i
+
+    def reaches(self, x, y):
+        """True if dense id ``x`` is ``y`` or one of its ancestors."""
+        los, his = self.intervals[x]
+        p = self.post[y]
+        k = bisect_right(los, p) - 1
+        return k >= 0 and p <= his[k]
+
+    def is_ancestor(self, x, y):
+        """True if term ``x`` is a proper ancestor of term ``y``."""
+        xi, yi = self._id(x), self._id(y)
+        return xi != yi and self.reaches(xi, yi)
+
+    def descendant_ids(self, x):
+        """Dense ids of ``x`` and everything below it."""
+        los, his = self.intervals[x]
+        by_post = self.by_post
+        return [by_post[p] for lo, hi in zip(los, his) for p in range(lo, hi + 1)]
+
+    def descendants(self, x):
+        """All terms below ``x`` (excluding ``x``)."""
+        xi = self._id(x)
+        ids = self.graph.ids
+        return [ids[i] for i in self.descendant_ids(xi) if i != xi]
+
+    def ancestor_ids(self, y):
+        """Dense ids of ``y`` and everything above it."""
+        offsets, index = self.graph.parent_offsets, self.graph.parent_index
+        seen = {y}
+        stack = [y]
+        while stack:
+            node = stack.pop()
+            for j in range(offsets[node], offsets[node + 1]):
+                parent = index[j]
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        return seen
+
+    def ancestors(self, y):
+        """All terms above ``y`` (excluding ``y``)."""
+        yi = self._id(y)
+        ids = self.graph.ids
+        return [ids[i] for i in self.ancestor_ids(yi) if i != yi]
+
+    def lowest_common_ancestors(self, x, y):
+        """Common ancestors of ``x`` and ``y`` (each counting as its own
+        ancestor) that have no other common ancestor below them."""
+        common = self.ancestor_ids(self._id(x)) & self.ancestor_ids(self._id(y))
+        lowest = [a for a in common
+                  if not any(b != a and self.reaches(a, b) for b in common)]
+        ids = self.graph.ids
+        return sorted(ids[a] for a in lowest)
+
+    def num_intervals(self):
+        return sum(len(los) for los, _ in self.intervals)
+
+
+def make_handler(index):
+    """HTTP handler answering reachability queries as JSON.
+
+    GET /is_ancestor?x=IRI&y=IRI, /descendants?id=IRI, /ancestors?id=IRI,
+    /lca?x=IRI&y=IRI
+    """
+
+    class ReachHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == '/is_ancestor':
+                    result = index.is_ancestor(params['x'], params['y'])
+                elif url.path == '/descendants':
+                    result = index.descendants(params['id'])
+                elif url.path == '/ancestors':
+                    result = index.ancestors(params['id'])
+                elif url.path == '/lca':
+                    result = index.lowest_common_ancestors(params['x'], params['y'])
+                else:
+                    self.send_error(404, f"Unknown query {url.path}")
+                    return
+            except KeyError as e:
+                self.send_error(400, f"Unknown term or missing parameter: {e}")
+                return
+            body = json.dumps(result).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReachHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ancestor/descendant queries for an HPO release.")
+    parser.add_argument('release', help="obographs JSON release or subset (or .ivosnap)")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"Loading {args.release}...")
+    index = ReachabilityIndex(load_graph(args.release))
+    print(f"Indexed {len(index.graph)} terms with {index.num_intervals()} intervals")
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(index))
+    print(f"Serving on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
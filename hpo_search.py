@@ -0,0 +1,415 @@
+"""Inverted label and synonym index for looking up terms by text.
+
+Labels and the synonyms in each node's ``meta`` are lowercased and split
+into words (``normalize``). The index keeps, for every name:
+
+- a posting list per word, with the sorted word list for prefix lookups
+  ("abn skel" finds "Abnormality of the skeletal system")
+- a posting list per character trigram, for substrings inside words
+- a trigram index over the words themselves, for misspelled words
+
+Names are numbered shortest first (labels before synonyms of the same
+length), so walking a posting list in order visits the closest matches
+first and a query stops as soon as it has ``limit`` terms. Matches rank
+as exact name, name prefix, word prefixes, substring, then fuzzy (by
+word-level Dice similarity), and each term is returned once, under its
+best matching name.
+
+The index is saved next to the release as ``release.json.ivosearch`` and
+reused while the release is unchanged (``load_search_index``).
+
+Usage: python hpo_search.py release.json [query ...] [--limit 10] [--no-fuzzy] [--rebuild]
+       python hpo_search.py release.json --map phenotypes.txt [--out mapped.csv]
+"""
+import argparse
+import csv
+import heapq
+import math
+import os
+import pickle
+import re
+import time
+from array import array
+from bisect import bisect_left
+
+from hpo_stream import iter_graph_records
+
+SEARCH_SUFFIX = '.ivosearch'
+SEARCH_VERSION = 1
+
+LABEL, SYNONYM = 0, 1
+EXACT, PREFIX, WORDS, SUBSTRING, FUZZY = 4, 3, 2, 1, 0
+
+# Words whose trigram Dice similarity to a query word is below this are not fuzzy matches
+FUZZY_MIN = 0.5
+
+# Prefix ranges of the sorted names longer than this are found by walking word postings
+PREFIX_SCAN = 2000
+
+# Shorter words only match exactly: a typo in "of" is another word
+FUZZY_MIN_LENGTH = 4
+
+# Query words matching more names than this only score fuzzy candidates, not propose them
+FUZZY_CANDIDATES = 500
+
+MAP_FIELDS = ['Query', 'Node_ID', 'Node_Label', 'Matched_Name', 'Score']
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    """Lowercase ``text`` and reduce it to single-space separated words."""
+    return ' '.join(_WORD.findall(text.lower()))
+
+
+def _grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _word_grams(word):
+    # Padded so that short words and word boundaries have trigrams
+    return _grams(f' {word} ')
+
+
+class SearchIndex:
+    """Word, prefix, substring and fuzzy lookup over term labels and synonyms."""
+
+    def __init__(self, terms):
+        """``terms`` is a list of (IRI, label, synonyms) in release order."""
+        self.iris = [iri for iri, _, _ in terms]
+        self.labels = [label for _, label, _ in terms]
+
+        entries = []
+        for t, (_, label, synonyms) in enumerate(terms):
+            seen = set()
+            for kind, text in [(LABEL, label)] + [(SYNONYM, s) for s in synonyms]:
+                name = normalize(text or '')
+                if name and name not in seen:
+                    seen.add(name)
+                    entries.append((len(name), kind, t, name, text))
+        entries.sort()
+        self.names = [e[3] for e in entries]
+        self.texts = [e[4] for e in entries]
+        self.terms = array('i', [e[2] for e in entries])
+
+        self.by_name = array('i', sorted(range(len(entries)), key=self.names.__getitem__))
+        self.sorted_names = [self.names[e] for e in self.by_name]
+        # Posting lists are int arrays in ascending entry (or word) order
+        self.words, self.grams = {}, {}
+        for e, name in enumerate(self.names):
+            for word in set(name.split()):
+                self.words.setdefault(word, array('i')).append(e)
+            for gram in _grams(name):
+                self.grams.setdefault(gram, array('i')).append(e)
+        self.vocabulary = sorted(self.words)
+        self.word_grams = {}
+        self.word_gram_counts = array('H')
+        for v, word in enumerate(self.vocabulary):
+            grams = _word_grams(word)
+            self.word_gram_counts.append(min(len(grams), 0xffff))
+            for gram in grams:
+                self.word_grams.setdefault(gram, array('i')).append(v)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Index of the declared terms' labels (graphs carry no synonyms)."""
+        return cls([(graph.ids[i], graph.labels[i], ()) for i in graph.declared_ids()])
+
+    @classmethod
+    def from_file(cls, filepath):
+        """Index of the labels and synonyms of an obographs release (or .ivosnap)."""
+        import hpo_snapshot
+
+        if filepath.endswith(hpo_snapshot.SNAPSHOT_SUFFIX):
+            return cls.from_graph(hpo_snapshot.open_snapshot(filepath).graph)
+        terms = {}
+        for kind, record in iter_graph_records(filepath, full=True):
+            if kind != 'node' or record.get('id') is None:
+                continue
+            synonyms = [s.get('val') for s in (record.get('meta') or {}).get('synonyms') or ()]
+            # Later duplicates win, as in GraphBuilder
+            terms.pop(record['id'], None)
+            terms[record['id']] = (record['id'], record.get('lbl'), [s for s in synonyms if s])
+        return cls(list(terms.values()))
+
+    def __len__(self):
+        return len(self.iris)
+
+    def _word_matches(self, words):
+        """Entries in which every query word starts some word, in entry order."""
+        vocabulary, postings = self.vocabulary, self.words
+        ranges = []
+        for word in set(words):
+            lo = bisect_left(vocabulary, word)
+            hi = bisect_left(vocabulary, word + '\uffff')
+            if lo == hi:
+                return
+            ranges.append((word, lo, hi))
+        # Walk the rarest word's postings and check the others against the name
+        first, smallest = None, None
+        for word, lo, hi in ranges:
+            size = 0
+            for v in range(lo, hi):
+                size += len(postings[vocabulary[v]])
+                if smallest is not None and size >= smallest:
+                    break
+            else:
+                first, smallest = (word, lo, hi), size
+        word, lo, hi = first
+        rest = [w for w, _, _ in ranges if w != word]
+        lists = [postings[vocabulary[v]] for v in range(lo, hi)]
+        candidates = lists[0] if len(lists) == 1 else heapq.merge(*lists)
+        previous = -1
+        for e in candidates:
+            if e == previous:
+                continue
+            previous = e
+            if rest:
+                name_words = self.names[e].split()
+                if not all(any(w.startswith(r) for w in name_words) for r in rest):
+                    continue
+            yield e
+
+    def _substring_matches(self, query):
+        """Entries whose name contains ``query`` (3 characters or more), in entry order."""
+        grams = [self.grams.get(gram) for gram in _grams(query)]
+        if not grams or None in grams:
+            return
+        names = self.names
+        for e in min(grams, key=len):
+            if query in names[e]:
+                yield e
+
+    def _similar_words(self, word):
+        """{vocabulary word: trigram Dice similarity} of the words at least FUZZY_MIN similar."""
+        vocabulary = self.vocabulary
+        if len(word) < FUZZY_MIN_LENGTH:
+            return {word: 1.0} if word in self.words else {}
+        grams = _word_grams(word)
+        lists = sorted((self.word_grams.get(gram, ()) for gram in grams), key=len)
+        # A word sharing c of the query's a trigrams has Dice at most
+        # 2c / (a + c), so it needs c >= a * FUZZY_MIN / (2 - FUZZY_MIN) and
+        # must share one of the rarest a - c + 1 trigrams
+        needed = math.ceil(len(grams) * FUZZY_MIN / (2 - FUZZY_MIN))
+        shared = {}
+        for k, postings in enumerate(lists):
+            if k <= len(grams) - needed:
+                for v in postings:
+                    shared[v] = shared.get(v, 0) + 1
+            elif 16 * len(shared) < len(postings):
+                for v in shared:
+                    j = bisect_left(postings, v)
+                    if j < len(postings) and postings[j] == v:
+                        shared[v] += 1
+            else:
+                for v in postings:
+                    if v in shared:
+                        shared[v] += 1
+        counts = self.word_gram_counts
+        similar = {}
+        for v, count in shared.items():
+            similarity = 2 * count / (len(grams) + counts[v])
+            if similarity >= FUZZY_MIN:
+                similar[vocabulary[v]] = similarity
+        return similar
+
+    def _fuzzy_matches(self, words):
+        """(score, entry) for names sharing similar words with the query, best first."""
+        postings = self.words
+        similar = [self._similar_words(word) for word in words]
+
+        # Candidates come from the rarer query words, closest spellings first
+        # ("of", "the" or "abnormality" alone would bring in much of the
+        # ontology); every query word still counts towards the score
+        sizes = sorted((sum(len(postings[w]) for w in matches), q) for q, matches in enumerate(similar))
+        candidates = set()
+        for size, q in sizes:
+            if candidates and size > FUZZY_CANDIDATES:
+                break
+            for w in sorted(similar[q], key=similar[q].get, reverse=True):
+                if len(candidates) >= FUZZY_CANDIDATES:
+                    break
+                # Postings are in entry order, so a long one is cut to its shortest names
+                candidates.update(postings[w][:FUZZY_CANDIDATES - len(candidates)])
+
+        # word -> [(query word, similarity)], so each name is read once
+        weights = {}
+        for q, matches in enumerate(similar):
+            for w, similarity in matches.items():
+                weights.setdefault(w, []).append((q, similarity))
+        names = self.names
+        scored = []
+        for e in candidates:
+            name_words = names[e].split()
+            best = [0.0] * len(words)
+            for w in name_words:
+                for q, similarity in weights.get(w, ()):
+                    if similarity > best[q]:
+                        best[q] = similarity
+            # Dice over words: matched similarity against the words on both sides
+            scored.append((-2 * sum(best) / (len(words) + len(name_words)), e))
+        scored.sort()
+        return scored
+
+    def search(self, query, limit=20, fuzzy=True):
+        """Up to ``limit`` best matches as (IRI, score, matched name), best first.
+
+        Scores are the match tier (4 exact, 3 prefix, 2 word prefixes,
+        1 substring) plus the fraction of the name the query covers, or
+        the fuzzy similarity (below 1) for matches with misspelled words.
+        """
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+        words = query.split()
+        names, terms = self.names, self.terms
+        tiers = {EXACT: [], PREFIX: [], WORDS: [], SUBSTRING: [], FUZZY: []}
+        top, word_terms = set(), set()
+
+        # Names starting with the query are one range of the sorted names;
+        # a long range is left to the word walk, which meets its shortest
+        # names first
+        lo = bisect_left(self.sorted_names, query)
+        hi = bisect_left(self.sorted_names, query + '\uffff')
+        scan_prefixes = hi - lo <= PREFIX_SCAN
+        if scan_prefixes:
+            # (twice the limit, as a term's label and synonyms may all match)
+            for e in sorted(heapq.nsmallest(2 * limit, self.by_name[lo:hi])):
+                if len(top) >= limit:
+                    break
+                tier = EXACT if names[e] == query else PREFIX
+                tiers[tier].append((e, tier + len(query) / len(names[e])))
+                top.add(terms[e])
+        if len(top) < limit:
+            for e in self._word_matches(words):
+                name = names[e]
+                if name.startswith(query):
+                    if scan_prefixes:
+                        continue
+                    tier = EXACT if name == query else PREFIX
+                    tiers[tier].append((e, tier + len(query) / len(name)))
+                    top.add(terms[e])
+                    if len(top) >= limit:
+                        break
+                elif len(word_terms - top) < limit - len(top):
+                    tiers[WORDS].append((e, WORDS + len(query) / len(name)))
+                    word_terms.add(terms[e])
+                elif scan_prefixes:
+                    break
+        seen = top | word_terms
+        if len(seen) < limit and len(query) >= 3:
+            for e in self._substring_matches(query):
+                if terms[e] not in seen:
+                    tiers[SUBSTRING].append((e, SUBSTRING + len(query) / len(names[e])))
+                    seen.add(terms[e])
+                    if len(seen) >= limit:
+                        break
+        if len(seen) < limit and fuzzy:
+            for score, e in self._fuzzy_matches(words):
+                if terms[e] not in seen:
+                    tiers[FUZZY].append((e, -score))
+                    seen.add(terms[e])
+                    if len(seen) >= limit:
+                        break
+
+        found = []
+        returned = set()
+        for tier in (EXACT, PREFIX, WORDS, SUBSTRING, FUZZY):
+            for e, score in tiers[tier]:
+                if terms[e] not in returned:
+                    returned.add(terms[e])
+                    found.append((self.iris[terms[e]], round(score, 4), self.texts[e]))
+        return found[:limit]
+
+
+def search_index_path_for(filepath):
+    """Default index location next to a release."""
+    return filepath + SEARCH_SUFFIX
+
+
+def load_search_index(filepath, rebuild=False):
+    """Search index of a release, read from its .ivosearch file while that is up to date.
+
+    The index is (re)built from the release and saved when the file is
+    missing, stale or unreadable; failing to save it is not an error.
+    """
+    path = search_index_path_for(filepath)
+    stat = os.stat(filepath)
+    signature = [SEARCH_VERSION, stat.st_size, stat.st_mtime_ns]
+    if not rebuild:
+        try:
+            with open(path, 'rb') as f:
+                if pickle.load(f) == signature:
+                    index = SearchIndex.__new__(SearchIndex)
+                    index.__dict__.update(pickle.load(f))
+                    return index
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+    index = SearchIndex.from_file(filepath)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(signature, f)
+            # The attributes rather than the object, so the file does not
+            # depend on the module the index was built from (__main__ or not)
+            pickle.dump(vars(index), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+    return index
+
+
+def map_phrases(index, phrases, fuzzy=True):
+    """Best match of each free-text phrase, as rows with MAP_FIELDS."""
+    labels = dict(zip(index.iris, index.labels))
+    rows = []
+    for phrase in phrases:
+        found = index.search(phrase, 1, fuzzy)
+        row = {'Query': phrase}
+        if found:
+            iri, score, name = found[0]
+            row.update({'Node_ID': iri, 'Node_Label': labels[iri] or '',
+                        'Matched_Name': name, 'Score': score})
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up HPO terms by label or synonym.")
+    parser.add_argument('release', help="obographs JSON release or subset (or .ivosnap)")
+    parser.add_argument('queries', nargs='*', help="text to look up")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--no-fuzzy', action='store_true', help="skip matches with misspelled words")
+    parser.add_argument('--map', help="text file of phenotype phrases, one per line: write each one's best match")
+    parser.add_argument('--out', default='mapped_terms.csv', help="output CSV for --map")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the saved index")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_search_index(args.release, args.rebuild)
+    print(f"{len(index)} terms, {len(index.names)} names indexed in {time.perf_counter() - start:.2f}s")
+
+    for query in args.queries:
+        start = time.perf_counter()
+        found = index.search(query, args.limit, not args.no_fuzzy)
+        elapsed = time.perf_counter() - start
+        print(f"{query!r}: {len(found)} matches in {elapsed * 1e6:.0f} us")
+        for iri, score, name in found:
+            print(f"  {score:6.3f}  {iri}  {name}")
+
+    if args.map:
+        with open(args.map, 'r', encoding='utf-8') as f:
+            phrases = [line.strip() for line in f if line.strip()]
+        start = time.perf_counter()
+        rows = map_phrases(index, phrases, not args.no_fuzzy)
+        elapsed = time.perf_counter() - start
+        with open(args.out, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=MAP_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        matched = sum('Node_ID' in row for row in rows)
+        print(f"Mapped {matched} of {len(phrases)} phrases in {elapsed:.2f}s; written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""Local query service holding HPO releases in memory for the IVO app.
+
+Loads one or more releases (or subsets) once, with their reachability
+index and the app's per-node metrics, and answers JSON queries over
+HTTP on 127.0.0.1 or a Unix socket, so IVO.qmd does not rebuild igraph
+objects and joins on every UI change. Connections are served concurrently
+by one asyncio loop; each query touches only the terms it returns. The
+few results built on first use (a release pair's parent analysis, a
+release's anomaly scores) are computed in a worker thread, so other
+clients are still answered meanwhile.
+
+GET /releases
+GET /view?root=TERM&max_depth=4&diff_threshold=100[&highlight=TERM][&filter=TERM][&release=NAME]
+         [&prune=1][&max_children=N][&placeholders=1]
+GET /find?q=TEXT[&limit=20][&fuzzy=0][&release=NAME]
+GET /highlight?term=TERM[&root=TERM][&release=NAME]
+GET /diff_flags?old=NAME&new=NAME[&max_parent_children=1][&min_desc_diff=100]
+GET /anomalies?[k=20][&branch=TERM][&top=TERM][&release=NAME]
+GET /is_ancestor?x=IRI&y=IRI, /descendants?id=IRI, /ancestors?id=IRI, /lca?x=IRI&y=IRI
+
+TERM is an IRI, a CURIE (HP:0000118) or text matched against labels and
+synonyms through the release's search index (hpo_search.py); NAME defaults
+to the first release given. Releases are named by their file name up to its
+first dot (base for base.json or base.json.gz).
+/view returns the app's full depth-limited view unless prune, max_children
+or placeholders ask for the pruned, collapsed form (see hpo_view.py).
+/anomalies ranks each branch below top (default the roots) by
+hpo_anomaly.py's scores, computed once per release and top.
+
+Usage: python hpo_service.py release.json [release.json ...] [--port 8766] [--socket PATH]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import hpo_anomaly
+import hpo_metrics
+import hpo_parents
+from hpo_diff import release_name
+from hpo_graph import load_graph
+from hpo_reach import ReachabilityIndex
+from hpo_search import load_search_index
+from hpo_view import ViewData, extract_view
+from ivo_pipeline import flag_nodes
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class QueryError(Exception):
+    """A query the service cannot answer; carries the HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LoadedRelease:
+    """One release with everything the queries need, built once at startup."""
+
+    def __init__(self, name, graph, search=None):
+        self.name = name
+        self.graph = graph
+        self.reach = ReachabilityIndex(graph)
+        self.view_data = ViewData(graph, search=search, reach=self.reach)
+        self.view_data.ranking()
+        self.anomaly_scores = {}
+
+    def anomalies(self, top=None):
+        """hpo_anomaly.AnomalyScores with branches below ``top`` (an id), built on first use."""
+        if top not in self.anomaly_scores:
+            self.anomaly_scores[top] = self.compute_anomalies(top)
+        return self.anomaly_scores[top]
+
+    def compute_anomalies(self, top=None):
+        return hpo_anomaly.AnomalyScores(self.graph, tops=None if top is None else [top])
+
+
+class QueryService:
+    """Answers queries against the loaded releases."""
+
+    def __init__(self, releases):
+        self.releases = {}
+        for r in releases:
+            if r.name in self.releases:
+                raise ValueError(f"Two releases are named {r.name}; rename one of the files")
+            self.releases[r.name] = r
+        self.default = releases[0].name
+        self._analyses = {}
+        self._building = {}
+
+    @classmethod
+    def load(cls, filepaths):
+        names = [release_name(filepath) for filepath in filepaths]
+        for name in names:
+            if names.count(name) > 1:
+                raise ValueError(f"Two releases are named {name}; rename one of the files")
+        releases = []
+        for filepath, name in zip(filepaths, names):
+            print(f"Loading {name} from {filepath}...")
+            releases.append(LoadedRelease(name, load_graph(filepath), load_search_index(filepath)))
+        return cls(releases)
+
+    def release(self, params, key='release'):
+        name = params.get(key) or self.default
+        if name not in self.releases:
+            raise QueryError(404, f"Unknown release {name}")
+        return self.releases[name]
+
+    def term(self, release, params, key):
+        if key not in params:
+            raise QueryError(400, f"Missing parameter {key}")
+        try:
+            return release.view_data.resolve(params[key])
+        except KeyError:
+            raise QueryError(404, f"No term matches {params[key]!r}") from None
+
+    def parent_analysis(self, old, new):
+        """Parent-analysis rows for the terms new in ``new``, cached per release pair."""
+        key = (old.name, new.name)
+        if key not in self._analyses:
+            self._analyses[key] = self.compute_parent_analysis(old, new)
+        return self._analyses[key]
+
+    @staticmethod
+    def compute_parent_analysis(old, new):
+        old_ids = set(old.graph.ids[i] for i in old.graph.declared_ids())
+        added = sorted(new.graph.ids[i] for i in new.graph.declared_ids()
+                       if new.graph.ids[i] not in old_ids)
+        return hpo_parents.old_parent_analysis(
+            hpo_parents.parent_sibling_rows(new.graph, added),
+            hpo_metrics.hierarchy_rows(old.graph))
+
+    def pending(self, path, params):
+        """(store, key, compute) for each result ``query`` would have to build first.
+
+        Unknown releases or terms are left for ``query`` to report.
+        """
+        try:
+            if path == '/diff_flags':
+                old, new = self.release(params, 'old'), self.release(params, 'new')
+                if (old.name, new.name) not in self._analyses:
+                    return [(self._analyses, (old.name, new.name),
+                             lambda: self.compute_parent_analysis(old, new))]
+            elif path == '/anomalies':
+                release = self.release(params)
+                top = self.term(release, params, 'top') if params.get('top') else None
+                if top not in release.anomaly_scores:
+                    return [(release.anomaly_scores, top, lambda: release.compute_anomalies(top))]
+        except QueryError:
+            pass
+        return []
+
+    async def prepare(self, path, params):
+        """Build what the query needs in a worker thread, once for concurrent requests."""
+        loop = asyncio.get_running_loop()
+        for store, key, compute in self.pending(path, params):
+            building = (id(store), key)
+            future = self._building.get(building)
+            if future is None:
+                future = self._building[building] = loop.run_in_executor(None, compute)
+            try:
+                value = await future
+            finally:
+                self._building.pop(building, None)
+            store.setdefault(key, value)
+
+    def query(self, path, params):
+        """Result of one GET query, or QueryError."""
+        if path == '/releases':
+            return [{'name': r.name, 'terms': len(r.graph), 'edges': r.graph.num_edges}
+                    for r in self.releases.values()]
+
+        if path == '/diff_flags':
+            old = self.release(params, 'old')
+            new = self.release(params, 'new')
+            flags = flag_nodes(self.parent_analysis(old, new),
+                               int(params.get('max_parent_children', 1)),
+                               int(params.get('min_desc_diff', 100)))
+            flagged = [f for f in flags if f['Flag_Parent_Children'] or f['Flag_Desc_Diff']]
+            return {'new_terms': len(flags), 'flagged': flagged}
+
+        release = self.release(params)
+        graph = release.graph
+        if path == '/view':
+            if params.get('root'):
+                root = self.term(release, params, 'root')
+            else:
+                root = graph.roots()[0]
+            allowed = None
+            if params.get('filter'):
+                focus = self.term(release, params, 'filter')
+                allowed = release.reach.ancestor_ids(focus).union(release.reach.descendant_ids(focus))
+            highlight = self.term(release, params, 'highlight') if params.get('highlight') else None
+            max_children = int(params['max_children']) if params.get('max_children') else None
+            return extract_view(release.view_data, root, int(params.get('max_depth', 4)),
+                                float(params.get('diff_threshold', 100)), highlight, allowed,
+                                prune=params.get('prune') == '1', max_children=max_children,
+                                placeholders=params.get('placeholders') == '1')
+        if path == '/find':
+            found = release.view_data.matches(params.get('q', ''), int(params.get('limit', 20)),
+                                              params.get('fuzzy') != '0')
+            return [{'id': graph.ids[i], 'label': graph.label(i), 'match': name, 'score': score}
+                    for i, score, name in found]
+        if path == '/anomalies':
+            top = self.term(release, params, 'top') if params.get('top') else None
+            branches = [self.term(release, params, 'branch')] if params.get('branch') else None
+            k = int(params.get('k', 20))
+            if k < 1:
+                raise QueryError(400, "k must be at least 1")
+            return release.anomalies(top).rows(k, branches=branches)
+        if path == '/highlight':
+            # The term plus the ancestors linking it to the root, for colouring a path
+            term = self.term(release, params, 'term')
+            ancestors = release.reach.ancestor_ids(term) - {term}
+            if params.get('root'):
+                root = self.term(release, params, 'root')
+                ancestors = [a for a in ancestors if release.reach.reaches(root, a)]
+            return {'id': graph.ids[term], 'label': graph.label(term),
+                    'ancestors': sorted(graph.ids[a] for a in ancestors)}
+
+        reach = release.reach
+        try:
+            if path == '/is_ancestor':
+                return reach.is_ancestor(params['x'], params['y'])
+            if path == '/descendants':
+                return reach.descendants(params['id'])
+            if path == '/ancestors':
+                return reach.ancestors(params['id'])
+            if path == '/lca':
+                return reach.lowest_common_ancestors(params['x'], params['y'])
+        except KeyError as e:
+            raise QueryError(400, f"Unknown term or missing parameter: {e}") from None
+        raise QueryError(404, f"Unknown query {path}")
+
+    def respond(self, method, target):
+        """(status, JSON body bytes) for one request."""
+        if method != 'GET':
+            status, result = 405, {'error': f"{method} not supported"}
+        else:
+            url = urlsplit(target)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                status, result = 200, self.query(url.path, params)
+            except QueryError as e:
+                status, result = e.status, {'error': str(e)}
+            except ValueError as e:
+                status, result = 400, {'error': str(e)}
+            except Exception as e:
+                status, result = 500, {'error': f"{type(e).__name__}: {e}"}
+        return status, json.dumps(result, ensure_ascii=False).encode('utf-8')
+
+    async def respond_async(self, method, target):
+        """``respond``, after building anything slow off the event loop."""
+        if method == 'GET':
+            url = urlsplit(target)
+            try:
+                await self.prepare(url.path, {k: v[0] for k, v in parse_qs(url.query).items()})
+            except Exception as e:
+                body = {'error': f"{type(e).__name__}: {e}"}
+                return 500, json.dumps(body, ensure_ascii=False).encode('utf-8')
+        return self.respond(method, target)
+
+
+async def serve_connection(service, reader, writer):
+    """Answer HTTP/1.1 requests on one connection until the client closes it."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, version = request_line.decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            status, body = await service.respond_async(method, target)
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, port=8766, socket_path=None):
+    def handler(reader, writer):
+        return serve_connection(service, reader, writer)
+
+    if socket_path:
+        server = await asyncio.start_unix_server(handler, socket_path)
+        print(f"Serving on unix:{socket_path}")
+    else:
+        server = await asyncio.start_server(handler, '127.0.0.1', port)
+        print(f"Serving on http://127.0.0.1:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ontology queries for the IVO app from memory.")
+    parser.add_argument('releases', nargs='+', help="obographs JSON releases or subsets (or .ivosnap)")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--socket', help="listen on this Unix socket instead of a TCP port")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        service = QueryService.load(args.releases)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Loaded {len(service.releases)} release(s) in {time.perf_counter() - start:.1f}s")
+    # The loaded releases live until exit; keep them out of the collector's passes
+    gc.freeze()
+    try:
+        asyncio.run(serve(service, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Term and term-set semantic similarity over one release.
+
+Information content is intrinsic: IC(t) = -log((d(t) + 1) / N), where d(t)
+is the number of distinct terms below t and N the number of terms. Terms
+are ranked by IC, and each term's ancestor set (itself included) is
+precomputed once as a frozenset of ranks. Then:
+
+- Resnik(a, b) = IC of the most informative common ancestor, the largest
+  rank in anc(a) & anc(b)
+- Lin(a, b) = 2 * Resnik(a, b) / (IC(a) + IC(b))
+- Jaccard(a, b) = |anc(a) & anc(b)| / |anc(a) | anc(b)|
+
+so a pair costs one set intersection. ``blocks`` scores a block of rows
+against a list of columns at a time, keeping only ``chunk_size`` rows of
+scores in memory, and ``neighbourhood_scores`` scores each term new in a
+release against its parents and their children in the older release.
+
+Usage: python hpo_similarity.py new.json --old old.json [--out scores.csv]
+       python hpo_similarity.py release.json --pairs terms.txt [--measure lin] [--out matrix.csv]
+"""
+import argparse
+import csv
+import math
+import time
+from array import array
+
+from hpo_graph import load_graph
+from hpo_metrics import distinct_descendant_counts, topological_order
+
+MEASURES = ('resnik', 'lin', 'jaccard')
+
+NEIGHBOURHOOD_FIELDS = ['Node_ID', 'Node_Label', 'Num_Neighbours', 'Best_Neighbour_ID',
+                        'Best_Neighbour_Label', 'Best_Lin', 'Mean_Lin', 'Best_Resnik', 'Best_Jaccard']
+
+
+class Similarity:
+    """IC and ancestor sets of one release, for batch similarity scoring."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        n = len(graph)
+        counts = distinct_descendant_counts(graph)
+        total = max(sum(graph.declared), 1)
+        self.ic = array('d', [max(-math.log(min(counts[i] + 1, total) / total), 0.0) for i in range(n)])
+
+        # Rank 0 is the least informative term, so a common ancestor set's
+        # largest rank is its most informative member
+        by_ic = sorted(range(n), key=lambda i: self.ic[i])
+        self.rank = array('i', bytes(4 * n))
+        for r, i in enumerate(by_ic):
+            self.rank[i] = r
+        self.ic_by_rank = array('d', [self.ic[i] for i in by_ic])
+
+        order, cyclic = topological_order(graph)
+        ancestors = [None] * n
+        # Terms on or above a cycle only have such terms above them, so they
+        # are walked first and the terms below them build on their sets
+        for node in cyclic:
+            ancestors[node] = frozenset(self.rank[i] for i in _ancestors_of(graph, node))
+        for node in reversed(order):
+            own = {self.rank[node]}
+            for parent in graph.parents(node):
+                own |= ancestors[parent]
+            ancestors[node] = frozenset(own)
+        self.ancestors = ancestors
+
+    @classmethod
+    def from_file(cls, filepath):
+        return cls(load_graph(filepath))
+
+    def id_of(self, term):
+        i = self.graph.index_of(term)
+        if i is None:
+            raise KeyError(term)
+        return i
+
+    def resnik_ids(self, a, b):
+        common = self.ancestors[a] & self.ancestors[b]
+        return self.ic_by_rank[max(common)] if common else 0.0
+
+    def lin_ids(self, a, b):
+        denominator = self.ic[a] + self.ic[b]
+        return 2 * self.resnik_ids(a, b) / denominator if denominator else float(a == b)
+
+    def jaccard_ids(self, a, b):
+        x, y = self.ancestors[a], self.ancestors[b]
+        common = len(x & y)
+        return common / (len(x) + len(y) - common)
+
+    def resnik(self, a, b):
+        return self.resnik_ids(self.id_of(a), self.id_of(b))
+
+    def lin(self, a, b):
+        return self.lin_ids(self.id_of(a), self.id_of(b))
+
+    def jaccard(self, a, b):
+        return self.jaccard_ids(self.id_of(a), self.id_of(b))
+
+    def block(self, rows, cols, measure='lin'):
+        """Scores of every row id against every column id, one array('d') per row."""
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown measure {measure}; expected one of {', '.join(MEASURES)}")
+        ancestors, ic, ic_by_rank = self.ancestors, self.ic, self.ic_by_rank
+        col_sets = [ancestors[c] for c in cols]
+        out = []
+        for a in rows:
+            x = ancestors[a]
+            # Inline the measures: this loop is where all-pairs time goes
+            commons = [x & y for y in col_sets]
+            if measure == 'jaccard':
+                nx = len(x)
+                scores = [len(c) / (nx + len(y) - len(c)) for c, y in zip(commons, col_sets)]
+            else:
+                scores = [ic_by_rank[max(c)] if c else 0.0 for c in commons]
+                if measure == 'lin':
+                    ica = ic[a]
+                    scores = [2 * s / (ica + ic[b]) if ica + ic[b] else float(a == b)
+                              for s, b in zip(scores, cols)]
+            out.append(array('d', scores))
+        return out
+
+    def blocks(self, rows, cols, measure='lin', chunk_size=1024):
+        """Yield (row offset, block) over ``rows`` in chunks of ``chunk_size`` rows."""
+        for start in range(0, len(rows), chunk_size):
+            yield start, self.block(rows[start:start + chunk_size], cols, measure)
+
+    def best_match_average(self, terms_a, terms_b, measure='resnik'):
+        """Symmetric best-match average similarity of two term sets (IRIs)."""
+        a = [self.id_of(t) for t in terms_a]
+        b = [self.id_of(t) for t in terms_b]
+        if not a or not b:
+            return 0.0
+        matrix = self.block(a, b, measure)
+        row_best = sum(max(row) for row in matrix) / len(a)
+        col_best = sum(max(row[j] for row in matrix) for j in range(len(b))) / len(b)
+        return (row_best + col_best) / 2
+
+
+def _ancestors_of(graph, node):
+    seen = {node}
+    stack = [node]
+    while stack:
+        for parent in graph.parents(stack.pop()):
+            if parent not in seen:
+                seen.add(parent)
+                stack.append(parent)
+    return seen
+
+
+def neighbourhood_scores(sim, old_graph, term_ids=None):
+    """Score terms new in ``sim``'s release against their old-release neighbourhood.
+
+    The neighbourhood of a new term is each of its parents that exists in
+    ``old_graph`` plus that parent's children there; similarity is
+    measured in the new release. ``term_ids`` defaults to every declared
+    term missing from the old release. Returns one row per term.
+    """
+    graph = sim.graph
+    if term_ids is None:
+        term_ids = [graph.ids[i] for i in graph.declared_ids() if graph.ids[i] not in old_graph]
+    rows = []
+    for iri in term_ids:
+        t = sim.id_of(iri)
+        neighbours = set()
+        for parent in graph.parents(t):
+            old_parent = old_graph.index_of(graph.ids[parent])
+            if old_parent is None:
+                continue
+            neighbours.add(parent)
+            for child in old_graph.children(old_parent):
+                i = graph.index_of(old_graph.ids[child])
+                if i is not None and i != t:
+                    neighbours.add(i)
+        neighbours = sorted(neighbours)
+        row = {'Node_ID': iri, 'Node_Label': graph.label(t), 'Num_Neighbours': len(neighbours)}
+        if neighbours:
+            lin = sim.block([t], neighbours, 'lin')[0]
+            best = max(range(len(neighbours)), key=lin.__getitem__)
+            row.update({
+                'Best_Neighbour_ID': graph.ids[neighbours[best]],
+                'Best_Neighbour_Label': graph.label(neighbours[best]),
+                'Best_Lin': round(lin[best], 4),
+                'Mean_Lin': round(sum(lin) / len(lin), 4),
+                'Best_Resnik': round(max(sim.block([t], neighbours, 'resnik')[0]), 4),
+                'Best_Jaccard': round(max(sim.block([t], neighbours, 'jaccard')[0]), 4),
+            })
+        rows.append(row)
+    return rows
+
+
+def write_matrix(sim, terms, out_path, measure='lin', chunk_size=1024):
+    """Write the all-pairs matrix of ``terms`` (IRIs) as CSV, one chunk of rows at a time."""
+    ids = [sim.id_of(t) for t in terms]
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ID'] + list(terms))
+        for start, block in sim.blocks(ids, ids, measure, chunk_size):
+            for k, row in enumerate(block):
+                writer.writerow([terms[start + k]] + [round(s, 4) for s in row])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic similarity (Resnik, Lin, Jaccard) over an HPO release.")
+    parser.add_argument('release', help="release to measure similarity in (obographs JSON or .ivosnap)")
+    parser.add_argument('--old', help="older release: score terms new in RELEASE against their neighbourhood there")
+    parser.add_argument('--pairs', help="text file of comma- or line-separated IRIs: write their all-pairs matrix")
+    parser.add_argument('--measure', choices=MEASURES, default='lin', help="measure for the --pairs matrix")
+    parser.add_argument('--chunk-size', type=int, default=1024, help="matrix rows computed at a time")
+    parser.add_argument('--out', help="output CSV (default: neighbourhood_scores.csv or similarity_matrix.csv)")
+    args = parser.parse_args()
+    if not args.old and not args.pairs:
+        parser.error("one of --old or --pairs is required")
+
+    start = time.perf_counter()
+    sim = Similarity.from_file(args.release)
+    print(f"Indexed {len(sim.graph)} terms in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    if args.pairs:
+        with open(args.pairs, 'r', encoding='utf-8') as f:
+            terms = [t.strip() for t in f.read().replace('\n', ',').split(',') if t.strip()]
+        out = args.out or 'similarity_matrix.csv'
+        write_matrix(sim, terms, out, args.measure, args.chunk_size)
+        print(f"{len(terms)} x {len(terms)} {args.measure} matrix written to {out} "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        rows = neighbourhood_scores(sim, load_graph(args.old))
+        out = args.out or 'neighbourhood_scores.csv'
+        with open(out, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=NEIGHBOURHOOD_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"{len(rows)} new terms scored against their old-release neighbourhoods in "
+              f"{time.perf_counter() - start:.1f}s; written to {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Binary pre-indexed snapshots of HPO releases.
+
+``compile_snapshot`` parses a release once and writes its interned id
+table, label blob, CSR edge arrays and precomputed depth, descendant
+count and descendant-diff arrays into a single ``.ivosnap`` file.
+``open_snapshot`` memory-maps that file read-only and wraps each section
+in a zero-copy ``memoryview``, so warm starts skip JSON parsing entirely
+and every process opening the same snapshot shares one copy in the OS
+page cache.
+
+Layout: 8-byte magic, a little-endian uint32 header length, a JSON header
+describing each section (offset, length, typecode), then the sections,
+each aligned to 8 bytes.
+
+Usage: python hpo_snapshot.py release.json [release.json.ivosnap]
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from itertools import accumulate
+
+import hpo_metrics
+from hpo_graph import IS_A, OntologyGraph, load_graph
+
+SNAPSHOT_SUFFIX = '.ivosnap'
+MAGIC = b'IVOSNAP1'
+_ALIGN = 8
+
+
+class StringTable:
+    """Read-only sequence of strings stored as one UTF-8 blob plus offsets."""
+
+    def __init__(self, offsets, blob, present=None):
+        self.offsets = offsets
+        self.blob = blob
+        self.present = present
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.present is not None and not self.present[i]:
+            return None
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def _string_sections(strings):
+    present = bytearray(0 if s is None else 1 for s in strings)
+    encoded = [b'' if s is None else s.encode('utf-8') for s in strings]
+    offsets = array('q', [0])
+    offsets.extend(accumulate(len(b) for b in encoded))
+    return offsets, b''.join(encoded), present
+
+
+def snapshot_path_for(filepath):
+    """Default snapshot location next to a JSON release."""
+    return filepath + SNAPSHOT_SUFFIX
+
+
+def compile_snapshot(filepath, snapshot_path=None, predicates=IS_A):
+    """Parse a JSON release once and write its snapshot; returns the snapshot path."""
+    snapshot_path = snapshot_path or snapshot_path_for(filepath)
+    graph = load_graph(filepath, predicates)
+    depth = hpo_metrics.depths(graph)
+    counts = hpo_metrics.descendant_counts(graph)
+    diffs = hpo_metrics.max_descendant_diffs(graph, counts)
+
+    stat = os.stat(filepath)
+    source = {
+        'source': os.path.abspath(filepath),
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'predicates': None if predicates is None else sorted(predicates),
+    }
+    metrics = {'depth': depth, 'num_descendants': counts, 'max_descendant_diff': diffs}
+    return write_snapshot(graph, snapshot_path, source, metrics)
+
+
+def write_snapshot(graph, snapshot_path, source=None, metrics=None):
+    """Write ``graph`` (and optional metric arrays) as a snapshot file.
+
+    ``source`` holds the header fields describing the JSON it came from;
+    a snapshot written without one is never considered fresh for a JSON file.
+    """
+    id_offsets, id_blob, _ = _string_sections(graph.ids)
+    label_offsets, label_blob, label_present = _string_sections(graph.labels)
+    sections = [
+        ('id_offsets', id_offsets),
+        ('id_blob', id_blob),
+        ('label_offsets', label_offsets),
+        ('label_blob', label_blob),
+        ('label_present', label_present),
+        ('declared', bytes(graph.declared)),
+        ('deprecated', array('i', sorted(graph.deprecated))),
+        ('parent_offsets', graph.parent_offsets),
+        ('parent_index', graph.parent_index),
+        ('child_offsets', graph.child_offsets),
+        ('child_index', graph.child_index),
+    ]
+    sections.extend((metrics or {}).items())
+
+    header = {
+        'source': None,
+        'source_size': -1,
+        'source_mtime_ns': -1,
+        'predicates': None,
+        **(source or {}),
+        'num_terms': len(graph),
+        'sections': {},
+    }
+    # Section offsets are relative to the end of the header
+    payload = []
+    position = 0
+    for name, data in sections:
+        if isinstance(data, array):
+            typecode, raw = data.typecode, data.tobytes()
+        elif isinstance(data, memoryview):
+            # Sections of a graph that was itself loaded from a snapshot
+            typecode, raw = data.format, data.tobytes()
+        else:
+            typecode, raw = 'B', bytes(data)
+        padding = -position % _ALIGN
+        payload.append(b'\0' * padding)
+        position += padding
+        header['sections'][name] = [position, len(raw), typecode]
+        payload.append(raw)
+        position += len(raw)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(len(MAGIC) + 4 + len(header_bytes)) % _ALIGN)
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for chunk in payload:
+            f.write(chunk)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+class Snapshot:
+    """A memory-mapped release: ``graph`` plus precomputed metric arrays."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"Not an IVO snapshot: {path}")
+        (header_len,) = struct.unpack_from('<I', view, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(view[start:start + header_len]))
+        base = start + header_len
+
+        def section(name):
+            offset, length, typecode = self.header['sections'][name]
+            return view[base + offset:base + offset + length].cast(typecode)
+
+        ids = StringTable(section('id_offsets'), section('id_blob'))
+        labels = StringTable(section('label_offsets'), section('label_blob'),
+                             section('label_present'))
+        self.graph = OntologyGraph(ids, labels, section('declared'),
+                                   section('parent_offsets'), section('parent_index'),
+                                   section('child_offsets'), section('child_index'))
+        if 'deprecated' in self.header['sections']:
+            self.graph.deprecated = frozenset(section('deprecated'))
+        # Metric arrays are absent from graph-only snapshots (write_snapshot without metrics)
+        for name in ('depth', 'num_descendants', 'max_descendant_diff'):
+            if name in self.header['sections']:
+                self.graph.metrics[name] = section(name)
+        self.depths = self.graph.metrics.get('depth')
+        self.num_descendants = self.graph.metrics.get('num_descendants')
+        self.max_descendant_diffs = self.graph.metrics.get('max_descendant_diff')
+
+    @property
+    def predicates(self):
+        preds = self.header['predicates']
+        return None if preds is None else tuple(preds)
+
+    def is_fresh_for(self, filepath):
+        """True if the snapshot was compiled from the current version of ``filepath``."""
+        stat = os.stat(filepath)
+        return (self.header['source_size'] == stat.st_size
+                and self.header['source_mtime_ns'] == stat.st_mtime_ns)
+
+
+def open_snapshot(path):
+    """Memory-map a snapshot written by ``compile_snapshot``."""
+    return Snapshot(path)
+
+
+def predicates_key(predicates):
+    """The form a snapshot header records ``predicates`` in (None for every edge type)."""
+    return None if predicates is None else tuple(sorted(predicates))
+
+
+def describe_predicates(predicates):
+    return 'edges of every type' if predicates is None else f"{', '.join(predicates)} edges"
+
+
+def find_snapshot(filepath, predicates=IS_A):
+    """Return an up-to-date snapshot compiled from ``filepath``, or None."""
+    path = snapshot_path_for(filepath)
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = open_snapshot(path)
+    except (ValueError, KeyError, struct.error):
+        return None
+    if snapshot.predicates != predicates_key(predicates) or not snapshot.is_fresh_for(filepath):
+        return None
+    return snapshot
+
+
+def main(filepath, snapshot_path=None):
+    start = time.perf_counter()
+    snapshot_path = compile_snapshot(filepath, snapshot_path)
+    print(f"Compiled {filepath} -> {snapshot_path} in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    snapshot = open_snapshot(snapshot_path)
+    print(f"Warm start: {len(snapshot.graph)} terms mapped in "
+          f"{(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python hpo_snapshot.py release.json [release.json.ivosnap]")
+        sys.exit(1)
+    main(*sys.argv[1:])
@@ -0,0 +1,210 @@
+"""Grouped statistics over hierarchy rows (the hpo_*-hierarchy.csv columns).
+
+Rows are first copied into columns (one ``array('d')`` per statistic
+column, NaN for empty cells), so every cell is parsed once. Grouping by
+any key (depth, release, parent or top-level branch) sorts the row
+indices by their key tuple once and cuts the sorted order into runs.
+Each group's values are sorted once per column, and min, max, median and
+any quantiles are read off the sorted run.
+
+Usage: python hpo_stats.py hierarchy.csv [hierarchy.csv ...] [--by Release Depth]
+           [--quantiles 0.25 0.75] [--graph release.json] [--out stats.csv]
+"""
+import argparse
+import csv
+import math
+import os
+from array import array
+from itertools import groupby, product
+
+from hpo_graph import load_graph
+from hpo_metrics import branches as branch_ids
+
+STAT_COLUMNS = ['Num_Descendants', 'Max_Num_Descendant_Diff', 'Num_Children', 'Num_Parents']
+STAT_NAMES = ['min', 'max', 'mean', 'median']
+
+# Keys that can hold several values per term; the term counts in each group
+MULTI_KEYS = {'Parent', 'Branch'}
+
+
+def quantile_name(q):
+    return f'q{q * 100:g}'
+
+
+def stats_fieldnames(columns=STAT_COLUMNS, quantiles=(), by=('Depth',)):
+    fieldnames = list(by) + ['Num_Nodes']
+    for col in columns:
+        fieldnames.extend(f'{col}_{name}' for name in STAT_NAMES)
+        fieldnames.extend(f'{col}_{quantile_name(q)}' for q in quantiles)
+    return fieldnames
+
+
+def _number(value):
+    if value in ('', None):
+        return math.nan
+    return float(value)
+
+
+def quantile(values, q):
+    """Linearly interpolated ``q`` quantile of sorted ``values``."""
+    position = (len(values) - 1) * q
+    lo = math.floor(position)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (position - lo)
+
+
+def calc_stats(values, quantiles=()):
+    """Min, max, mean, median (and quantiles) of the non-empty values, or None."""
+    values = sorted(v for v in map(_number, values) if v == v)
+    if not values:
+        return None
+    return sorted_stats(values, quantiles)
+
+
+def sorted_stats(values, quantiles=()):
+    """``calc_stats`` of values that are already numbers, sorted and non-empty."""
+    n = len(values)
+    mid = n // 2
+    stats = {
+        'min': values[0],
+        'max': values[-1],
+        'mean': math.fsum(values) / n,
+        'median': values[mid] if n % 2 else (values[mid - 1] + values[mid]) / 2,
+    }
+    for q in quantiles:
+        stats[quantile_name(q)] = quantile(values, q)
+    return stats
+
+
+class HierarchyColumns:
+    """Hierarchy rows stored column by column."""
+
+    def __init__(self, columns=STAT_COLUMNS):
+        self.stat_columns = list(columns)
+        self.ids = []
+        self.keys = {'Depth': array('i'), 'Release': []}
+        self.values = {col: array('d') for col in self.stat_columns}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_rows(self, rows, release=''):
+        """Append hierarchy rows (dicts with ID, Depth and the stat columns)."""
+        ids, depth, values = self.ids, self.keys['Depth'], self.values
+        start = len(ids)
+        for row in rows:
+            ids.append(row['ID'])
+            depth.append(int(row['Depth']))
+            for col, column in values.items():
+                column.append(_number(row.get(col)))
+        self.keys['Release'].extend([release] * (len(ids) - start))
+        return self
+
+    @classmethod
+    def from_rows(cls, rows, columns=STAT_COLUMNS, release=''):
+        return cls(columns).add_rows(rows, release)
+
+    @classmethod
+    def from_csv(cls, filepaths, columns=STAT_COLUMNS):
+        """Load several hierarchy CSVs; the Release key is each file's name."""
+        table = cls(columns)
+        for filepath in filepaths:
+            with open(filepath, 'r', newline='', encoding='utf-8') as f:
+                release = os.path.splitext(os.path.basename(filepath))[0]
+                table.add_rows(csv.DictReader(f), release)
+        return table
+
+    def add_graph_keys(self, graph):
+        """Add Parent and Branch keys from a release graph.
+
+        Branch is the top-level term (a child of a root) a term falls under;
+        roots and their children are their own branch.
+        """
+        branches = branch_ids(graph)
+        ids = graph.ids
+        parent_keys, branch_keys = [], []
+        for iri in self.ids:
+            i = graph.index_of(iri)
+            if i is None:
+                parent_keys.append(())
+                branch_keys.append(())
+            else:
+                parent_keys.append(tuple(ids[p] for p in dict.fromkeys(graph.parents(i))))
+                branch_keys.append(tuple(ids[b] for b in branches[i]))
+        self.keys['Parent'] = parent_keys
+        self.keys['Branch'] = branch_keys
+        return self
+
+    def group(self, by=('Depth',)):
+        """Map each key tuple to the row indices in that group, in key order."""
+        columns = [self.keys[k] for k in by]
+        if MULTI_KEYS.intersection(by):
+            # One (key, row) pair per combination of the row's key values
+            multi = [k in MULTI_KEYS for k in by]
+            keys, rows = [], array('i')
+            for i, values in enumerate(zip(*columns)):
+                for key in product(*[v if m else (v,) for v, m in zip(values, multi)]):
+                    keys.append(key)
+                    rows.append(i)
+        else:
+            keys = list(zip(*columns))
+            rows = range(len(keys))
+        # A stable sort keeps each group's rows in their original order
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        return {key: array('i', map(rows.__getitem__, run))
+                for key, run in groupby(order, key=keys.__getitem__)}
+
+    def grouped_statistics(self, by=('Depth',), columns=None, quantiles=()):
+        """One statistics row per group, in increasing key order."""
+        columns = self.stat_columns if columns is None else columns
+        # Empty cells are NaN; only columns that have some need filtering
+        has_empty = {col: any(v != v for v in self.values[col]) for col in columns}
+        results = []
+        for key, rows in self.group(by).items():
+            result = dict(zip(by, key))
+            result['Num_Nodes'] = len(rows)
+            for col in columns:
+                values = map(self.values[col].__getitem__, rows)
+                if has_empty[col]:
+                    values = [v for v in values if v == v]
+                values = sorted(values)
+                if values:
+                    for name, value in sorted_stats(values, quantiles).items():
+                        result[f'{col}_{name}'] = value
+            results.append(result)
+        return results
+
+
+def statistics_by_depth(rows, columns=STAT_COLUMNS, quantiles=()):
+    """One statistics_by_depth row per depth, in increasing depth order."""
+    table = HierarchyColumns.from_rows(rows, columns)
+    return table.grouped_statistics(('Depth',), columns, quantiles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistics of hierarchy CSVs grouped by depth or other keys.")
+    parser.add_argument('hierarchy_files', nargs='+', help="hpo_*-hierarchy.csv files from 3.summarize_subset.py")
+    parser.add_argument('--by', nargs='+', choices=['Release', 'Depth', 'Parent', 'Branch'],
+                        help="grouping keys (default: Release Depth, or Depth for one file)")
+    parser.add_argument('--quantiles', nargs='+', type=float, default=[], help="extra quantiles, e.g. 0.25 0.75")
+    parser.add_argument('--graph', help="release or subset JSON, required to group by Parent or Branch")
+    parser.add_argument('--out', default='statistics_by_depth.csv', help="output CSV")
+    args = parser.parse_args()
+
+    by = args.by or (['Release', 'Depth'] if len(args.hierarchy_files) > 1 else ['Depth'])
+    table = HierarchyColumns.from_csv(args.hierarchy_files)
+    if MULTI_KEYS.intersection(by):
+        if not args.graph:
+            parser.error("--graph is required to group by Parent or Branch")
+        table.add_graph_keys(load_graph(args.graph))
+
+    results = table.grouped_statistics(by, quantiles=args.quantiles)
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=stats_fieldnames(STAT_COLUMNS, args.quantiles, by))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"{len(table)} rows from {len(args.hierarchy_files)} file(s) -> {len(results)} groups in {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""Incremental reader for obographs JSON releases.
+
+Walks ``graphs[i].nodes`` and ``graphs[i].edges`` one array element at a
+time from a fixed-size text buffer, so the full document is never
+materialized. Everything else (graph ``meta``, logical definition axioms,
+other graphs) is skipped by scanning brackets, without building objects.
+"""
+import gzip
+import json
+import re
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 1 << 20
+
+NODE_KEYS = ('id', 'lbl')
+EDGE_KEYS = ('sub', 'pred', 'obj')
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_STRING_TAIL = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Character buffer over a text file with JSON token helpers."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk, dropping the consumed prefix of the buffer."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def peek(self):
+        """Skip whitespace and return the next character ('' at end of file)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise self.error(f"Expecting '{ch}'")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+    def key(self):
+        if self.peek() != '"':
+            raise self.error("Expecting property name enclosed in double quotes")
+        return self.value()
+
+    def skip(self):
+        """Skip the next JSON value without building it."""
+        ch = self.peek()
+        if ch not in '{[':
+            self.value()
+            return
+        depth = 0
+        while True:
+            m = _STRUCTURAL.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise self.error("Unterminated value")
+                continue
+            ch = m.group()
+            if ch == '"':
+                tail = _STRING_TAIL.match(self.buf, m.end())
+                if tail is None:
+                    self.pos = m.start()
+                    if not self.fill():
+                        raise self.error("Unterminated string")
+                    continue
+                self.pos = tail.end()
+                continue
+            self.pos = m.end()
+            depth += 1 if ch in '{[' else -1
+            if depth == 0:
+                return
+
+    def members(self):
+        """Iterate the keys of an object; the caller consumes each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            name = self.key()
+            self.expect(':')
+            yield name
+            ch = self.peek()
+            self.pos += 1
+            if ch == '}':
+                return
+            if ch != ',':
+                self.pos -= 1
+                raise self.error("Expecting ',' delimiter")
+
+    def items(self):
+        """Iterate the positions of an array; the caller consumes each element."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            ch = self.peek()
+            self.pos += 1
+            if ch == ']':
+                return
+            if ch != ',':
+                self.pos -= 1
+                raise self.error("Expecting ',' delimiter")
+
+
+def open_text(filepath, mode='r'):
+    """Open a JSON file as UTF-8 text, (de)compressing .gz and .zst by suffix."""
+    if filepath.endswith('.gz'):
+        return gzip.open(filepath, mode + 't', encoding='utf-8')
+    if filepath.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError(f"zstandard is required for {filepath} (pip install zstandard)")
+        return zstandard.open(filepath, mode + 't', encoding='utf-8')
+    return open(filepath, mode, encoding='utf-8')
+
+
+def _trim(record, keys):
+    trimmed = {k: record[k] for k in keys if k in record}
+    meta = record.get('meta')
+    if meta and meta.get('deprecated'):
+        trimmed['deprecated'] = True
+    return trimmed
+
+
+def iter_graph_records(filepath, graph_index=0, full=False, chunk_size=CHUNK_SIZE):
+    """Yield ('node', record) and ('edge', record) pairs in file order.
+
+    Records are trimmed to ``id``/``lbl`` and ``sub``/``pred``/``obj`` (plus
+    ``deprecated: True`` for obsolete terms) unless ``full`` is set, in which
+    case each element is yielded as parsed. Snapshots (``.ivosnap``) hold no
+    records, so they raise ValueError.
+    """
+    import hpo_snapshot
+
+    if filepath.endswith(hpo_snapshot.SNAPSHOT_SUFFIX):
+        raise ValueError(f"{filepath} is a snapshot, which holds no JSON records; "
+                         f"use the JSON release it was compiled from")
+    with open_text(filepath) as f:
+        reader = _Reader(f, chunk_size)
+        for name in reader.members():
+            if name != 'graphs':
+                reader.skip()
+                continue
+            for position, _ in enumerate(reader.items()):
+                if position != graph_index:
+                    reader.skip()
+                    continue
+                for field in reader.members():
+                    if field == 'nodes':
+                        kind, keys = 'node', NODE_KEYS
+                    elif field == 'edges':
+                        kind, keys = 'edge', EDGE_KEYS
+                    else:
+                        reader.skip()
+                        continue
+                    for _ in reader.items():
+                        record = reader.value()
+                        yield kind, record if full else _trim(record, keys)
+                # The requested graph is complete; ignore the rest of the file
+                return
+            raise IndexError(f"graphs[{graph_index}] not found in {filepath}")
+    raise KeyError('graphs')
@@ -0,0 +1,337 @@
+"""Depth-limited and threshold-pruned views of a release for rendering.
+
+``depth_view`` does what the app's ``processed_data`` reactive does after
+choosing a root: breadth-first depth from the root, the nodes up to
+``max_depth`` and the edges between them, per-node parent/child lists and
+counts within the view, sole children, leaves and the sibling-granularity
+flag. Only the terms within ``max_depth`` of the root are visited.
+Like the app, ``desc_diff`` and the flag only compare a term with the
+siblings under its parents below the root (and within "filter by node"),
+so a parent outside the root does not count; ``num_desc`` and
+``subtree_height`` are release-wide.
+
+``extract_view`` also prunes by the granularity threshold and collapses
+what it leaves out into one placeholder node per parent, carrying the
+number of hidden children and the size of their subtrees. Children are
+kept in a per-release order, largest ``desc_diff`` at or below them
+first, so pruning stops at the first child under the threshold and the
+work is proportional to the nodes returned, not to the subset below the
+root. Ranking uses the release-wide ``desc_diff``, so pruning does not
+depend on the root.
+
+Usage: python hpo_view.py release.json root_term [--max-depth 4] [--threshold 100]
+           [--prune] [--max-children N] [--out view.json]
+"""
+import argparse
+import json
+import sys
+import time
+from array import array
+from collections import deque
+
+from hpo_graph import load_graph
+from hpo_metrics import app_metrics, topological_order
+from hpo_reach import ReachabilityIndex
+from hpo_search import SearchIndex, load_search_index
+
+
+class ViewData:
+    """A graph with the app's per-node metrics and a label and synonym lookup.
+
+    ``search`` is the release's SearchIndex (see hpo_search.py); without one,
+    an index of the graph's labels is built on first lookup. ``reach`` is
+    the release's ReachabilityIndex, likewise built on first use.
+    """
+
+    def __init__(self, graph, metrics=None, search=None, reach=None):
+        self.graph = graph
+        self.metrics = metrics or app_metrics(graph)
+        self.search = search
+        self.reach = reach
+        self._ranking = None
+
+    def reachability(self):
+        if self.reach is None:
+            self.reach = ReachabilityIndex(self.graph)
+        return self.reach
+
+    def ranking(self):
+        """(by_diff, by_size, below), built on first use.
+
+        ``below[i]`` is the largest ``desc_diff`` of ``i`` or any term under
+        it (-1 if none). ``by_diff`` and ``by_size`` are the child CSR index
+        with each term's children sorted by ``below`` and by ``num_desc``,
+        largest first.
+        """
+        if self._ranking is None:
+            graph = self.graph
+            offsets, index = graph.child_offsets, graph.child_index
+            desc_diff, num_desc = self.metrics['desc_diff'], self.metrics['num_desc']
+            below = array('q', desc_diff)
+            order, cyclic = topological_order(graph)
+            for node in order + cyclic:
+                for j in range(offsets[node], offsets[node + 1]):
+                    if below[index[j]] > below[node]:
+                        below[node] = below[index[j]]
+            by_diff = array('i', index)
+            by_size = array('i', index)
+            for node in range(len(graph)):
+                lo, hi = offsets[node], offsets[node + 1]
+                if lo == hi:
+                    continue
+                children = index[lo:hi]
+                by_diff[lo:hi] = array('i', sorted(children, key=lambda c: -below[c]))
+                by_size[lo:hi] = array('i', sorted(children, key=lambda c: -num_desc[c]))
+            self._ranking = by_diff, by_size, below
+        return self._ranking
+
+    def resolve(self, term):
+        """Id of a term given as IRI, CURIE (HP:0000118), label or synonym.
+
+        Text is matched case-insensitively and the best match is taken:
+        an exact name, then a name starting with the text, then names
+        containing it (see ``SearchIndex.search``). Raises KeyError when
+        nothing matches.
+        """
+        graph = self.graph
+        i = graph.index_of(term)
+        if i is None and ':' in term and '/' not in term:
+            i = graph.index_of('http://purl.obolibrary.org/obo/' + term.replace(':', '_'))
+        if i is not None:
+            return i
+        matches = self.find(term, limit=1, fuzzy=False)
+        if not matches:
+            raise KeyError(term)
+        return matches[0]
+
+    def matches(self, text, limit=20, fuzzy=True):
+        """(id, score, matched name) of up to ``limit`` terms best matching ``text``."""
+        if self.search is None:
+            self.search = SearchIndex.from_graph(self.graph)
+        found = []
+        for iri, score, name in self.search.search(text, limit, fuzzy):
+            i = self.graph.index_of(iri)
+            if i is not None:
+                found.append((i, score, name))
+        return found
+
+    def find(self, text, limit=20, fuzzy=True):
+        """Ids of up to ``limit`` terms best matching ``text`` by label or synonym."""
+        return [i for i, _, _ in self.matches(text, limit, fuzzy)]
+
+
+def _expand(data, root, max_depth, diff_threshold, allowed, prune, max_children):
+    """BFS from ``root``; returns ({id: depth}, {parent: (hidden children, hidden size)})."""
+    graph = data.graph
+    offsets = graph.child_offsets
+    num_desc = data.metrics['num_desc']
+    by_diff, by_size, below = data.ranking()
+    # Pruning shows the children with the largest differences, a cap the largest subtrees
+    ranked = by_diff if prune else by_size
+    depth = {root: 0}
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        lo, hi = offsets[node], offsets[node + 1]
+        d = depth[node] + 1
+        if lo == hi or d > max_depth:
+            continue
+        shown = 0
+        # With pruning, the largest child stays as the sibling the others differ from
+        reference = by_size[lo] if prune and below[ranked[lo]] > diff_threshold else -1
+        for j in range(lo, hi):
+            child = ranked[j]
+            if allowed is not None and child not in allowed:
+                continue
+            if (prune and below[child] <= diff_threshold) or (max_children is not None and shown >= max_children):
+                if allowed is None:
+                    # Ranked order: every remaining child is left out too
+                    break
+                continue
+            if child == reference:
+                reference = -1
+            shown += 1
+            if child not in depth:
+                depth[child] = d
+                queue.append(child)
+        if reference >= 0 and (allowed is None or reference in allowed) and reference not in depth:
+            depth[reference] = d
+            queue.append(reference)
+
+    # A child left out under one parent may be in the view through another,
+    # where it is drawn under both; only children missing from the view
+    # count as collapsed
+    collapsed = {}
+    for node in depth:
+        hidden = hidden_size = 0
+        for child in dict.fromkeys(graph.children(node)):
+            if child not in depth and (allowed is None or child in allowed):
+                hidden += 1
+                hidden_size += num_desc[child] + 1
+        if hidden:
+            collapsed[node] = (hidden, hidden_size)
+    return depth, collapsed
+
+
+def _scoped_desc_diffs(data, root, terms, allowed):
+    """{id: desc_diff} of ``terms`` against their parents below ``root`` (and in ``allowed``).
+
+    As the app computes it on the edges it keeps: each parent's
+    ``max_child_num_desc`` counts only its children in ``allowed``, and
+    terms without such a parent get -1.
+    """
+    graph = data.graph
+    num_desc = data.metrics['num_desc']
+    reaches = data.reachability().reaches
+    max_child = {}
+
+    def max_child_of(parent):
+        if parent not in max_child:
+            if allowed is None:
+                max_child[parent] = data.metrics['max_child_num_desc'][parent]
+            else:
+                max_child[parent] = max((num_desc[c] for c in graph.children(parent) if c in allowed),
+                                        default=0)
+        return max_child[parent]
+
+    diffs = {}
+    for node in terms:
+        best = -1
+        for parent in graph.parents(node):
+            if (allowed is None or parent in allowed) and reaches(root, parent):
+                diff = abs(num_desc[node] - max_child_of(parent))
+                if best < 0 or diff < best:
+                    best = diff
+        diffs[node] = best
+    return diffs
+
+
+def extract_view(data, root, max_depth=4, diff_threshold=100, highlight=None, allowed=None,
+                 prune=False, max_children=None, placeholders=True):
+    """Nodes and edges of the view below ``root`` (an id), as JSON-ready dicts.
+
+    Edges point from child to parent (``from``/``to``) as in the app.
+    ``highlight`` is an id to mark; ``allowed`` optionally restricts the
+    terms shown (the app's "filter by node").
+
+    With ``prune``, a child is shown only if its ``desc_diff`` or that of a
+    term below it exceeds ``diff_threshold``, plus the child with most
+    descendants as the sibling those differences are measured against.
+    ``max_children`` caps the children shown per term, keeping those with
+    the largest differences when pruning and the largest subtrees otherwise.
+    Children left out,
+    and the children of terms at ``max_depth``, become one placeholder
+    node per parent (``is_placeholder``) unless ``placeholders`` is False.
+    """
+    graph, metrics = data.graph, data.metrics
+    depth, collapsed = _expand(data, root, max_depth, diff_threshold, allowed, prune, max_children)
+    if not placeholders:
+        collapsed = {}
+    desc_diffs = _scoped_desc_diffs(data, root, depth, allowed)
+
+    parents_in_view = {i: [] for i in depth}
+    num_children_in_view = dict.fromkeys(depth, 0)
+    edges = []
+    for node in depth:
+        for parent in graph.parents(node):
+            if parent in depth:
+                parents_in_view[node].append(parent)
+                num_children_in_view[parent] += 1
+                edges.append({'from': graph.ids[node], 'to': graph.ids[parent]})
+    children_in_view = {i: [] for i in depth}
+    for node, parents in parents_in_view.items():
+        for parent in parents:
+            children_in_view[parent].append(node)
+
+    label = graph.label
+    sole_children = {kids[0] for p, kids in children_in_view.items()
+                     if len(kids) == 1 and p not in collapsed}
+    nodes = []
+    for node, d in depth.items():
+        parents, children = parents_in_view[node], children_in_view[node]
+        if not parents and not children and node not in collapsed:
+            # The app drops nodes without a drawn edge
+            continue
+        desc_diff = desc_diffs[node]
+        nodes.append({
+            'id': graph.ids[node],
+            'label': label(node),
+            'depth': d,
+            'num_desc': metrics['num_desc'][node],
+            'subtree_height': metrics['subtree_height'][node],
+            'desc_diff': desc_diff if desc_diff >= 0 else None,
+            'has_contrastive_sibling': desc_diff > diff_threshold,
+            'parents': ', '.join(label(p) for p in parents) or 'N/A',
+            'children': ', '.join(label(c) for c in children) or 'N/A',
+            'num_parents': len(parents),
+            'num_children': len(children),
+            'is_sole_child': node in sole_children,
+            'is_root': node == root,
+            'is_leaf': d == max_depth or metrics['subtree_height'][node] == 0,
+            'is_highlighted': node == highlight,
+            'is_placeholder': False,
+        })
+
+    for parent, (terms, size) in collapsed.items():
+        iri = graph.ids[parent]
+        nodes.append({
+            'id': f'{iri}#collapsed',
+            'label': f'{terms} more term{"s" if terms != 1 else ""}',
+            'depth': depth[parent] + 1,
+            'num_desc': size,
+            'subtree_height': max(metrics['subtree_height'][parent] - 1, 0),
+            'desc_diff': None,
+            'has_contrastive_sibling': False,
+            'parents': label(parent),
+            'children': 'N/A',
+            'num_parents': 1,
+            'num_children': 0,
+            'is_sole_child': False,
+            'is_root': False,
+            'is_leaf': True,
+            'is_highlighted': False,
+            'is_placeholder': True,
+            'collapsed_terms': terms,
+        })
+        edges.append({'from': f'{iri}#collapsed', 'to': iri})
+    return {'root': graph.ids[root], 'nodes': nodes, 'edges': edges}
+
+
+def depth_view(data, root, max_depth=4, diff_threshold=100, highlight=None, allowed=None):
+    """The app's view: every term within ``max_depth`` of ``root``, no placeholders."""
+    return extract_view(data, root, max_depth, diff_threshold, highlight, allowed, placeholders=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract a renderable view below a root term.")
+    parser.add_argument('release', help="obographs JSON release or subset (or .ivosnap)")
+    parser.add_argument('root', help="IRI, CURIE (HP:0000118) or label substring")
+    parser.add_argument('--max-depth', type=int, default=4)
+    parser.add_argument('--threshold', type=float, default=100, help="sibling granularity difference threshold")
+    parser.add_argument('--prune', action='store_true', help="show only children at or above the threshold")
+    parser.add_argument('--max-children', type=int, help="show at most this many children per term")
+    parser.add_argument('--out', help="write the view as JSON (default: print a summary)")
+    args = parser.parse_args()
+
+    data = ViewData(load_graph(args.release), search=load_search_index(args.release))
+    try:
+        root = data.resolve(args.root)
+    except KeyError:
+        print(f"No term matches {args.root!r}")
+        sys.exit(1)
+    data.ranking()
+    data.reachability()
+    start = time.perf_counter()
+    view = extract_view(data, root, args.max_depth, args.threshold,
+                        prune=args.prune, max_children=args.max_children)
+    elapsed = time.perf_counter() - start
+    placeholders = sum(n['is_placeholder'] for n in view['nodes'])
+    print(f"{len(view['nodes'])} nodes ({placeholders} placeholders), {len(view['edges'])} edges "
+          f"below {view['root']} in {elapsed * 1000:.1f} ms")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(view, f, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Streaming writer for obographs subsets.
+
+``GraphWriter`` emits ``{"graphs": [{"nodes": [...], "edges": [...]}]}``
+one record at a time, so a subset never has to be held in memory to be
+written. Output is compact by default; ``indent=2`` reproduces the bytes of
+``json.dump(data, f, indent=2, ensure_ascii=False)``. Files ending in .gz
+or .zst are compressed, and edges can be restricted to some predicates
+(e.g. is_a only) as they are written.
+"""
+import json
+import shutil
+import tempfile
+
+from hpo_stream import open_text
+
+# Edges wait here until the nodes array is closed; beyond this they spill to disk
+_EDGE_SPOOL_SIZE = 8 << 20
+
+
+class GraphWriter:
+    """Write one obographs graph incrementally. Use as a context manager."""
+
+    def __init__(self, filepath, indent=None, predicates=None):
+        self.filepath = filepath
+        self.indent = indent
+        self.predicates = None if predicates is None else frozenset(predicates)
+        self.num_nodes = 0
+        self.num_edges = 0
+        if indent is None:
+            self._separators = (',', ':')
+            self._item_prefix = ''
+            self._nested = None
+        else:
+            self._separators = (',', ': ')
+            self._item_prefix = '\n' + ' ' * (4 * indent)
+            self._nested = '\n' + ' ' * (4 * indent)
+        self._f = open_text(filepath, 'w')
+        self._edges = tempfile.SpooledTemporaryFile(_EDGE_SPOOL_SIZE, mode='w+', encoding='utf-8')
+        if indent is None:
+            self._f.write('{"graphs":[{"nodes":[')
+        else:
+            pad = ' ' * indent
+            self._f.write('{\n' + pad + '"graphs": [\n' + pad * 2 + '{\n' + pad * 3 + '"nodes": [')
+
+    def _encode(self, record):
+        text = json.dumps(record, ensure_ascii=False, indent=self.indent,
+                          separators=self._separators)
+        if self._nested is not None:
+            text = text.replace('\n', self._nested)
+        return self._item_prefix + text
+
+    def write_node(self, record):
+        self._f.write((',' if self.num_nodes else '') + self._encode(record))
+        self.num_nodes += 1
+
+    def write_edge(self, record):
+        """Queue an edge; returns False if its predicate is filtered out."""
+        if self.predicates is not None and record.get('pred') not in self.predicates:
+            return False
+        self._edges.write((',' if self.num_edges else '') + self._encode(record))
+        self.num_edges += 1
+        return True
+
+    def close(self):
+        if self._f is None:
+            return
+        f = self._f
+        if self.indent is None:
+            f.write('],"edges":[')
+        else:
+            pad = ' ' * self.indent
+            end = '\n' + pad * 3 if self.num_nodes else ''
+            f.write(end + '],\n' + pad * 3 + '"edges": [')
+        self._edges.seek(0)
+        shutil.copyfileobj(self._edges, f)
+        self._edges.close()
+        if self.indent is None:
+            f.write(']}]}')
+        else:
+            pad = ' ' * self.indent
+            end = '\n' + pad * 3 if self.num_edges else ''
+            f.write(end + ']\n' + pad * 2 + '}\n' + pad + ']\n}')
+        f.close()
+        self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,287 @@
+"""Release-diff evaluation pipeline: compare -> summarize -> find_parents ->
+parent analysis -> flags, plus depth statistics, in one process.
+
+Replaces running 2.compare_jsons.py to 6.calculate_avg.py by hand. Every
+stage's output is cached on disk under a key derived from the content hash
+of the release files, the root, the stage's parameters and the keys of the
+stages it depends on, so rerunning with a different threshold recomputes
+only the flagging stage. The cache (hpo_cache.ArtifactCache) is bounded
+by --cache-max-mb, least recently used entries going first, and can be
+shared by pipelines running at the same time.
+
+Usage: python ivo_pipeline.py old.json new.json root_node_id [--out-dir DIR]
+           [--max-parent-children N] [--min-desc-diff N] [--cache-dir DIR]
+           [--sweep-children N ...] [--sweep-desc-diff N ...] [--cache-max-mb N] [--top-k N]
+"""
+import argparse
+import csv
+import os
+
+import hpo_anomaly
+import hpo_cache
+import hpo_flags
+import hpo_metrics
+import hpo_parents
+import hpo_stats
+from hpo_graph import OntologyGraph
+from hpo_profile import stage
+from subset_selection import SUBSET_VERSION, read_subset
+
+DEFAULT_CACHE_DIR = hpo_cache.DEFAULT_CACHE_DIR
+
+# Bump a stage's version when its output format or logic changes
+STAGE_VERSIONS = {
+    'subset': SUBSET_VERSION,
+    'compare': 1,
+    'summarize': 1,
+    'find_parents': 1,
+    'parent_analysis': 2,
+    'flags': 1,
+    'sweep': 1,
+    'depth_stats': 1,
+    'anomalies': 1,
+}
+
+FLAG_FIELDS = ['Node_ID', 'Node_Label', 'Parent_Children_Count (min)',
+               'Parent_Max_Desc_Diff', 'Flag_Parent_Children', 'Flag_Desc_Diff']
+
+
+def stage_key(name, *parts):
+    """Cache key of a stage from its version, parameters and upstream keys."""
+    return hpo_cache.artifact_key(name, STAGE_VERSIONS[name], *parts)
+
+
+def flag_nodes(analysis_rows, max_parent_children=1, min_desc_diff=100):
+    """Apply the two flagging methods to parent-analysis rows.
+
+    A term is flagged when a parent it shares with the old release had at
+    most ``max_parent_children`` children there, or when that parent's
+    Max_Num_Descendant_Diff is at least ``min_desc_diff``.
+    """
+    by_children = hpo_flags.parent_children_rule(max_parent_children)
+    by_diff = hpo_flags.desc_diff_rule(min_desc_diff)
+    flags = []
+    for row in analysis_rows:
+        flags.append({
+            'Node_ID': row['Node_ID'],
+            'Node_Label': row['Node_Label'],
+            'Parent_Children_Count (min)': row['Parent_Children_Count (min)'],
+            'Parent_Max_Desc_Diff': row['Parent_Max_Desc_Diff'],
+            'Flag_Parent_Children': by_children(row),
+            'Flag_Desc_Diff': by_diff(row),
+        })
+    return flags
+
+
+def write_csv(path, fieldnames, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class Pipeline:
+    """Cached, lazily evaluated release-diff pipeline for one root."""
+
+    def __init__(self, old_release, new_release, root_id,
+                 max_parent_children=1, min_desc_diff=100,
+                 cache_dir=DEFAULT_CACHE_DIR, sweep_grid=None,
+                 max_cache_bytes=hpo_cache.DEFAULT_MAX_BYTES, top_k=None):
+        self.old_release = old_release
+        self.new_release = new_release
+        self.root_id = root_id
+        self.max_parent_children = max_parent_children
+        self.min_desc_diff = min_desc_diff
+        self.cache_dir = cache_dir
+        self.cache = hpo_cache.ArtifactCache(cache_dir, max_cache_bytes)
+        self.sweep_grid = sweep_grid  # (max_parent_children values, min_desc_diff values)
+        self.top_k = top_k
+        self.computed = []
+        self._results = {}
+        self._keys = {}
+
+    def _cached(self, name, key, compute):
+        """Return a stage output from memory, the disk cache, or ``compute()``."""
+        if key in self._results:
+            return self._results[key]
+        with stage(f'pipeline.{name}') as s:
+            result, computed = self.cache.get_or_compute(key, compute)
+            s.count(cached=int(not computed))
+        if computed:
+            self.computed.append(name)
+        self._results[key] = result
+        return result
+
+    def key(self, name):
+        """Cache key of a stage, derived without running anything."""
+        if name in self._keys:
+            return self._keys[name]
+        if name == 'subset_old':
+            key = stage_key('subset', self.cache.file_hash(self.old_release), self.root_id)
+        elif name == 'subset_new':
+            key = stage_key('subset', self.cache.file_hash(self.new_release), self.root_id)
+        elif name == 'compare':
+            key = stage_key('compare', self.key('subset_old'), self.key('subset_new'))
+        elif name == 'summarize':
+            key = stage_key('summarize', self.key('subset_old'))
+        elif name == 'find_parents':
+            key = stage_key('find_parents', self.key('subset_new'), self.key('compare'))
+        elif name == 'parent_analysis':
+            key = stage_key('parent_analysis', self.key('find_parents'), self.key('summarize'))
+        elif name == 'flags':
+            key = stage_key('flags', self.key('parent_analysis'),
+                            self.max_parent_children, self.min_desc_diff)
+        elif name == 'sweep':
+            key = stage_key('sweep', self.key('parent_analysis'), self.sweep_grid)
+        elif name == 'depth_stats':
+            key = stage_key('depth_stats', self.key('summarize'))
+        elif name == 'anomalies':
+            key = stage_key('anomalies', self.key('subset_new'), self.top_k)
+        else:
+            raise KeyError(name)
+        self._keys[name] = key
+        return key
+
+    def subset(self, which):
+        release = self.old_release if which == 'old' else self.new_release
+        return self._cached('subset', self.key(f'subset_{which}'),
+                            lambda: read_subset(release, self.root_id))
+
+    def subset_graph(self, which):
+        subset = self.subset(which)
+        return OntologyGraph.from_records(subset['nodes'], subset['edges'])
+
+    def compare(self):
+        def compute():
+            old_ids = {n['id'] for n in self.subset('old')['nodes']}
+            new_ids = {n['id'] for n in self.subset('new')['nodes']}
+            return {'only_in_old': sorted(old_ids - new_ids),
+                    'only_in_new': sorted(new_ids - old_ids)}
+        return self._cached('compare', self.key('compare'), compute)
+
+    def summarize(self):
+        return self._cached('summarize', self.key('summarize'),
+                            lambda: hpo_metrics.hierarchy_rows(self.subset_graph('old')))
+
+    def find_parents(self):
+        return self._cached('find_parents', self.key('find_parents'),
+                            lambda: hpo_parents.parent_sibling_rows(
+                                self.subset_graph('new'), self.compare()['only_in_new']))
+
+    def parent_analysis(self):
+        return self._cached('parent_analysis', self.key('parent_analysis'),
+                            lambda: hpo_parents.old_parent_analysis(
+                                self.find_parents(), self.summarize()))
+
+    def flags(self):
+        return self._cached('flags', self.key('flags'),
+                            lambda: flag_nodes(self.parent_analysis(),
+                                               self.max_parent_children, self.min_desc_diff))
+
+    def sweep(self):
+        """Flag counts over the threshold grid, from the one cached join."""
+        return self._cached('sweep', self.key('sweep'),
+                            lambda: hpo_flags.sweep(self.parent_analysis(), *self.sweep_grid))
+
+    def depth_stats(self):
+        return self._cached('depth_stats', self.key('depth_stats'),
+                            lambda: hpo_stats.statistics_by_depth(self.summarize()))
+
+    def anomalies(self):
+        """The new subset's top_k most anomalous terms per branch (hpo_anomaly.py)."""
+        return self._cached('anomalies', self.key('anomalies'),
+                            lambda: hpo_anomaly.AnomalyScores(self.subset_graph('new')).rows(self.top_k))
+
+    def run(self):
+        """Evaluate every stage and return their outputs by name."""
+        results = {
+            'compare': self.compare(),
+            'summarize': self.summarize(),
+            'find_parents': self.find_parents(),
+            'parent_analysis': self.parent_analysis(),
+            'flags': self.flags(),
+            'depth_stats': self.depth_stats(),
+        }
+        if self.sweep_grid:
+            results['sweep'] = self.sweep()
+        if self.top_k:
+            results['anomalies'] = self.anomalies()
+        return results
+
+    def write_outputs(self, out_dir):
+        """Write the files the individual scripts used to produce."""
+        os.makedirs(out_dir, exist_ok=True)
+        results = self.run()
+        old_base = os.path.splitext(os.path.basename(self.old_release))[0]
+        new_base = os.path.splitext(os.path.basename(self.new_release))[0]
+
+        for base, ids in ((old_base, results['compare']['only_in_old']),
+                          (new_base, results['compare']['only_in_new'])):
+            with open(os.path.join(out_dir, f'only_in_{base}.txt'), 'w', encoding='utf-8') as f:
+                f.write(','.join(ids))
+        write_csv(os.path.join(out_dir, f'hpo_{old_base}-hierarchy.csv'),
+                  hpo_metrics.HIERARCHY_FIELDS, results['summarize'])
+        write_csv(os.path.join(out_dir, f'parent_output-{new_base}.csv'),
+                  hpo_parents.PARENT_FIELDS, results['find_parents'])
+        write_csv(os.path.join(out_dir, 'node_parent_analysis.csv'),
+                  hpo_parents.ANALYSIS_FIELDS, results['parent_analysis'])
+        write_csv(os.path.join(out_dir, 'node_flags.csv'), FLAG_FIELDS, results['flags'])
+        write_csv(os.path.join(out_dir, 'statistics_by_depth.csv'),
+                  hpo_stats.stats_fieldnames(), results['depth_stats'])
+        if 'sweep' in results:
+            write_csv(os.path.join(out_dir, 'threshold_sweep.csv'), hpo_flags.SWEEP_FIELDS, results['sweep'])
+        if 'anomalies' in results:
+            write_csv(os.path.join(out_dir, 'anomalies.csv'), hpo_anomaly.ANOMALY_FIELDS, results['anomalies'])
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the IVO release-diff evaluation in one pass.")
+    parser.add_argument('old_release', help="older HPO release (JSON)")
+    parser.add_argument('new_release', help="newer HPO release (JSON)")
+    parser.add_argument('root_id', help="IRI of the subset root, e.g. http://purl.obolibrary.org/obo/HP_0000118")
+    parser.add_argument('--out-dir', default='ivo_output', help="directory for the output files")
+    parser.add_argument('--max-parent-children', type=int, default=1,
+                        help="flag terms whose old parent had at most this many children")
+    parser.add_argument('--min-desc-diff', type=int, default=100,
+                        help="flag terms whose old parent's Max_Num_Descendant_Diff is at least this")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="stage output cache directory")
+    parser.add_argument('--cache-max-mb', type=float, default=hpo_cache.DEFAULT_MAX_BYTES / 1024 ** 2,
+                        help="evict least recently used cache entries beyond this size")
+    parser.add_argument('--sweep-children', nargs='+', type=int, metavar='N',
+                        help="also count flags for each of these --max-parent-children values")
+    parser.add_argument('--sweep-desc-diff', nargs='+', type=int, metavar='N',
+                        help="also count flags for each of these --min-desc-diff values")
+    parser.add_argument('--top-k', type=int, metavar='N',
+                        help="also rank the N most anomalous terms of each branch of the new subset")
+    args = parser.parse_args()
+    if args.top_k is not None and args.top_k < 1:
+        parser.error("--top-k must be at least 1")
+
+    sweep_grid = None
+    if args.sweep_children or args.sweep_desc_diff:
+        sweep_grid = (args.sweep_children or [args.max_parent_children],
+                      args.sweep_desc_diff or [args.min_desc_diff])
+    pipeline = Pipeline(args.old_release, args.new_release, args.root_id,
+                        args.max_parent_children, args.min_desc_diff, args.cache_dir, sweep_grid,
+                        int(args.cache_max_mb * 1024 ** 2), args.top_k)
+    results = pipeline.write_outputs(args.out_dir)
+
+    flags = results['flags']
+    print(f"Only in old release: {len(results['compare']['only_in_old'])}")
+    print(f"Only in new release: {len(results['compare']['only_in_new'])}")
+    print(f"Flagged by parent child count (<= {args.max_parent_children}): "
+          f"{sum(f['Flag_Parent_Children'] for f in flags)}")
+    print(f"Flagged by parent descendant diff (>= {args.min_desc_diff}): "
+          f"{sum(f['Flag_Desc_Diff'] for f in flags)}")
+    if 'sweep' in results:
+        print(f"Threshold sweep over {len(results['sweep'])} combinations written to threshold_sweep.csv")
+    if 'anomalies' in results:
+        print(f"Top {args.top_k} anomalous terms per branch ({len(results['anomalies'])} rows) "
+              f"written to anomalies.csv")
+    print(f"Stages recomputed: {', '.join(pipeline.computed) or 'none (all cached)'}")
+    print(f"Results written to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,332 @@
 #!/usr/bin/env python3
-import json
-import sys
-from collections import defaultdict, deque
+import argparse
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from hpo_cache import DEFAULT_CACHE_DIR, ArtifactCache, artifact_key
+from hpo_graph import GraphBuilder, OntologyGraph, load_graph
+from hpo_metrics import NODE_METRIC_FIELDS, node_metrics_rows
+from hpo_profile import stage
+from hpo_reach import ReachabilityIndex
+from hpo_snapshot import SNAPSHOT_SUFFIX
+from hpo_stream import iter_graph_records, open_text
+from hpo_writer import GraphWriter
+
+PHENOTYPIC_ABNORMALITY = "http://purl.obolibrary.org/obo/HP_0000118"
+
+# Bump when filter_descendants/read_subset output changes, to invalidate cached subsets
+SUBSET_VERSION = 1
 
 def filter_descendants(graph, root_id):
     """Return subgraph with root_id and all its descendants (following obj→sub)."""
     edges = graph.get("edges", [])
     nodes = graph.get("nodes", [])
 
-    # Build adjacency list: parent (obj) -> list of children (sub)
-    children = defaultdict(list)
-    for e in edges:
-        parent = e.get("obj")
-        child = e.get("sub")
-        if parent and child:
-            children[parent].append(child)
+    # Interned graph over every edge type: parent (obj) -> children (sub)
+    ontology = OntologyGraph.from_records(nodes, edges, predicates=None)
 
     # BFS to find all descendants of root
-    reachable = set()
-    queue = deque([root_id])
-    while queue:
-        node = queue.popleft()
-        if node in reachable:
-            continue
-        reachable.add(node)
-        queue.extend(children[node])
+    root = ontology.index_of(root_id)
+    if root is None:
+        return {"nodes": [], "edges": []}
+    reachable = ontology.descendants([root])
+
+    def keep(iri):
+        i = ontology.index_of(iri)
+        return i is not None and reachable[i]
 
     # Filter nodes and edges
-    filtered_nodes = [n for n in nodes if n.get("id") in reachable]
+    filtered_nodes = [n for n in nodes if keep(n.get("id"))]
     filtered_edges = [
         e for e in edges
-        if e.get("sub") in reachable and e.get("obj") in reachable
+        if keep(e.get("sub")) and keep(e.get("obj"))
     ]
 
     return {"nodes": filtered_nodes, "edges": filtered_edges}
 
 
-def main(input_file, output_file, root_id):
-    # Load JSON
-    with open(input_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def read_subset(input_file, root_id, predicates=None, full=False):
+    """Stream a release and keep the id/label/edge records below ``root_id``.
+
+    Descendants follow every edge type; ``predicates`` only limits the edges kept.
+    The release is read twice, once into the interned graph and once to keep
+    the subset's records (all of their fields with ``full``), so only the
+    subset is ever held as records.
+    """
+    with stage("subset.load"):
+        ontology = load_graph(input_file, predicates=None)
+    root = ontology.index_of(root_id)
+    if root is None:
+        return {"nodes": [], "edges": []}
+    reachable = ontology.descendants([root])
+
+    def keep(iri):
+        i = ontology.index_of(iri)
+        return i is not None and reachable[i]
+
+    nodes, edges = [], []
+    with stage("subset.collect"):
+        for kind, record in iter_graph_records(input_file, full=full):
+            if kind == "node":
+                if keep(record.get("id")):
+                    nodes.append(record)
+            elif (keep(record.get("sub")) and keep(record.get("obj"))
+                  and (predicates is None or record.get("pred") in predicates)):
+                edges.append(record)
+    return {"nodes": nodes, "edges": edges}
+
+
+COMPRESS_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def metrics_path_for(output_file):
+    """Sidecar path for a subset file: name.json[.gz|.zst] -> name.metrics.csv."""
+    for suffix in COMPRESS_SUFFIXES.values():
+        if output_file.endswith(suffix):
+            output_file = output_file[:-len(suffix)]
+    return os.path.splitext(output_file)[0] + ".metrics.csv"
+
+
+def subset_filename(label):
+    """File name for a root's subset in batch mode, e.g. 'Abnormality of the skeletal system.json'."""
+    name = re.sub(r'[\\/:*?"<>|]', '_', label).strip() or 'subset'
+    return name + ".json"
+
+
+def child_roots(ontology, parent_id=PHENOTYPIC_ABNORMALITY):
+    """IRIs of the direct children of ``parent_id`` (the organ-system roots by default)."""
+    parent = ontology.index_of(parent_id)
+    if parent is None:
+        return []
+    return [ontology.ids[c] for c in dict.fromkeys(ontology.children(parent))]
+
+
+class SubsetCollector:
+    """Keeps a subset's records in memory."""
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+
+    def add_node(self, record):
+        self.nodes.append(record)
+
+    def add_edge(self, record):
+        self.edges.append(record)
+
+
+class SubsetFile:
+    """Streams a subset to disk as it is read, interning it for the metrics sidecar."""
+
+    def __init__(self, output_file, indent=2, predicates=None):
+        self.output_file = output_file
+        self.writer = GraphWriter(output_file, indent, predicates)
+        self.builder = GraphBuilder(predicates)
+
+    def add_node(self, record):
+        self.writer.write_node(record)
+        self.builder.add_node(record)
+
+    def add_edge(self, record):
+        if self.writer.write_edge(record):
+            self.builder.add_edge(record)
+
+    def close(self, pool=None):
+        """Finish the JSON file and write the per-node metrics sidecar next to it.
 
-    # Expect structure like {"graphs": [ {...} ]}
-    graph = data["graphs"][0]
-    filtered_graph = filter_descendants(graph, root_id)
+        With a process ``pool`` the sidecar is computed there and a future
+        of its path is returned instead of the path.
+        """
+        with stage("subset.write_json", nodes=self.writer.num_nodes, edges=self.writer.num_edges):
+            self.writer.close()
+        metrics_file = metrics_path_for(self.output_file)
+        graph = self.builder.build()
+        if pool is not None:
+            return pool.submit(write_metrics_file, graph, metrics_file)
+        with stage("subset.write_metrics", nodes=self.writer.num_nodes):
+            return write_metrics_file(graph, metrics_file)
 
-    # Replace and write output
-    data["graphs"][0] = filtered_graph
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
 
+def write_metrics_file(graph, metrics_file):
+    """Write the per-node metrics sidecar of an interned subset graph."""
+    with open(metrics_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=NODE_METRIC_FIELDS)
+        writer.writeheader()
+        writer.writerows(node_metrics_rows(graph))
+    return metrics_file
+
+
+def dispatch_subsets(input_file, root_ids, sinks, ontology=None):
+    """Feed the subset below each root to its sink from one read of the full records.
+
+    Descendant sets come from one reachability index over the release, whose
+    interval lists are built bottom-up, so a root nested under another root
+    reuses the closure already computed for it rather than walking it again.
+    """
+    if ontology is None:
+        with stage("subset.load"):
+            ontology = load_graph(input_file, predicates=None)
+    with stage("subset.reach_index", terms=len(ontology)):
+        reach = ReachabilityIndex(ontology)
+
+    # Subsets each term belongs to
+    with stage("subset.membership", subsets=len(root_ids)):
+        membership = [()] * len(ontology)
+        for k, root_id in enumerate(root_ids):
+            root = ontology.index_of(root_id)
+            if root is None:
+                continue
+            for i in reach.descendant_ids(root):
+                membership[i] += (k,)
+
+    def member_of(iri):
+        i = ontology.index_of(iri)
+        return membership[i] if i is not None else ()
+
+    # Single pass over the full records (meta, xrefs, synonyms), dispatched to every subset
+    with stage("subset.dispatch") as s:
+        records = 0
+        for kind, record in iter_graph_records(input_file, full=True):
+            records += 1
+            if kind == "node":
+                for k in member_of(record.get("id")):
+                    sinks[k].add_node(record)
+            else:
+                sub = member_of(record.get("sub"))
+                if sub:
+                    obj = member_of(record.get("obj"))
+                    for k in sub:
+                        if k in obj:
+                            sinks[k].add_edge(record)
+        s.count(records=records)
+
+
+def extract_subsets(input_file, root_ids, ontology=None):
+    """Return one {"nodes": [...], "edges": [...]} dict per root, in order.
+
+    Records shared by several subsets are the same objects.
+    """
+    collectors = [SubsetCollector() for _ in root_ids]
+    dispatch_subsets(input_file, root_ids, collectors, ontology)
+    return [{"nodes": c.nodes, "edges": c.edges} for c in collectors]
+
+
+def with_compression(path, compress):
+    suffix = COMPRESS_SUFFIXES[compress] if compress else ""
+    return path if path.endswith(suffix) else path + suffix
+
+
+def write_subset(input_file, output_file, root_id, indent=2, predicates=None):
+    """Write the subset below ``root_id`` and its metrics sidecar; returns the sidecar path."""
+    subset = SubsetFile(output_file, indent, predicates)
+    dispatch_subsets(input_file, [root_id], [subset])
+    return subset.close()
+
+
+def write_cached_subset(input_file, output_file, root_id, indent=2, predicates=None, cache=None):
+    """``write_subset`` memoized on the release contents, root, predicate filter and indent.
+
+    The cache keeps the uncompressed JSON text and the sidecar, so a hit
+    only writes them out (compressed by ``output_file``'s suffix).
+    """
+    cache = cache or ArtifactCache()
+    metrics_file = metrics_path_for(output_file)
+    params = [root_id, sorted(predicates) if predicates is not None else None, indent]
+    key = artifact_key("subset_files", SUBSET_VERSION, [cache.file_hash(input_file)], params)
+
+    def compute():
+        write_subset(input_file, output_file, root_id, indent, predicates)
+        with open_text(output_file) as f:
+            text = f.read()
+        with open(metrics_file, "r", newline="", encoding="utf-8") as f:
+            return text, f.read()
+
+    (text, metrics), computed = cache.get_or_compute(key, compute)
+    if not computed:
+        with stage("subset.write_cached", bytes=len(text)):
+            with open_text(output_file, "w") as f:
+                f.write(text)
+            with open(metrics_file, "w", newline="", encoding="utf-8") as f:
+                f.write(metrics)
+    return metrics_file
+
+
+def main(input_file, output_file, root_id, indent=2, predicates=None, cache=None):
+    if cache is None:
+        metrics_file = write_subset(input_file, output_file, root_id, indent, predicates)
+    else:
+        metrics_file = write_cached_subset(input_file, output_file, root_id, indent, predicates, cache)
     print(f"Filtered graph written to {output_file}")
+    print(f"Node metrics written to {metrics_file}")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python subset_selection.py input.json output.json root_node_id")
-        sys.exit(1)
+def batch_main(input_file, output_dir, root_ids, indent=2, predicates=None, compress=None,
+               workers=None):
+    with stage("subset.load"):
+        ontology = load_graph(input_file, predicates=None)
+    if not root_ids:
+        root_ids = child_roots(ontology)
+        print(f"Extracting the {len(root_ids)} children of {PHENOTYPIC_ABNORMALITY}")
+
+    names = []
+    for root_id in root_ids:
+        local_id = root_id.rsplit("/", 1)[-1]
+        name = subset_filename(ontology.label_of(root_id) or local_id)
+        if name in names:
+            name = subset_filename(f"{name[:-len('.json')]} {local_id}")
+        names.append(name)
+
+    # Every subset file is open at once and written as the release is read
+    os.makedirs(output_dir, exist_ok=True)
+    subsets = [SubsetFile(with_compression(os.path.join(output_dir, name), compress), indent, predicates)
+               for name in names]
+    dispatch_subsets(input_file, root_ids, subsets, ontology)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for subset in subsets:
+            subset.close()
+            print(f"{subset.writer.num_nodes} nodes written to {subset.output_file}")
+        return
+    # The metrics sidecars are CPU-bound, so they are computed in worker
+    # processes while the remaining JSON files are finished here
+    with stage("subset.write_metrics", subsets=len(subsets)):
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [subset.close(pool) for subset in subsets]
+            for subset, future in zip(subsets, futures):
+                future.result()
+                print(f"{subset.writer.num_nodes} nodes written to {subset.output_file}")
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filter an HPO release to the subset(s) below root node(s).")
+    parser.add_argument("input_file", help="HPO release (JSON, optionally .gz/.zst)")
+    parser.add_argument("output", help="output JSON file, or output directory with --batch")
     # root_id should be in double quotations
-    input_file, output_file, root_id = sys.argv[1], sys.argv[2], sys.argv[3]
-    main(input_file, output_file, root_id)
+    parser.add_argument("root_ids", nargs="*", metavar="root_node_id")
+    parser.add_argument("--batch", action="store_true",
+                        help="extract every root_node_id (default: children of HP_0000118) into the output directory")
+    parser.add_argument("--compact", action="store_true", help="write compact JSON instead of indented")
+    parser.add_argument("--compress", choices=sorted(COMPRESS_SUFFIXES), help="compress the output files")
+    parser.add_argument("--predicates", nargs="+", metavar="PRED",
+                        help="keep only these edge types, e.g. --predicates is_a (default: all)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes computing the metrics sidecars with --batch (default: one per core)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="artifact cache reused for single-root subsets of an unchanged release")
+    parser.add_argument("--no-cache", action="store_true", help="always read the release")
+    args = parser.parse_args()
+    indent = None if args.compact else 2
+
+    if args.input_file.endswith(SNAPSHOT_SUFFIX):
+        # Subsets copy every edge type and the full records, which snapshots do not keep
+        parser.error(f"{args.input_file} is a snapshot; pass the JSON release it was compiled from")
+    if args.batch:
+        batch_main(args.input_file, args.output, args.root_ids, indent, args.predicates, args.compress,
+                   args.workers)
+    else:
+        if len(args.root_ids) != 1:
+            parser.error("exactly one root_node_id is required without --batch")
+        main(args.input_file, with_compression(args.output, args.compress), args.root_ids[0],
+             indent, args.predicates, None if args.no_cache else ArtifactCache(args.cache_dir))
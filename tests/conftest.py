@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hpo_graph import OntologyGraph
+
+PREFIX = 'http://purl.obolibrary.org/obo/HP_'
+
+
+@pytest.fixture
+def cycle_graph():
+    """A <- B <-> C <- D: B and C form a cycle and D lies below it."""
+    nodes = [{'id': PREFIX + t, 'lbl': t} for t in 'ABCD']
+    edges = [{'sub': PREFIX + sub, 'pred': 'is_a', 'obj': PREFIX + obj}
+             for sub, obj in [('B', 'A'), ('C', 'B'), ('B', 'C'), ('D', 'C')]]
+    return OntologyGraph.from_records(nodes, edges)
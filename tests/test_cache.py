@@ -0,0 +1,60 @@
+"""hpo_cache: bad entries, lock files, threads and the size bound."""
+import os
+import threading
+import time
+
+from hpo_cache import ArtifactCache
+
+
+def lock_files(directory):
+    return [name for _, _, names in os.walk(os.path.join(directory, 'locks'))
+            for name in names if name != 'evict.lock']
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    cache.put('ab' * 32, [1, 2, 3])
+    path = cache._path('ab' * 32)
+    with open(path, 'r+b') as f:
+        f.truncate(5)
+    assert cache.get('ab' * 32, 'missing') == 'missing'
+    assert not os.path.exists(path)
+    assert cache.get_or_compute('ab' * 32, lambda: 'recomputed') == ('recomputed', True)
+
+
+def test_evict_removes_lock_files(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    for k in range(5):
+        cache.get_or_compute(f'{k:02d}' * 32, lambda: k)
+    assert len(lock_files(cache.directory)) == 5
+    cache.clear()
+    assert cache.entries() == [] and lock_files(cache.directory) == []
+
+
+def test_threads_compute_once(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('cd' * 32, compute)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(computed for _, computed in results) == [False, False, False, True]
+
+
+def test_size_bound(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=3000)
+    for k in range(10):
+        cache.put(f'{k:02d}' * 32, bytes(1000))
+        time.sleep(0.01)
+    assert sum(size for _, size, _ in cache.entries()) <= 3000
+    assert cache.get('09' * 32) == bytes(1000)
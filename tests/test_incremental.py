@@ -0,0 +1,48 @@
+"""hpo_incremental's update against a full recompute, on synthetic release pairs."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import hpo_metrics
+from hpo_diff import ReleaseSet
+from hpo_graph import load_graph
+from hpo_incremental import fits_previous, update_hierarchy_rows
+from synthetic import write_release_pair
+
+
+@pytest.fixture(scope='module')
+def releases(tmp_path_factory):
+    old_path, new_path = write_release_pair(3000, str(tmp_path_factory.mktemp('releases')))
+    release_set = ReleaseSet.load([old_path, new_path], workers=1)
+    old_name, new_name = release_set.order
+    return {
+        'old': (load_graph(old_path), release_set.diff(new_name, old_name)),
+        'new': (load_graph(new_path), release_set.diff(old_name, new_name)),
+    }
+
+
+@pytest.mark.parametrize('previous, current', [('old', 'new'), ('new', 'old')])
+def test_update_matches_full_recompute(releases, previous, current):
+    previous_graph, _ = releases[previous]
+    graph, delta = releases[current]
+    assert delta['edges_added'] and delta['edges_removed']
+    previous_rows = hpo_metrics.hierarchy_rows(previous_graph)
+    assert fits_previous(graph, previous_rows, delta)
+    assert update_hierarchy_rows(graph, previous_rows, delta) == hpo_metrics.hierarchy_rows(graph)
+
+
+def test_mismatched_delta_is_reported(releases):
+    old_graph, _ = releases['old']
+    new_graph, delta = releases['new']
+    with pytest.raises(ValueError, match="delta adds an edge"):
+        update_hierarchy_rows(old_graph, hpo_metrics.hierarchy_rows(new_graph), delta)
+
+
+def test_previous_rows_of_another_release_do_not_fit(releases):
+    new_graph, delta = releases['new']
+    assert not fits_previous(new_graph, hpo_metrics.hierarchy_rows(new_graph), delta)
@@ -0,0 +1,16 @@
+"""hpo_metrics branches and anomaly ranking on a release with a cycle."""
+from conftest import PREFIX
+from hpo_anomaly import AnomalyScores
+from hpo_metrics import branches
+
+
+def test_branches_through_a_cycle(cycle_graph):
+    a, b, c, d = (cycle_graph.index_of(PREFIX + t) for t in 'ABCD')
+    found = branches(cycle_graph)
+    assert found[a] == (a,)
+    assert found[b] == found[c] == found[d] == (b,)
+
+
+def test_anomalies_keep_terms_below_a_cycle(cycle_graph):
+    scores = AnomalyScores(cycle_graph)
+    assert {cycle_graph.ids[i] for i in scores.terms} == {PREFIX + t for t in 'ABCD'}
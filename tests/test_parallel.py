@@ -0,0 +1,48 @@
+"""hpo_parallel's branch partitioning against the single-process metrics."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'benchmarks'))
+
+import hpo_metrics
+from hpo_graph import load_graph
+from hpo_parallel import parallel_metrics, partition
+from synthetic import write_release_pair
+
+
+@pytest.fixture(scope='module')
+def graph(tmp_path_factory):
+    _, new_path = write_release_pair(3000, str(tmp_path_factory.mktemp('releases')))
+    return load_graph(new_path)
+
+
+def serial_metrics(graph):
+    metrics = {'depth': hpo_metrics.depths(graph),
+               'num_descendants': hpo_metrics.descendant_counts(graph)}
+    metrics['max_descendant_diff'] = hpo_metrics.max_descendant_diffs(
+        graph, metrics['num_descendants'])
+    metrics['subtree_height'], metrics['num_desc'] = hpo_metrics.subtree_heights(graph)
+    return metrics
+
+
+def test_partition_covers_every_term(graph):
+    tops, upper = partition(graph, 3)
+    assert len(tops) == 3 and upper
+    covered = graph.descendants([t for part in tops for t in part])
+    assert all(covered[i] or i in upper for i in range(len(graph)))
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_parallel_matches_serial(graph, workers):
+    expected = serial_metrics(graph)
+    metrics = parallel_metrics(graph, workers)
+    assert {k: list(v) for k, v in metrics.items()} == {k: list(v) for k, v in expected.items()}
+
+
+def test_cycle_matches_serial(cycle_graph):
+    expected = serial_metrics(cycle_graph)
+    metrics = parallel_metrics(cycle_graph, 2)
+    assert {k: list(v) for k, v in metrics.items()} == {k: list(v) for k, v in expected.items()}
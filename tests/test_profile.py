@@ -0,0 +1,26 @@
+"""hpo_profile's per-stage memory peaks."""
+import pytest
+
+import hpo_profile
+from hpo_profile import Recorder, Stage
+
+
+def allocate(mb):
+    block = bytearray(mb * 1024 * 1024)
+    block[::4096] = b'x' * len(block[::4096])
+    return block
+
+
+def test_stage_peaks_are_per_stage():
+    recorder = Recorder()
+    if not recorder._resettable or not hpo_profile._reset_peak_rss():
+        pytest.skip("RSS high-water mark cannot be reset here")
+    with Stage(recorder, 'outer', {}):
+        with Stage(recorder, 'big', {}):
+            del_me = allocate(100)
+            del del_me
+        with Stage(recorder, 'small', {}):
+            pass
+    peaks = {r['stage']: r['peak_rss_mb'] - r['rss_start_mb'] for r in recorder.records}
+    assert peaks['big'] >= 90 and peaks['outer'] >= 90
+    assert peaks['small'] < 50
@@ -0,0 +1,12 @@
+"""hpo_similarity on a release with a cycle."""
+from conftest import PREFIX
+from hpo_similarity import Similarity
+
+
+def test_terms_below_a_cycle(cycle_graph):
+    sim = Similarity(cycle_graph)
+    a, b, c, d = (cycle_graph.index_of(PREFIX + t) for t in 'ABCD')
+    assert sim.ancestors[d] == {sim.rank[i] for i in (a, b, c, d)}
+    assert sim.ancestors[b] == sim.ancestors[c] == {sim.rank[i] for i in (a, b, c)}
+    assert sim.jaccard_ids(d, c) == 3 / 4
+    assert sim.resnik_ids(d, a) == sim.ic[a]
@@ -0,0 +1,30 @@
+"""Snapshots refuse the uses they cannot serve."""
+import pytest
+
+from conftest import PREFIX
+from hpo_graph import load_graph
+from hpo_snapshot import compile_snapshot
+from hpo_stream import iter_graph_records
+from hpo_writer import GraphWriter
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    release = str(tmp_path / 'release.json')
+    with GraphWriter(release) as writer:
+        for t in 'AB':
+            writer.write_node({'id': PREFIX + t, 'lbl': t, 'type': 'CLASS'})
+        writer.write_edge({'sub': PREFIX + 'B', 'pred': 'is_a', 'obj': PREFIX + 'A'})
+    return compile_snapshot(release)
+
+
+def test_snapshot_serves_its_predicates(snapshot):
+    graph = load_graph(snapshot)
+    assert graph.ids[graph.roots()[0]] == PREFIX + 'A'
+    with pytest.raises(ValueError, match="holds is_a edges"):
+        load_graph(snapshot, predicates=None)
+
+
+def test_snapshot_has_no_records(snapshot):
+    with pytest.raises(ValueError, match="is a snapshot"):
+        next(iter_graph_records(snapshot, full=True))
@@ -0,0 +1,27 @@
+"""hpo_stats grouping against calc_stats on the raw cells."""
+from hpo_stats import HierarchyColumns, calc_stats
+
+ROWS = [{'ID': str(i), 'Depth': i % 3,
+         'Num_Descendants': '' if i % 4 == 0 else str(i * 7919 % 101),
+         'Max_Num_Descendant_Diff': i, 'Num_Children': 1, 'Num_Parents': ''}
+        for i in range(200)]
+
+
+def test_groups_skip_empty_cells():
+    table = HierarchyColumns.from_rows(ROWS)
+    results = table.grouped_statistics(quantiles=(0.3,))
+    assert [r['Depth'] for r in results] == [0, 1, 2]
+    for result in results:
+        cells = [row['Num_Descendants'] for row in ROWS if row['Depth'] == result['Depth']]
+        for name, value in calc_stats(cells, (0.3,)).items():
+            assert result[f'Num_Descendants_{name}'] == value
+        assert 'Num_Parents_min' not in result
+
+
+def test_multi_keys_count_a_row_in_each_group():
+    table = HierarchyColumns.from_rows(ROWS[:4])
+    table.keys['Parent'] = [('b', 'a'), ('a',), (), ('b',)]
+    groups = table.group(('Parent', 'Depth'))
+    assert {key: list(rows) for key, rows in groups.items()} == {
+        ('a', 0): [0], ('a', 1): [1], ('b', 0): [0, 3]}
+    assert list(groups) == sorted(groups)
@@ -0,0 +1,40 @@
+"""hpo_view metrics against the app's, for a term with a parent outside the root."""
+from conftest import PREFIX
+from hpo_graph import OntologyGraph
+from hpo_view import ViewData, extract_view
+
+
+def two_root_graph():
+    """R -> X -> {T, S}, S -> S1..S5, and O (another root) -> {T, U}."""
+    edges = [('X', 'R'), ('T', 'X'), ('S', 'X'), ('T', 'O'), ('U', 'O')]
+    edges += [(f'S{k}', 'S') for k in range(1, 6)]
+    terms = dict.fromkeys(t for edge in edges for t in edge)
+    nodes = [{'id': PREFIX + t, 'lbl': t} for t in terms]
+    return OntologyGraph.from_records(
+        nodes, [{'sub': PREFIX + sub, 'pred': 'is_a', 'obj': PREFIX + obj} for sub, obj in edges])
+
+
+def view_nodes(data, root, **options):
+    view = extract_view(data, data.graph.index_of(PREFIX + root), **options)
+    return {n['label']: n for n in view['nodes']}
+
+
+def test_desc_diff_ignores_parents_outside_the_root():
+    data = ViewData(two_root_graph())
+    t = data.graph.index_of(PREFIX + 'T')
+    # Release-wide, T's sibling U under O has as few descendants as T
+    assert data.metrics['desc_diff'][t] == 0
+    nodes = view_nodes(data, 'R', diff_threshold=3)
+    assert nodes['T']['desc_diff'] == 5
+    assert nodes['T']['has_contrastive_sibling']
+    assert nodes['R']['desc_diff'] is None
+    assert view_nodes(data, 'O')['T']['desc_diff'] == 0
+
+
+def test_desc_diff_within_filter():
+    data = ViewData(two_root_graph())
+    graph = data.graph
+    allowed = {graph.index_of(PREFIX + t) for t in ('R', 'X', 'T')}
+    nodes = view_nodes(data, 'R', allowed=allowed)
+    # S is filtered out, so T is X's largest child
+    assert nodes['T']['desc_diff'] == 0